@@ -0,0 +1,244 @@
+"""
+asyncio versions of the story and reel link APIs for code running on an event loop.
+
+With the http backend every step is a coroutine on a shared
+``httpx.AsyncClient``. A pending request costs a suspended coroutine instead of
+a thread, every network await has its own timeout, and cancelling the awaiting
+task aborts whatever request is in flight.
+
+Selenium only has a blocking API, so the selenium backend runs the synchronous
+scraper in a worker thread. At most ``BROWSER_POOL_SIZE`` of those threads run
+at once; any further scrapes wait on the event loop, not in a thread.
+"""
+import asyncio
+import logging
+import weakref
+from extraction_backends import AsyncHttpBackend, SeleniumBackend
+from http_client import create_async_client, validate_links_async
+from hedging import HedgedBackend
+from instagram_downloader import BROWSER_POOL_SIZE, EXTRACTION_BACKEND, EXTRACTION_PROVIDERS, get_backend, story_breaker
+from metrics import SCRAPES, SCRAPES_IN_FLIGHT, record_validation
+from resilience import SCRAPE_DEADLINE, deadline
+from tracing import profiled, span
+
+logger = logging.getLogger(__name__)
+
+# HTTP clients and semaphores belong to one event loop, so each loop gets its own
+_loop_state = weakref.WeakKeyDictionary()
+
+
+class ThreadedBackend:
+    """
+    Runs a synchronous extraction backend in worker threads, at most ``limit`` at a time.
+
+    A cancelled scrape keeps its thread slot until the thread finishes, since
+    the blocking call underneath cannot be interrupted.
+
+    Args:
+        backend (ExtractionBackend): Synchronous backend to run
+        limit (int): Maximum number of threads running the backend at once
+    """
+
+    def __init__(self, backend, limit):
+        self.backend = backend
+        self.name = backend.name
+        self.upstream = backend.upstream
+        self._slots = asyncio.Semaphore(limit)
+
+    async def _run(self, func, *args):
+        await self._slots.acquire()
+        work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+
+        def release(future):
+            self._slots.release()
+            if not future.cancelled():
+                future.exception()
+
+        work.add_done_callback(release)
+        return await asyncio.shield(work)
+
+    async def iter_story_urls(self, username, seen=None):
+        urls = await self._run(self.backend.get_story_urls, username, seen)
+        if urls:
+            yield urls
+
+    async def get_story_urls(self, username, seen=None):
+        return await self._run(self.backend.get_story_urls, username, seen)
+
+    async def get_reel_urls(self, reel_url):
+        return await self._run(self.backend.get_reel_urls, reel_url)
+
+    async def close(self):
+        """The synchronous backend is shared with the rest of the process and stays open"""
+
+
+def _state():
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = _loop_state[loop] = {'client': create_async_client(), 'backends': {}}
+    return state
+
+
+def get_async_client():
+    """
+    Get the shared ``httpx.AsyncClient`` of the running event loop.
+
+    Returns:
+        httpx.AsyncClient: The client used for scraping and link validation
+    """
+    return _state()['client']
+
+
+def get_async_backend(name=None):
+    """
+    Get a shared async extraction backend for the running event loop.
+
+    Without a name this is the hedged backend over ``EXTRACTION_PROVIDERS`` when
+    more than one provider is configured, and ``EXTRACTION_BACKEND`` otherwise.
+
+    Args:
+        name (str): "selenium", "http" or "hedged"
+
+    Returns:
+        AsyncHttpBackend, ThreadedBackend or HedgedBackend: The backend instance
+    """
+    name = name or (HedgedBackend.name if len(EXTRACTION_PROVIDERS) > 1 else EXTRACTION_BACKEND)
+    state = _state()
+    backend = state['backends'].get(name)
+    if backend is None:
+        if name == HedgedBackend.name:
+            backend = HedgedBackend({provider: get_async_backend(provider) for provider in EXTRACTION_PROVIDERS})
+        elif name == AsyncHttpBackend.name:
+            backend = AsyncHttpBackend(state['client'])
+        elif name == SeleniumBackend.name:
+            backend = ThreadedBackend(get_backend(name), BROWSER_POOL_SIZE)
+        else:
+            raise ValueError(f"Unknown extraction backend: {name}")
+        state['backends'][name] = backend
+    return backend
+
+
+async def close_async_backends():
+    """Close the HTTP client of the running event loop"""
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state:
+        await state['client'].aclose()
+
+
+async def _validated(candidate_urls):
+    """Check the candidate URLs concurrently, keeping the page order"""
+    with span("validation", links=len(candidate_urls)):
+        results = await validate_links_async(candidate_urls, get_async_client())
+    record_validation(results)
+
+    download_links = []
+    for download_url, (is_valid, status) in zip(candidate_urls, results):
+        if is_valid:
+            download_links.append(download_url)
+            logger.info(f"Valid download URL found: {download_url}")
+        else:
+            logger.warning(f"URL check failed ({status}): {download_url}")
+    return download_links
+
+
+async def iter_story_links(username, backend=None):
+    """
+    Yield validated story links for a username as each page of results comes in.
+
+    Errors are logged and end the iteration like the synchronous API returns
+    what it has; cancellation is propagated.
+
+    Args:
+        username (str): Instagram username
+        backend: Async backend to use (defaults to ``get_async_backend()``)
+
+    Yields:
+        list: Direct download URLs found on one page
+
+    Raises:
+        CircuitOpenError: If recent scrapes kept failing and fastdl.app hasn't recovered yet
+    """
+    logger.info(f"Starting to fetch stories for username: {username}")
+    story_breaker.check()
+    backend = backend or get_async_backend()
+    found = 0
+    # Stays 'cancelled' if the task is cancelled or the consumer stops iterating
+    result = 'cancelled'
+
+    with SCRAPES_IN_FLIGHT.track_inprogress():
+        try:
+            async for candidate_urls in backend.iter_story_urls(username):
+                download_links = await _validated(candidate_urls)
+                found += len(download_links)
+                if download_links:
+                    yield download_links
+            result = 'found' if found else 'empty'
+        except Exception as e:
+            result = 'error'
+            logger.error(f"Error fetching stories: {e}", exc_info=True)
+        finally:
+            story_breaker.record(None if result == 'cancelled' else result != 'error')
+            SCRAPES.labels(backend.name, result).inc()
+
+    logger.info(f"Found {found} valid download links for {username}")
+
+
+async def get_instagram_story_links(username, backend=None, progress=None):
+    """
+    Get Instagram story links for a given username.
+
+    Args:
+        username (str): Instagram username
+        backend: Async backend to use (defaults to ``get_async_backend()``)
+        progress (callable): Coroutine function called with the links found so far after every page
+
+    Returns:
+        list: List of direct download URLs for stories
+
+    Raises:
+        CircuitOpenError: If recent scrapes kept failing and fastdl.app hasn't recovered yet
+    """
+    backend = backend or get_async_backend()
+    download_links = []
+    # The profiler samples every thread: the event loop and the browser threads of a threaded backend
+    with profiled(f"scrape-{username}"), deadline(SCRAPE_DEADLINE), \
+            span("scrape", username=username, backend=backend.name) as scrape:
+        async for page_links in iter_story_links(username, backend):
+            download_links.extend(page_links)
+            if progress:
+                await progress(list(download_links))
+        scrape.set(links=len(download_links))
+    return download_links
+
+
+async def get_instagram_reel_links(reel_url, backend=None):
+    """
+    Get download links for an Instagram reel or post.
+
+    Args:
+        reel_url (str): Instagram reel or post URL
+        backend: Async backend to use (defaults to ``get_async_backend()``)
+
+    Returns:
+        list: List of direct download URLs for the reel
+    """
+    logger.info(f"Starting to fetch reel from URL: {reel_url}")
+    backend = backend or get_async_backend()
+    download_links = []
+    result = 'cancelled'
+
+    with SCRAPES_IN_FLIGHT.track_inprogress(), deadline(SCRAPE_DEADLINE):
+        try:
+            with span("scrape", reel_url=reel_url, backend=backend.name) as scrape:
+                download_links = await _validated(await backend.get_reel_urls(reel_url))
+                scrape.set(links=len(download_links))
+            result = 'found' if download_links else 'empty'
+        except Exception as e:
+            result = 'error'
+            logger.error(f"Error fetching reel: {e}", exc_info=True)
+        finally:
+            SCRAPES.labels(backend.name, result).inc()
+
+    logger.info(f"Found {len(download_links)} valid download links for reel")
+    return download_links
@@ -0,0 +1,264 @@
+"""
+Offline benchmark of the scraper entry points against the fake fastdl.app server.
+
+Every entry point runs in its own process against a fresh ``FakeFastdl``, so
+peak RSS is measured per entry point. Each run uses a new username (or reel
+URL), so the seen-story index and caches never short-circuit a scrape::
+
+    python benchmark.py --backend http --runs 20 --latency 0.05
+    python benchmark.py --entry story_links --backend selenium --profile performance --runs 5
+
+Entry points:
+
+* ``stories``: ``main.get_instagram_stories``, scraping and downloading into a temporary folder
+* ``story_links``: ``instagram_downloader.get_instagram_story_links``
+* ``reel_links``: ``InstagramDownloader.get_instagram_reel_links`` from the interactive prompt
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from fake_fastdl import FakeFastdl
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINTS = ('stories', 'story_links', 'reel_links')
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of ``values`` (``fraction`` between 0 and 1)"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss(who=resource.RUSAGE_SELF):
+    """Peak resident set size in bytes (``ru_maxrss`` is KiB on Linux, bytes on macOS)"""
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _entry_point(entry, args, folder):
+    """
+    Build the callable for one entry point.
+
+    The scraper modules read ``FASTDL_URL`` and friends at import time, so they
+    are only imported once the environment points at the fake server.
+
+    Returns:
+        callable: Called with the run number; returns the number of items found
+    """
+    if entry == 'stories':
+        import main
+        from download_index import DownloadIndex
+        from media_download import PART_SUFFIX
+
+        stories_folder = os.path.join(folder, "Stories")
+        os.makedirs(stories_folder, exist_ok=True)
+        downloaded = DownloadIndex(folder)
+
+        def saved_files():
+            return {name for name in os.listdir(stories_folder) if PART_SUFFIX not in name}
+
+        def run(number):
+            before = saved_files()
+            if not main.get_instagram_stories(f"bench_user_{number}", folder, downloaded=downloaded):
+                raise RuntimeError("get_instagram_stories failed")
+            # Only files that were actually saved count; skipped and failed downloads don't
+            return len(saved_files() - before)
+
+        run.close = downloaded.close
+        return run
+
+    if entry == 'story_links':
+        from instagram_downloader import get_instagram_story_links
+
+        def run(number):
+            return len(get_instagram_story_links(f"bench_user_{number}"))
+
+        return run
+
+    if entry == 'reel_links':
+        from history_store import HistoryStore
+        from ig_downloader_prompt import InstagramDownloader
+        from instagram_downloader import get_backend
+
+        # Without a backend the prompt drives its own browser through the UI
+        backend = get_backend('http') if args.backend == 'http' else None
+        # Keep benchmark runs out of the user's download history
+        downloader = InstagramDownloader(backend=backend, profile=args.profile, history=HistoryStore(':memory:'))
+
+        def run(number):
+            return len(downloader.get_instagram_reel_links(f"https://www.instagram.com/reel/bench{number}/"))
+
+        return run
+
+    raise ValueError(f"Unknown entry point: {entry}")
+
+
+def _timed(run, number):
+    start = time.perf_counter()
+    try:
+        items = run(number)
+        error = None
+    except Exception as e:
+        items, error = 0, f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, items, error
+
+
+def run_entry_point(entry, args):
+    """
+    Benchmark one entry point in this process.
+
+    Returns:
+        dict: Latency percentiles, throughput, error count and peak RSS
+    """
+    folder = tempfile.mkdtemp(prefix="benchmark-")
+    server = FakeFastdl(args.stories, args.page_size, args.media_size, latency=args.latency,
+                        cdn_latency=args.cdn_latency, reel_items=args.reel_items)
+    server.start()
+    os.environ.update({
+        'FASTDL_URL': server.base_url,
+        'FASTDL_API_URL': server.api_url,
+        'EXTRACTION_BACKEND': args.backend,
+        'BROWSER_PROFILE': args.profile,
+    })
+    os.environ.setdefault('BROWSER_POOL_SIZE', str(args.concurrency))
+
+    # The entry points print progress; keep the report readable
+    with redirect_stdout(io.StringIO() if not args.verbose else sys.stdout):
+        run = _entry_point(entry, args, folder)
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        try:
+            for number in range(args.warmup):
+                _timed(run, f"warmup_{number}")
+
+            requests_before = server.requests
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                results = list(executor.map(lambda number: _timed(run, number), range(args.runs)))
+            elapsed = time.perf_counter() - start
+        finally:
+            if hasattr(run, 'close'):
+                run.close()
+            if args.backend == 'selenium':
+                from instagram_downloader import get_browser_pool
+                # Reap Chrome so its memory shows up in RUSAGE_CHILDREN
+                get_browser_pool().close()
+            server.stop()
+            shutil.rmtree(folder, ignore_errors=True)
+
+    latencies = [seconds for seconds, _, error in results if error is None]
+    errors = [error for _, _, error in results if error is not None]
+    return {
+        'entry': entry,
+        'backend': args.backend,
+        'runs': args.runs,
+        'errors': len(errors),
+        # Some entry points log failures and return nothing instead of raising
+        'empty': sum(1 for _, items, error in results if error is None and not items),
+        'first_error': errors[0] if errors else None,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'mean': statistics.mean(latencies) if latencies else None,
+        'runs_per_second': len(latencies) / elapsed if elapsed else None,
+        'items_per_second': sum(items for _, items, _ in results) / elapsed if elapsed else None,
+        'requests_per_run': (server.requests - requests_before) / args.runs if args.runs else None,
+        'peak_rss': peak_rss(),
+        'peak_rss_children': peak_rss(resource.RUSAGE_CHILDREN),
+    }
+
+
+def run_isolated(entry, argv):
+    """Run one entry point in a child process so its peak RSS is its own"""
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [sys.executable, os.path.abspath(__file__), *argv, '--entry', entry, '--child-output', output.name]
+        completed = subprocess.run(command)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Benchmark of {entry} exited with status {completed.returncode}")
+        with open(output.name) as f:
+            return json.load(f)
+
+
+def _format_seconds(seconds):
+    return f"{seconds * 1000:.0f} ms" if seconds is not None else "-"
+
+
+def print_report(results):
+    print(f"{'entry point':<12} {'backend':<9} {'p50':>9} {'p95':>9} {'runs/s':>8} {'items/s':>8} "
+          f"{'req/run':>8} {'errors':>6} {'empty':>5} {'RSS MB':>7} {'child MB':>8}")
+    for result in results:
+        print(
+            f"{result['entry']:<12} {result['backend']:<9} {_format_seconds(result['p50']):>9} "
+            f"{_format_seconds(result['p95']):>9} {result['runs_per_second'] or 0:>8.2f} "
+            f"{result['items_per_second'] or 0:>8.1f} {result['requests_per_run'] or 0:>8.1f} "
+            f"{result['errors']:>6} {result['empty']:>5} {result['peak_rss'] / 2 ** 20:>7.0f} {result['peak_rss_children'] / 2 ** 20:>8.0f}"
+        )
+        if result['first_error']:
+            print(f"  first error: {result['first_error']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against a local fake fastdl.app")
+    parser.add_argument("--entry", nargs="+", choices=ENTRY_POINTS, default=list(ENTRY_POINTS))
+    parser.add_argument("--backend", choices=["http", "selenium"], default="http")
+    parser.add_argument("--profile", default="performance", help="Browser profile for the selenium backend")
+    parser.add_argument("--runs", type=int, default=10, help="Measured runs per entry point")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs before the measured ones")
+    parser.add_argument("--concurrency", type=int, default=1, help="Runs in flight at once")
+    parser.add_argument("--stories", type=int, default=12, help="Stories per profile")
+    parser.add_argument("--page-size", type=int, default=5, help="Stories per \"See more\" page")
+    parser.add_argument("--reel-items", type=int, default=1, help="Download links per reel")
+    parser.add_argument("--media-size", type=int, default=64 * 1024, help="Bytes per CDN media file")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every page and API response")
+    parser.add_argument("--cdn-latency", type=float, default=0.0, help="Seconds added to every CDN response")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the entry points' own output")
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    if args.child_output:
+        with open(args.child_output, 'w') as f:
+            json.dump(run_entry_point(args.entry[0], args), f)
+        return
+
+    # Everything but --entry is passed through to the per-entry-point processes
+    passthrough = parse_args([])
+    child_argv = [
+        f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+        if name not in ('entry', 'json', 'verbose', 'child_output') and value != getattr(passthrough, name)
+    ] + (["--verbose"] if args.verbose else [])
+
+    results = []
+    for entry in args.entry:
+        logger.info(f"Benchmarking {entry} with the {args.backend} backend ({args.runs} runs)")
+        results.append(run_isolated(entry, child_argv))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from rate_limiter import navigate
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserSession:
+    """A pooled WebDriver together with its usage bookkeeping"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+
+
+class BrowserPool:
+    """
+    Bounded pool of pre-launched, pre-navigated Chrome sessions.
+
+    Sessions are checked out for a single request, reset to a clean state when
+    returned and recycled after ``max_uses`` checkouts or when the request that
+    held them crashed.
+
+    Args:
+        driver_factory (callable): Creates a new WebDriver instance
+        size (int): Maximum number of live browser sessions
+        max_uses (int): Number of checkouts after which a session is recycled
+        home_url (str): Page every idle session is parked on
+    """
+
+    def __init__(self, driver_factory, size=2, max_uses=20, home_url="https://fastdl.app/"):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.max_uses = max_uses
+        self.home_url = home_url
+
+        self._idle = deque()
+        self._live = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'recycled': 0,
+            'crashed': 0,
+            'checkouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+        }
+
+    def _launch(self):
+        """Start a new browser and park it on the home page"""
+        driver = self.driver_factory()
+        try:
+            navigate(driver, self.home_url)
+        except Exception:
+            self._quit(driver)
+            raise
+        return BrowserSession(driver)
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing pooled WebDriver: {e}")
+
+    def _reset(self, session):
+        """Drop cookies and storage and navigate back to the home page"""
+        driver = session.driver
+        driver.delete_all_cookies()
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        navigate(driver, self.home_url)
+
+    def _discard(self, session):
+        self._quit(session.driver)
+        with self._cond:
+            self._live -= 1
+            self._cond.notify()
+
+    def warm(self, count=None):
+        """
+        Pre-launch browser sessions so the first requests don't pay for Chrome startup.
+
+        Args:
+            count (int): Number of sessions to start (defaults to the pool size)
+        """
+        count = self.size if count is None else min(count, self.size)
+        started = 0
+        while started < count:
+            with self._cond:
+                if self._closed or self._live >= self.size:
+                    break
+                self._live += 1
+            try:
+                session = self._launch()
+            except Exception as e:
+                logger.error(f"Failed to pre-launch browser session: {e}")
+                with self._cond:
+                    self._live -= 1
+                    self._cond.notify()
+                break
+            with self._cond:
+                self._idle.append(session)
+                self._cond.notify()
+            started += 1
+        logger.info(f"Browser pool warmed with {started} session(s)")
+
+    def acquire(self, timeout=None):
+        """
+        Check out a browser session, launching one if the pool has spare capacity.
+
+        Args:
+            timeout (float): Maximum seconds to wait for a free session
+
+        Returns:
+            BrowserSession: The checked out session
+        """
+        start = time.monotonic()
+        launch = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
+                if self._idle:
+                    session = self._idle.popleft()
+                    self._stats['hits'] += 1
+                    break
+                if self._live < self.size:
+                    self._live += 1
+                    self._stats['misses'] += 1
+                    launch = True
+                    break
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free browser session")
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._stats['checkouts'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+
+        if launch:
+            try:
+                session = self._launch()
+            except Exception:
+                with self._cond:
+                    self._live -= 1
+                    self._cond.notify()
+                raise
+
+        session.uses += 1
+        return session
+
+    def release(self, session, crashed=False):
+        """
+        Return a session to the pool, recycling it when worn out or broken.
+
+        Args:
+            session (BrowserSession): Session obtained from ``acquire``
+            crashed (bool): Whether the request using the session failed
+        """
+        if crashed or self._closed or session.uses >= self.max_uses:
+            with self._cond:
+                self._stats['crashed' if crashed else 'recycled'] += 1
+            self._discard(session)
+            return
+
+        try:
+            self._reset(session)
+        except Exception as e:
+            logger.warning(f"Failed to reset browser session, recycling it: {e}")
+            with self._cond:
+                self._stats['crashed'] += 1
+            self._discard(session)
+            return
+
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Context manager yielding a WebDriver that is returned to the pool afterwards"""
+        session = self.acquire(timeout)
+        crashed = False
+        try:
+            yield session.driver
+        except BaseException:
+            crashed = True
+            raise
+        finally:
+            self.release(session, crashed=crashed)
+
+    def stats(self):
+        """
+        Get pool usage statistics.
+
+        Returns:
+            dict: Hit/miss counters, checkout wait times and session counts
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['live'] = self._live
+            stats['idle'] = len(self._idle)
+        checkouts = stats['checkouts']
+        stats['hit_ratio'] = stats['hits'] / checkouts if checkouts else 0.0
+        stats['wait_avg'] = stats['wait_total'] / checkouts if checkouts else 0.0
+        return stats
+
+    def close(self):
+        """Shut down every idle session and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._live -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            self._quit(session.driver)
+        logger.info("Browser pool closed")
@@ -0,0 +1,250 @@
+"""
+Chrome launch profiles for the scrapers.
+
+``visual`` is the visible browser of the interactive prompt, ``default`` is the
+pooled scraper browser as it has always been launched, and ``performance`` is a
+headless browser that blocks images, media, fonts and ad/analytics requests at
+the DevTools protocol level, since the scrapers only read link hrefs.
+
+Compare page-load time and bytes transferred between profiles with::
+
+    python browser_profiles.py --compare default performance --runs 5
+"""
+import argparse
+import logging
+import os
+import statistics
+from selenium import webdriver
+
+logger = logging.getLogger(__name__)
+
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "default")
+
+# Patterns match the whole URL, so a trailing * also covers signed query strings
+BLOCKED_RESOURCE_PATTERNS = [
+    # Images
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.avif*",
+    # Media
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*",
+    # Fonts
+    "*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*",
+]
+
+BLOCKED_DOMAIN_PATTERNS = [
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*googletagservices.com*",
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*adservice.google.*",
+    "*amazon-adsystem.com*",
+    "*adnxs.com*",
+    "*criteo.com*",
+    "*criteo.net*",
+    "*taboola.com*",
+    "*outbrain.com*",
+    "*pubmatic.com*",
+    "*rubiconproject.com*",
+    "*scorecardresearch.com*",
+    "*connect.facebook.net*",
+    "*hotjar.com*",
+    "*mc.yandex.ru*",
+    "*clarity.ms*",
+]
+
+# Navigation timing plus the transfer size of everything the page loaded
+PAGE_METRICS_SCRIPT = """
+var nav = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+var bytes = nav ? (nav.transferSize || nav.encodedBodySize || 0) : 0;
+resources.forEach(function (entry) { bytes += entry.transferSize || entry.encodedBodySize || 0; });
+return {
+    load_ms: nav ? nav.loadEventEnd - nav.startTime : null,
+    dom_content_loaded_ms: nav ? nav.domContentLoadedEventEnd - nav.startTime : null,
+    bytes: bytes,
+    requests: resources.length + (nav ? 1 : 0)
+};
+"""
+
+
+class BrowserProfile:
+    """
+    How Chrome is launched and which requests it is allowed to make.
+
+    Args:
+        name (str): Profile name
+        arguments (list): Chrome command-line switches
+        experimental_options (dict): ChromeOptions experimental options (including ``prefs``)
+        blocked_urls (list): URL patterns blocked with ``Network.setBlockedURLs``
+        maximize (bool): Maximize the window after launch
+    """
+
+    def __init__(self, name, arguments, experimental_options=None, blocked_urls=None, maximize=False):
+        self.name = name
+        self.arguments = arguments
+        self.experimental_options = experimental_options or {}
+        self.blocked_urls = blocked_urls or []
+        self.maximize = maximize
+
+    def options(self):
+        """Build the ChromeOptions for this profile"""
+        options = webdriver.ChromeOptions()
+        for argument in self.arguments:
+            options.add_argument(argument)
+        for name, value in self.experimental_options.items():
+            options.add_experimental_option(name, value)
+        return options
+
+    def prepare(self, driver):
+        """Apply the per-session settings that can't be passed as launch options"""
+        if self.maximize:
+            driver.maximize_window()
+        if self.blocked_urls:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_urls})
+            logger.info(f"Blocking {len(self.blocked_urls)} URL patterns for the {self.name} profile")
+        return driver
+
+
+PROFILES = {
+    'visual': BrowserProfile(
+        'visual',
+        [
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-gpu',
+            '--window-size=1920,1080',
+            '--start-maximized',
+            '--disable-web-security',
+            '--disable-features=VizDisplayCompositor',
+            '--disable-blink-features=AutomationControlled',
+            # Add user agent to appear more like a real browser
+            '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        ],
+        {'excludeSwitches': ['enable-automation'], 'useAutomationExtension': False},
+        maximize=True,
+    ),
+    'default': BrowserProfile(
+        'default',
+        ['--disable-dev-shm-usage', '--window-size=1920,1080'],
+        maximize=True,
+    ),
+    'performance': BrowserProfile(
+        'performance',
+        [
+            '--headless=new',
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-gpu',
+            '--window-size=1920,1080',
+            '--disable-extensions',
+            '--disable-background-networking',
+            '--disable-component-update',
+            '--disable-default-apps',
+            '--disable-sync',
+            '--mute-audio',
+            '--no-first-run',
+            '--blink-settings=imagesEnabled=false',
+        ],
+        {
+            'excludeSwitches': ['enable-automation'],
+            'prefs': {
+                'profile.managed_default_content_settings.images': 2,
+                'profile.managed_default_content_settings.notifications': 2,
+            },
+        },
+        blocked_urls=BLOCKED_RESOURCE_PATTERNS + BLOCKED_DOMAIN_PATTERNS,
+    ),
+}
+
+
+def get_profile(name=None):
+    """
+    Look up a browser profile by name.
+
+    Args:
+        name (str): "visual", "default" or "performance" (defaults to ``BROWSER_PROFILE``)
+
+    Returns:
+        BrowserProfile: The profile
+    """
+    name = name or BROWSER_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown browser profile: {name} (choose from {', '.join(PROFILES)})")
+
+
+def page_load_metrics(driver):
+    """
+    Read load timing and transfer size of the current page from the Performance API.
+
+    Cross-origin resources without ``Timing-Allow-Origin`` report no size, so
+    ``bytes`` is a lower bound.
+
+    Returns:
+        dict: ``load_ms``, ``dom_content_loaded_ms``, ``bytes`` and ``requests``
+    """
+    return driver.execute_script(PAGE_METRICS_SCRIPT)
+
+
+def describe_page_metrics(metrics):
+    """One-line summary of ``page_load_metrics``"""
+    load = f"{metrics['load_ms']:.0f} ms" if metrics.get('load_ms') else "unknown time"
+    return f"loaded in {load}, {metrics['bytes'] / 1024:.0f} KB over {metrics['requests']} requests"
+
+
+def measure_profile(profile, url, runs=3):
+    """
+    Launch a browser with ``profile`` and load ``url`` ``runs`` times from a cold cache.
+
+    Returns:
+        list: ``page_load_metrics`` of every run
+    """
+    driver = profile.prepare(webdriver.Chrome(options=profile.options()))
+    results = []
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+        for _ in range(runs):
+            driver.get("about:blank")
+            driver.get(url)
+            results.append(page_load_metrics(driver))
+    finally:
+        driver.quit()
+    return results
+
+
+def main():
+    from extraction_backends import FASTDL_URL
+
+    parser = argparse.ArgumentParser(description="Compare page-load time and bytes transferred between browser profiles")
+    parser.add_argument("--compare", nargs="+", default=["default", "performance"], choices=list(PROFILES))
+    parser.add_argument("--url", default=FASTDL_URL)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    rows = []
+    for name in args.compare:
+        results = measure_profile(get_profile(name), args.url, args.runs)
+        rows.append((
+            name,
+            statistics.median(result['load_ms'] or 0 for result in results),
+            statistics.median(result['bytes'] for result in results),
+            statistics.median(result['requests'] for result in results),
+        ))
+
+    baseline = rows[0]
+    print(f"{'profile':<12} {'load (ms)':>10} {'KB':>10} {'requests':>9}  vs {baseline[0]}")
+    for name, load_ms, size, requests in rows:
+        change = (
+            f"{(load_ms / baseline[1] - 1) * 100:+.0f}% time, {(size / baseline[2] - 1) * 100:+.0f}% bytes"
+            if baseline[1] and baseline[2] else ""
+        )
+        print(f"{name:<12} {load_ms:>10.0f} {size / 1024:>10.1f} {requests:>9.0f}  {change}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "downloads.db"
+LEGACY_LINKS_FILENAME = "downloaded_links.txt"
+
+# Stories expire after a day; remember seen ones a little longer than that
+SEEN_RETENTION = float(os.environ.get("SEEN_RETENTION", str(48 * 3600)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    prefix_sha256 TEXT NOT NULL,
+    path TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_prefix ON media (size, prefix_sha256);
+CREATE TABLE IF NOT EXISTS seen_stories (
+    username TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (username, key)
+);
+CREATE TABLE IF NOT EXISTS partials (
+    key TEXT PRIMARY KEY,
+    stem TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def link_key(download_url):
+    """Normalize a download URL the way downloaded_links.txt always has: drop everything after the first '&'"""
+    return download_url.strip().split('&')[0]
+
+
+class DownloadIndex:
+    """
+    Persistent record of downloaded links, media content hashes and the stories
+    already seen per account, backed by SQLite.
+
+    Keys are loaded into memory once when the index is opened, so lookups are
+    O(1) set membership checks. New links are buffered and written in batches.
+    An existing ``downloaded_links.txt`` is imported the first time the index is
+    opened in a folder. One index can be shared by several worker threads.
+
+    Args:
+        download_folder (str): Folder holding the index and the legacy links file
+        batch_size (int): Number of new links buffered before they are written
+    """
+
+    def __init__(self, download_folder, batch_size=50):
+        self.download_folder = download_folder
+        self.path = os.path.join(download_folder, INDEX_FILENAME)
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.RLock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._migrate_legacy_file()
+        self._keys = {row[0] for row in self.conn.execute("SELECT key FROM links")}
+        logger.info(f"Loaded {len(self._keys)} downloaded links from {self.path}")
+
+    def _migrate_legacy_file(self):
+        """Import downloaded_links.txt once"""
+        migrated = self.conn.execute("SELECT value FROM meta WHERE name = 'legacy_migrated'").fetchone()
+        legacy_path = os.path.join(self.download_folder, LEGACY_LINKS_FILENAME)
+        if migrated or not os.path.exists(legacy_path):
+            return
+
+        with open(legacy_path, "r") as f:
+            rows = [(link_key(line), line.strip(), time.time()) for line in f if line.strip()]
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO links (key, url, added_at) VALUES (?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('legacy_migrated', ?)", (str(time.time()),))
+        logger.info(f"Migrated {len(rows)} links from {legacy_path}")
+
+    def __contains__(self, download_url):
+        return link_key(download_url) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, download_url):
+        """Record a downloaded link; it is written on the next flush"""
+        key = link_key(download_url)
+        with self._lock:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+            self._pending.append((key, download_url, time.time()))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Write buffered links in one transaction"""
+        with self._lock:
+            if not self._pending:
+                return
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO links (key, url, added_at) VALUES (?, ?, ?)", self._pending)
+            self._pending = []
+
+    def find_media(self, sha256):
+        """
+        Look up stored media by content hash.
+
+        Returns:
+            str: Path of the stored copy, or None
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT path FROM media WHERE sha256 = ?", (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def find_media_by_prefix(self, size, prefix_sha256):
+        """
+        Look up stored media by size and hash of its first bytes.
+
+        Returns:
+            tuple: (sha256, path) of the stored copy, or None
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT sha256, path FROM media WHERE size = ? AND prefix_sha256 = ?", (size, prefix_sha256)
+            ).fetchone()
+
+    def add_media(self, sha256, size, prefix_sha256, path):
+        """Record (or re-point) the stored copy of a piece of media"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO media (sha256, size, prefix_sha256, path, added_at) VALUES (?, ?, ?, ?, ?)",
+                (sha256, size, prefix_sha256, path, time.time()),
+            )
+
+    def seen_stories(self, username):
+        """
+        Get the link keys of the stories already seen for an account.
+
+        Returns:
+            set: ``link_key`` values
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT key FROM seen_stories WHERE username = ?", (username,))
+            return {row[0] for row in rows}
+
+    def mark_seen(self, username, download_urls, retention=SEEN_RETENTION):
+        """Remember stories as seen for an account and forget ones older than ``retention`` seconds"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO seen_stories (username, key, seen_at) VALUES (?, ?, ?)",
+                [(username, link_key(url), now) for url in download_urls],
+            )
+            self.conn.execute("DELETE FROM seen_stories WHERE seen_at < ?", (now - retention,))
+
+    def partial_stem(self, download_url):
+        """
+        Get the path a link's interrupted download was saved under.
+
+        Returns:
+            str: Path without extension, or None if the link has no partial download
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT stem FROM partials WHERE key = ?", (link_key(download_url),)).fetchone()
+        return row[0] if row else None
+
+    def set_partial(self, download_url, stem):
+        """Remember the path of a link's interrupted download so a retry resumes it"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO partials (key, stem, added_at) VALUES (?, ?, ?)",
+                (link_key(download_url), stem, time.time()),
+            )
+
+    def clear_partial(self, download_url):
+        """Forget a link's interrupted download once it has completed"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM partials WHERE key = ?", (link_key(download_url),))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,488 @@
+import logging
+import os
+from contextlib import contextmanager
+from functools import partial
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+import httpx
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from browser_profiles import describe_page_metrics, page_load_metrics
+from download_index import link_key
+from http_client import REQUEST_TIMEOUT, get_session
+from rate_limiter import get_rate_limiter, navigate
+from resilience import check_deadline, hang_timeout, kill_browser, stage_timeout, watchdog
+from tracing import span
+from page_readiness import ReadinessTracker, count_elements, install_observers, wait_until_ready, wait_for_new_items
+
+logger = logging.getLogger(__name__)
+
+FASTDL_URL = os.environ.get("FASTDL_URL", "https://fastdl.app/")
+FASTDL_API_URL = os.environ.get("FASTDL_API_URL", urljoin(FASTDL_URL, "api/"))
+
+DOWNLOAD_LINK_SELECTOR = "a.button--filled"
+CONSENT_BUTTON_XPATH = "//button[@aria-label='Consent']"
+SEARCH_INPUT_XPATH = "//input[@id='search-form-input']"
+SEARCH_BUTTON_XPATH = "//button[@class='search-form__button']"
+STORIES_TAB_XPATH = "//li[@class='tabs-component__item']/button[contains(text(), 'stories')]"
+STORY_LIST_SELECTOR = "ul.profile-media-list"
+SEE_MORE_XPATH = "//button[@class='button button--see-more profile-media-list__button--see-more']"
+
+# Upper bound on "See more" pages / API cursors followed for one profile
+MAX_PAGES = 50
+
+# Every download button on the page with its media type, thumbnail and position, in one round trip
+DOWNLOAD_LINKS_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0]), function (link, index) {
+    var item = link.closest('li') || link.parentElement;
+    var image = item ? item.querySelector('img') : null;
+    var label = (link.textContent + ' ' + (link.getAttribute('title') || '')).toLowerCase();
+    var video = /\\.mp4(\\?|$)/.test(link.href) || label.indexOf('video') !== -1
+        || !!(item && item.querySelector('video, [class*="video"]'));
+    return {
+        href: link.href,
+        type: video ? 'video' : 'image',
+        thumbnail: image ? (image.currentSrc || image.src || null) : null,
+        position: index
+    };
+});
+"""
+
+
+def collect_download_links(driver, css_selector=DOWNLOAD_LINK_SELECTOR):
+    """
+    Read every download link on the page with a single ``execute_script`` call.
+
+    Args:
+        driver (WebDriver): Browser showing fastdl.app results
+        css_selector (str): Selector of the download buttons
+
+    Returns:
+        list: Dicts with ``href``, ``type`` ('video' or 'image'), ``thumbnail`` and ``position``
+    """
+    return [link for link in driver.execute_script(DOWNLOAD_LINKS_SCRIPT, css_selector) if link.get('href')]
+
+
+def _unseen(urls, seen):
+    """
+    Split a page of story URLs (newest first) at the first already-seen one.
+
+    Returns:
+        tuple: (URLs before the first seen one, whether a seen one was reached)
+    """
+    if not seen:
+        return list(urls), False
+    new_urls = []
+    for url in urls:
+        if link_key(url) in seen:
+            return new_urls, True
+        new_urls.append(url)
+    return new_urls, False
+
+
+class ExtractionBackend:
+    """Turns a username or reel URL into the candidate download URLs fastdl.app offers"""
+
+    name = None
+    # Host the backend gets its answers from; hedging treats backends on the same host as one
+    upstream = None
+
+    def get_story_urls(self, username, seen=None):
+        """
+        Get the story download URLs for a profile, in page order.
+
+        fastdl.app lists stories newest first, so with ``seen`` pagination stops
+        at the first already-seen story and only the newer ones are returned.
+
+        Args:
+            username (str): Instagram username
+            seen (set): ``link_key`` values of stories seen on earlier polls
+
+        Returns:
+            list: Candidate download URLs (not yet validated)
+        """
+        raise NotImplementedError
+
+    def get_reel_urls(self, reel_url):
+        """
+        Get the download URLs for a reel or post.
+
+        Args:
+            reel_url (str): Instagram reel or post URL
+
+        Returns:
+            list: Candidate download URLs (not yet validated)
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class SeleniumBackend(ExtractionBackend):
+    """
+    Drives Chrome through the fastdl.app UI using sessions from a browser pool.
+
+    Args:
+        pool (BrowserPool): Pool the Chrome sessions are checked out from
+        checkout_timeout (float): Maximum seconds to wait for a free session
+    """
+
+    name = 'selenium'
+
+    def __init__(self, pool, checkout_timeout=None):
+        self.pool = pool
+        self.checkout_timeout = checkout_timeout
+        self.upstream = urlsplit(FASTDL_URL).hostname
+
+    @contextmanager
+    def _checkout(self, name):
+        """Check out a browser for one scrape, killed by the watchdog if the scrape hangs past its deadline"""
+        with self.pool.checkout(stage_timeout(self.checkout_timeout)) as driver:
+            with watchdog.watch(hang_timeout(), partial(kill_browser, driver), name=f"browser for {name}"):
+                yield driver
+
+    def _submit_search(self, driver, query, readiness):
+        """Open fastdl.app, accept cookies, submit ``query`` and wait for the results"""
+        # Pooled sessions are already parked on fastdl.app
+        if not driver.current_url.startswith(FASTDL_URL):
+            logger.info("Navigating to fastdl.app")
+            with span("page_load"):
+                navigate(driver, FASTDL_URL)
+        # Before the search click, so the request it sends is counted as in flight
+        install_observers(driver)
+
+        # Cookies consent
+        logger.info("Waiting for cookies button")
+        with span("consent"):
+            try:
+                cookies_button = WebDriverWait(driver, stage_timeout(20)).until(
+                    EC.presence_of_element_located((By.XPATH, CONSENT_BUTTON_XPATH))
+                )
+                cookies_button.click()
+                logger.info("Cookies button clicked")
+            except Exception as e:
+                logger.warning(f"No cookies button found or could not click it: {e}")
+
+        # Search input
+        with span("search"):
+            logger.info(f"Entering search query: {query}")
+            url_input = WebDriverWait(driver, stage_timeout(20)).until(
+                EC.presence_of_element_located((By.XPATH, SEARCH_INPUT_XPATH))
+            )
+            url_input.send_keys(query)
+
+            # Download button
+            logger.info("Clicking download button")
+            download_button = WebDriverWait(driver, stage_timeout(20)).until(
+                EC.presence_of_element_located((By.XPATH, SEARCH_BUTTON_XPATH))
+            )
+            get_rate_limiter().acquire(FASTDL_URL)
+            download_button.click()
+
+        # Remove popup ad if it appears
+        with span("ads"):
+            try:
+                logger.info("Checking for popup ads")
+                popup_element = WebDriverWait(driver, stage_timeout(5)).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "ads-modal"))
+                )
+                driver.execute_script("""
+                    var element = arguments[0];
+                    element.parentNode.removeChild(element);
+                    """, popup_element)
+                logger.info("Popup ad removed")
+            except Exception as e:
+                logger.info(f"No popup ad detected or error removing it: {e}")
+
+        with span("results"):
+            wait_until_ready(driver, readiness, "search results", replaces=6, timeout=stage_timeout(6))
+        logger.info(f"fastdl.app page {describe_page_metrics(page_load_metrics(driver))}")
+
+    def _collect_links(self, driver):
+        """Wait for the download buttons and read all their hrefs in one call"""
+        logger.info("Looking for download buttons")
+        with span("link_extraction"):
+            WebDriverWait(driver, stage_timeout(20)).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, DOWNLOAD_LINK_SELECTOR))
+            )
+            links = collect_download_links(driver)
+        videos = sum(1 for link in links if link['type'] == 'video')
+        logger.info(f"Found {len(links)} download buttons ({videos} videos, {len(links) - videos} images)")
+        return [link['href'] for link in links]
+
+    def get_story_urls(self, username, seen=None):
+        readiness = ReadinessTracker(username)
+        try:
+            with self._checkout(username) as driver:
+                self._submit_search(driver, username, readiness)
+
+                # Click the "Stories" tab. A missing tab or story list means the page changed, which
+                # is a failure for the circuit breaker, not an account without stories.
+                try:
+                    logger.info("Clicking Stories tab")
+                    with span("stories_tab"):
+                        stories_tab = WebDriverWait(driver, stage_timeout(20)).until(
+                            EC.presence_of_element_located((By.XPATH, STORIES_TAB_XPATH))
+                        )
+                        install_observers(driver)
+                        stories_tab.click()
+                        WebDriverWait(driver, stage_timeout(20)).until(
+                            EC.presence_of_element_located((By.CSS_SELECTOR, STORY_LIST_SELECTOR))
+                        )
+                    logger.info("Stories tab clicked")
+                except Exception as e:
+                    logger.error(f"Error opening the Stories tab: {e}")
+                    raise
+
+                # Click "See more" buttons until they no longer appear or a seen story shows up
+                with span("pagination"):
+                    see_more_count = 0
+                    while see_more_count < MAX_PAGES:
+                        if seen:
+                            hrefs = [link['href'] for link in collect_download_links(driver)]
+                            new_urls, reached_seen = _unseen(hrefs, seen)
+                            if reached_seen:
+                                logger.info(f"Reached an already seen story after {see_more_count} pages, {len(new_urls)} new")
+                                return new_urls
+                        try:
+                            see_more_button = WebDriverWait(driver, stage_timeout(10)).until(
+                                EC.presence_of_element_located((By.XPATH, SEE_MORE_XPATH))
+                            )
+                            item_count = count_elements(driver, DOWNLOAD_LINK_SELECTOR)
+                            get_rate_limiter().acquire(FASTDL_URL)
+                            install_observers(driver)
+                            see_more_button.click()
+                            see_more_count += 1
+                            logger.info(f"See more button clicked ({see_more_count})")
+                            wait_for_new_items(driver, readiness, "see more", DOWNLOAD_LINK_SELECTOR, item_count, replaces=2,
+                                               timeout=stage_timeout(2))
+                        except Exception:
+                            logger.info("No more See more buttons found")
+                            break
+
+                try:
+                    urls = self._collect_links(driver)
+                except TimeoutException:
+                    # Unless the deadline cut the wait short, an empty story list means there are no stories
+                    check_deadline()
+                    logger.info(f"No stories listed for {username}")
+                    return []
+                return _unseen(urls, seen)[0]
+        finally:
+            logger.info(f"Browser pool stats: {self.pool.stats()}")
+            readiness.log_summary()
+
+    def get_reel_urls(self, reel_url):
+        readiness = ReadinessTracker(reel_url)
+        try:
+            with self._checkout(reel_url) as driver:
+                self._submit_search(driver, reel_url, readiness)
+                return self._collect_links(driver)
+        finally:
+            logger.info(f"Browser pool stats: {self.pool.stats()}")
+            readiness.log_summary()
+
+
+class _DownloadLinkParser(HTMLParser):
+    """Collects the hrefs of ``a.button--filled`` elements from an HTML fragment"""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self.next_cursor = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if tag == 'a' and 'button--filled' in classes and attrs.get('href'):
+            self.links.append(attrs['href'])
+        elif tag == 'button' and 'button--see-more' in classes and attrs.get('data-cursor'):
+            self.next_cursor = attrs['data-cursor']
+
+
+def parse_download_links(response):
+    """
+    Extract download URLs and the pagination cursor from a fastdl.app API response.
+
+    Handles both JSON payloads (``{"items": [{"url": ...}], "next_cursor": ...}``,
+    optionally with a rendered ``html`` fragment) and plain HTML fragments.
+
+    Args:
+        response (requests.Response or httpx.Response): Response from the search or stories endpoint
+
+    Returns:
+        tuple: (urls, next_cursor)
+    """
+    content_type = response.headers.get('content-type', '')
+    if 'json' in content_type:
+        data = response.json()
+        urls = [item['url'] for item in data.get('items', []) if item.get('url')]
+        next_cursor = data.get('next_cursor')
+        if data.get('html'):
+            parser = _DownloadLinkParser()
+            parser.feed(data['html'])
+            urls.extend(url for url in parser.links if url not in urls)
+            next_cursor = next_cursor or parser.next_cursor
+        return urls, next_cursor
+
+    parser = _DownloadLinkParser()
+    parser.feed(response.text)
+    return parser.links, parser.next_cursor
+
+
+class HttpBackend(ExtractionBackend):
+    """
+    Calls the search and stories endpoints the fastdl.app UI uses directly, without a browser.
+
+    Args:
+        api_url (str): Base URL of the API (``FASTDL_API_URL``); point it at a local
+            stub such as ``fake_fastdl.py`` to run without network access
+        session (requests.Session): Session to use (defaults to the shared pooled one)
+        timeout (float): Per-request timeout in seconds
+    """
+
+    name = 'http'
+
+    def __init__(self, api_url=None, session=None, timeout=REQUEST_TIMEOUT):
+        self.api_url = api_url or FASTDL_API_URL
+        if not self.api_url.endswith('/'):
+            self.api_url += '/'
+        self.upstream = urlsplit(self.api_url).hostname
+        self.session = session or get_session()
+        self.timeout = timeout
+
+    def _search(self, query):
+        with span("search"):
+            response = self.session.post(
+                urljoin(self.api_url, 'search'), data={'q': query}, timeout=stage_timeout(self.timeout)
+            )
+            response.raise_for_status()
+        return response
+
+    def get_story_urls(self, username, seen=None):
+        logger.info(f"Searching fastdl.app API for {username}")
+        search = self._search(username)
+        user_id = None
+        if 'json' in search.headers.get('content-type', ''):
+            user_id = (search.json().get('user') or {}).get('id')
+
+        urls = []
+        cursor = None
+        with span("pagination"):
+            for page in range(MAX_PAGES):
+                params = {'username': username}
+                if user_id:
+                    params['user_id'] = user_id
+                if cursor:
+                    params['cursor'] = cursor
+                response = self.session.get(
+                    urljoin(self.api_url, 'stories'), params=params, timeout=stage_timeout(self.timeout)
+                )
+                response.raise_for_status()
+                page_urls, cursor = parse_download_links(response)
+                new_urls, reached_seen = _unseen(page_urls, seen)
+                urls.extend(new_urls)
+                logger.info(f"Stories page {page + 1}: {len(page_urls)} links, {len(new_urls)} new")
+                if reached_seen:
+                    logger.info(f"Reached an already seen story for {username}, not loading more pages")
+                    break
+                if not cursor:
+                    break
+
+        logger.info(f"Found {len(urls)} download links for {username}")
+        return urls
+
+    def get_reel_urls(self, reel_url):
+        logger.info(f"Searching fastdl.app API for reel {reel_url}")
+        urls, _ = parse_download_links(self._search(reel_url))
+        logger.info(f"Found {len(urls)} download links for reel")
+        return urls
+
+
+class AsyncHttpBackend:
+    """
+    asyncio counterpart of ``HttpBackend`` on a shared ``httpx.AsyncClient``.
+
+    Every connect, read and write await of a request is bounded by
+    ``timeout`` and by what is left of the scrape's deadline, and cancelling the awaiting task aborts the request in flight.
+
+    Args:
+        client (httpx.AsyncClient): Client to use
+        api_url (str): Base URL of the API (``FASTDL_API_URL``)
+        timeout (float): Seconds each connect, read or write may take
+    """
+
+    name = 'http'
+
+    def __init__(self, client, api_url=None, timeout=REQUEST_TIMEOUT):
+        self.client = client
+        self.api_url = api_url or FASTDL_API_URL
+        if not self.api_url.endswith('/'):
+            self.api_url += '/'
+        self.upstream = urlsplit(self.api_url).hostname
+        self.timeout = timeout
+
+    async def _request(self, method, path, **kwargs):
+        response = await self.client.request(
+            method, urljoin(self.api_url, path), timeout=httpx.Timeout(stage_timeout(self.timeout), pool=None), **kwargs
+        )
+        response.raise_for_status()
+        return response
+
+    async def _search(self, query):
+        with span("search"):
+            return await self._request('POST', 'search', data={'q': query})
+
+    async def iter_story_urls(self, username, seen=None):
+        """
+        Yield the story download URLs for a profile one page at a time, as the pages arrive.
+
+        Args:
+            username (str): Instagram username
+            seen (set): ``link_key`` values of stories seen on earlier polls
+
+        Yields:
+            list: The new candidate download URLs of one page (not yet validated)
+        """
+        logger.info(f"Searching fastdl.app API for {username}")
+        search = await self._search(username)
+        user_id = None
+        if 'json' in search.headers.get('content-type', ''):
+            user_id = (search.json().get('user') or {}).get('id')
+
+        cursor = None
+        for page in range(MAX_PAGES):
+            params = {'username': username}
+            if user_id:
+                params['user_id'] = user_id
+            if cursor:
+                params['cursor'] = cursor
+            with span("stories_page", page=page + 1):
+                response = await self._request('GET', 'stories', params=params)
+            page_urls, cursor = parse_download_links(response)
+            new_urls, reached_seen = _unseen(page_urls, seen)
+            logger.info(f"Stories page {page + 1}: {len(page_urls)} links, {len(new_urls)} new")
+            if new_urls:
+                yield new_urls
+            if reached_seen:
+                logger.info(f"Reached an already seen story for {username}, not loading more pages")
+                break
+            if not cursor:
+                break
+
+    async def get_story_urls(self, username, seen=None):
+        urls = [url async for page in self.iter_story_urls(username, seen) for url in page]
+        logger.info(f"Found {len(urls)} download links for {username}")
+        return urls
+
+    async def get_reel_urls(self, reel_url):
+        logger.info(f"Searching fastdl.app API for reel {reel_url}")
+        urls, _ = parse_download_links(await self._search(reel_url))
+        logger.info(f"Found {len(urls)} download links for reel")
+        return urls
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,325 @@
+"""
+Local stand-in for fastdl.app so the scrapers can run without network access.
+
+Serves the search and stories API used by the HTTP extraction backend, a fake
+media CDN behind it and a page imitating the fastdl.app UI (consent button,
+search form, ad modal, stories tab, paginated "See more" and ``a.button--filled``
+download links) for the Selenium scrapers. Point the scrapers at it with
+``FASTDL_URL=http://127.0.0.1:<port>/`` and ``FASTDL_API_URL=http://127.0.0.1:<port>/api/``.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the markup the scrapers look for on fastdl.app; the ad modal doesn't
+# block clicks, so scrapers that never remove it still get through
+UI_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>FastDl - Instagram Downloader</title>
+<style>
+.ads-modal { position: fixed; top: 10px; right: 10px; width: 300px; height: 250px; background: #eee; pointer-events: none; }
+.profile-media-list { list-style: none; }
+</style>
+</head>
+<body>
+<div class="consent-dialog"><p>This site uses cookies.</p><button aria-label="Consent">Consent</button></div>
+<form class="search-form" onsubmit="return false">
+<input id="search-form-input" type="text" placeholder="Insert Instagram link or username">
+<button class="search-form__button" type="button">Download</button>
+</form>
+<div id="results"></div>
+<script>
+var API_URL = '/api/';
+var results = document.getElementById('results');
+var username = null;
+
+function element(tag, className, text) {
+    var node = document.createElement(tag);
+    if (className) { node.className = className; }
+    if (text) { node.textContent = text; }
+    return node;
+}
+
+function renderItems(list, items) {
+    items.forEach(function (item) {
+        var entry = element('li', 'profile-media-list__item');
+        if (item.thumbnail) {
+            var image = element('img');
+            image.src = item.thumbnail;
+            entry.appendChild(image);
+        }
+        var link = element('a', 'button button--filled', item.type === 'video' ? 'Download video' : 'Download photo');
+        link.href = item.url;
+        entry.appendChild(link);
+        list.appendChild(entry);
+    });
+}
+
+function renderSeeMore(list, cursor) {
+    var existing = document.querySelector('.button--see-more');
+    if (existing) { existing.remove(); }
+    if (!cursor) { return; }
+    var button = element('button', 'button button--see-more profile-media-list__button--see-more', 'See more');
+    button.addEventListener('click', function () { loadStories(list, cursor); });
+    list.parentNode.appendChild(button);
+}
+
+function loadStories(list, cursor) {
+    var query = '?username=' + encodeURIComponent(username) + (cursor ? '&cursor=' + encodeURIComponent(cursor) : '');
+    fetch(API_URL + 'stories' + query).then(function (response) { return response.json(); }).then(function (page) {
+        renderItems(list, page.items);
+        renderSeeMore(list, page.next_cursor);
+    });
+}
+
+document.querySelector("button[aria-label='Consent']").addEventListener('click', function () {
+    document.querySelector('.consent-dialog').remove();
+});
+
+document.querySelector('.search-form__button').addEventListener('click', function () {
+    var query = document.getElementById('search-form-input').value;
+    fetch(API_URL + 'search', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/x-www-form-urlencoded'},
+        body: 'q=' + encodeURIComponent(query)
+    }).then(function (response) { return response.json(); }).then(function (data) {
+        results.innerHTML = '';
+        document.body.appendChild(element('div', 'ads-modal', 'Advertisement'));
+        var list = element('ul', 'profile-media-list');
+        if (data.items) {
+            renderItems(list, data.items);
+            results.appendChild(list);
+            return;
+        }
+        username = data.user.username;
+        var tabs = element('ul', 'tabs-component');
+        ['posts', 'stories', 'highlights'].forEach(function (name) {
+            var tab = element('li', 'tabs-component__item');
+            var button = element('button', null, name);
+            if (name === 'stories') {
+                button.addEventListener('click', function () { loadStories(list); });
+            }
+            tab.appendChild(button);
+            tabs.appendChild(tab);
+        });
+        results.appendChild(tabs);
+        results.appendChild(list);
+    });
+});
+</script>
+</body>
+</html>
+"""
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 256
+
+
+class FakeFastdl:
+    """
+    Fake fastdl.app server.
+
+    Args:
+        stories (int): Stories every profile has
+        page_size (int): Stories returned per page before a "See more" cursor
+        media_size (int): Bytes served for every CDN media file
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free one)
+        latency (float): Seconds added to every page and API response
+        cdn_latency (float): Seconds added to every CDN response
+        reel_items (int): Download links returned for a reel
+    """
+
+    def __init__(self, stories=12, page_size=5, media_size=64 * 1024, host="127.0.0.1", port=0,
+                 latency=0.0, cdn_latency=0.0, reel_items=1):
+        self.stories = stories
+        self.page_size = page_size
+        self.media_size = media_size
+        self.latency = latency
+        self.cdn_latency = cdn_latency
+        self.reel_items = reel_items
+        self.requests = 0
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def api_url(self):
+        return self.base_url + "api/"
+
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-fastdl", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake fastdl.app listening on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def media_url(self, owner, index):
+        extension = "mp4" if index % 2 else "jpg"
+        signature = zlib.crc32(f"{owner}/{index}".encode())
+        return f"{self.base_url}cdn/{owner}/{index}.{extension}?stp=dst&_nc_sig={signature}&oe=1"
+
+    def media_body(self, path):
+        """Deterministic bytes for a media path, so repeated downloads can be compared"""
+        seed = zlib.crc32(path.encode()).to_bytes(4, "big")
+        return (seed * (self.media_size // 4 + 1))[:self.media_size]
+
+    def story_page(self, username, offset):
+        end = min(offset + self.page_size, self.stories)
+        items = [
+            {
+                'url': self.media_url(username, index),
+                'type': 'video' if index % 2 else 'image',
+                'thumbnail': f"{self.base_url}cdn/{username}/{index}.thumb.jpg",
+            }
+            for index in range(offset, end)
+        ]
+        return {'items': items, 'next_cursor': str(end) if end < self.stories else None}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send(self, status, body, content_type, head_only=False, headers=None):
+                fake.requests += 1
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Accept-Ranges", "bytes")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if not head_only:
+                    try:
+                        self.wfile.write(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Clients may hang up after reading only the headers
+                        pass
+
+            def _send_json(self, status, data):
+                self._send(status, json.dumps(data).encode(), "application/json")
+
+            def _media(self, path, head_only):
+                content_type = "video/mp4" if path.endswith(".mp4") else "image/jpeg"
+                body = fake.media_body(path)
+                byte_range = self.headers.get("Range", "")
+                if not byte_range.startswith("bytes="):
+                    self._send(200, body, content_type, head_only)
+                    return
+
+                first, _, last = byte_range[len("bytes="):].partition("-")
+                first = int(first)
+                last = min(int(last), len(body) - 1) if last else len(body) - 1
+                if first >= len(body):
+                    self._send(416, b"", content_type, head_only, {"Content-Range": f"bytes */{len(body)}"})
+                    return
+                self._send(206, body[first:last + 1], content_type, head_only,
+                           {"Content-Range": f"bytes {first}-{last}/{len(body)}"})
+
+            def _delay(self, path):
+                seconds = fake.cdn_latency if path.startswith("/cdn/") else fake.latency
+                if seconds:
+                    time.sleep(seconds)
+
+            def do_HEAD(self):
+                path = urlparse(self.path).path
+                self._delay(path)
+                if path.startswith("/cdn/"):
+                    self._media(path, head_only=True)
+                else:
+                    self._send(404, b"", "text/plain", head_only=True)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                self._delay(parsed.path)
+                if parsed.path.startswith("/cdn/"):
+                    self._media(parsed.path, head_only=False)
+                elif parsed.path == "/":
+                    self._send(200, UI_PAGE.encode(), "text/html; charset=utf-8")
+                elif parsed.path == "/api/stories":
+                    username = query.get("username", [""])[0]
+                    offset = int(query.get("cursor", ["0"])[0])
+                    self._send_json(200, fake.story_page(username, offset))
+                else:
+                    self._send(404, b"Not found", "text/plain")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                self._delay(urlparse(self.path).path)
+                if urlparse(self.path).path != "/api/search":
+                    self._send(404, b"Not found", "text/plain")
+                    return
+
+                query = form.get("q", [""])[0]
+                if "instagram.com" in query:
+                    owner = f"reel-{zlib.crc32(query.encode())}"
+                    items = [
+                        {'url': fake.media_url(owner, index), 'type': 'video' if index % 2 else 'image'}
+                        for index in range(1, fake.reel_items + 1)
+                    ]
+                    self._send_json(200, {'items': items})
+                elif query:
+                    self._send_json(200, {'user': {'username': query, 'id': str(zlib.crc32(query.encode()))}})
+                else:
+                    self._send_json(400, {'error': 'empty query'})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake fastdl.app server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stories", type=int, default=12)
+    parser.add_argument("--page-size", type=int, default=5)
+    parser.add_argument("--media-size", type=int, default=64 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every page and API response")
+    parser.add_argument("--cdn-latency", type=float, default=0.0, help="Seconds added to every CDN response")
+    parser.add_argument("--reel-items", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    server = FakeFastdl(args.stories, args.page_size, args.media_size, port=args.port,
+                        latency=args.latency, cdn_latency=args.cdn_latency, reel_items=args.reel_items)
+    server.start()
+    print(f"FASTDL_URL={server.base_url}")
+    print(f"FASTDL_API_URL={server.api_url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
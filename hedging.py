@@ -0,0 +1,275 @@
+"""
+Hedged requests across several extraction providers.
+
+``EXTRACTION_PROVIDERS`` lists the backends that can answer a story or reel
+lookup. A request goes to the fastest healthy provider first. If it hasn't
+answered within that provider's p95 latency, or it fails, the request is also
+sent to the next provider, as long as that one is on another upstream host
+(a failed request always moves on to the next). The first complete result
+wins and the other attempts are cancelled. That cuts off the latency spikes of any single
+provider without doubling the load the rest of the time.
+
+``ProviderTracker`` keeps each provider's recent latencies and outcomes, for
+the routing order and the hedge delay.
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from metrics import HEDGES, PROVIDER_REQUESTS, PROVIDER_SECONDS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+HEDGE_QUANTILE = float(os.environ.get("HEDGE_QUANTILE", "0.95"))
+# Hedge delay while a provider has too few samples for a quantile, and the floor under it
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", "10"))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "0.5"))
+# Provider stats cover the last PROVIDER_WINDOW requests within PROVIDER_WINDOW_SECONDS
+PROVIDER_WINDOW = int(os.environ.get("PROVIDER_WINDOW", "50"))
+PROVIDER_WINDOW_SECONDS = float(os.environ.get("PROVIDER_WINDOW_SECONDS", "600"))
+PROVIDER_MIN_SAMPLES = int(os.environ.get("PROVIDER_MIN_SAMPLES", "5"))
+PROVIDER_MAX_FAILURE_RATE = float(os.environ.get("PROVIDER_MAX_FAILURE_RATE", "0.5"))
+
+
+def quantile(values, q):
+    """Nearest-rank quantile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class ProviderTracker:
+    """
+    Recent latency and success of each extraction provider.
+
+    Outcomes older than ``max_age`` are forgotten. A provider that was marked
+    unhealthy and then left idle therefore gets tried again later.
+
+    Args:
+        window (int): Outcomes kept per provider
+        max_age (float): Seconds an outcome counts for
+        min_samples (int): Outcomes needed before latency and health are judged
+        max_failure_rate (float): Failure share above which a provider is unhealthy
+    """
+
+    def __init__(self, window=PROVIDER_WINDOW, max_age=PROVIDER_WINDOW_SECONDS, min_samples=PROVIDER_MIN_SAMPLES,
+                 max_failure_rate=PROVIDER_MAX_FAILURE_RATE):
+        self.window = window
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider, ok, duration):
+        """
+        Record a finished request.
+
+        Args:
+            provider (str): Provider name
+            ok (bool): Whether it returned a result
+            duration (float): Seconds it took
+        """
+        with self._lock:
+            outcomes = self._outcomes.setdefault(provider, deque(maxlen=self.window))
+            outcomes.append((time.monotonic(), ok, duration))
+
+    def _recent(self, provider):
+        cutoff = time.monotonic() - self.max_age
+        outcomes = self._outcomes.get(provider, ())
+        while outcomes and outcomes[0][0] < cutoff:
+            outcomes.popleft()
+        return list(outcomes)
+
+    def _summary(self, provider):
+        outcomes = self._recent(provider)
+        latencies = [duration for _, ok, duration in outcomes if ok]
+        failures = sum(1 for _, ok, _ in outcomes if not ok)
+        known = len(outcomes) >= self.min_samples
+        return {
+            'requests': len(outcomes),
+            'failures': failures,
+            'healthy': not known or failures <= self.max_failure_rate * len(outcomes),
+            'p50': quantile(latencies, 0.5) if len(latencies) >= self.min_samples else None,
+            'p95': quantile(latencies, HEDGE_QUANTILE) if len(latencies) >= self.min_samples else None,
+        }
+
+    def ranked(self, providers):
+        """
+        Order providers for a request: healthy before unhealthy, then fastest median first.
+
+        Providers without enough samples go first so they get measured; ties keep the given order.
+
+        Returns:
+            list: Provider names
+        """
+        with self._lock:
+            summaries = {provider: self._summary(provider) for provider in providers}
+        order = {provider: index for index, provider in enumerate(providers)}
+        return sorted(providers, key=lambda provider: (
+            not summaries[provider]['healthy'], summaries[provider]['p50'] or 0.0, order[provider]
+        ))
+
+    def hedge_delay(self, provider):
+        """Seconds to wait for ``provider`` before also asking the next one"""
+        with self._lock:
+            p95 = self._summary(provider)['p95']
+        return HEDGE_DEFAULT_DELAY if p95 is None else max(HEDGE_MIN_DELAY, p95)
+
+    def stats(self):
+        """
+        Get per-provider statistics.
+
+        Returns:
+            dict: Per provider, recent ``requests``, ``failures``, ``healthy`` and ``p50``/``p95`` latency
+        """
+        with self._lock:
+            return {provider: self._summary(provider) for provider in self._outcomes}
+
+
+provider_tracker = ProviderTracker()
+
+
+class HedgedBackend:
+    """
+    Async backend that sends each lookup to several providers with hedging.
+
+    Args:
+        backends (dict): Async backends by provider name, in the configured order
+        tracker (ProviderTracker): Latency and health statistics to route by
+    """
+
+    name = 'hedged'
+
+    def __init__(self, backends, tracker=None):
+        self.backends = backends
+        self.tracker = tracker or provider_tracker
+
+    async def _attempt(self, provider, call):
+        start = time.monotonic()
+        try:
+            with span("provider", provider=provider):
+                result = await call(self.backends[provider])
+        except asyncio.CancelledError:
+            PROVIDER_REQUESTS.labels(provider, 'cancelled').inc()
+            raise
+        except Exception:
+            duration = time.monotonic() - start
+            self.tracker.record(provider, False, duration)
+            PROVIDER_REQUESTS.labels(provider, 'error').inc()
+            raise
+        duration = time.monotonic() - start
+        self.tracker.record(provider, True, duration)
+        PROVIDER_SECONDS.labels(provider).observe(duration)
+        PROVIDER_REQUESTS.labels(provider, 'ok').inc()
+        return result
+
+    async def _hedged(self, call):
+        """
+        Run ``call(backend)`` on the best provider, hedging to the next ones when it is slow or fails.
+
+        A slow provider is only hedged to a provider on another upstream host:
+        asking the same host twice doesn't help when that host is slow, and
+        doubles the load on it. A failed provider is always followed by the next.
+
+        Returns:
+            The first result any provider returns
+
+        Raises:
+            Exception: The last provider's error if every provider failed
+        """
+        loop = asyncio.get_running_loop()
+        waiting = self.tracker.ranked(list(self.backends))
+        pending = {}
+        hedge_at = None
+        error = None
+
+        def independent():
+            """Next waiting provider whose upstream host no running attempt is asking already"""
+            busy = {self.backends[provider].upstream for provider, _, _ in pending.values()}
+            for provider in waiting:
+                upstream = self.backends[provider].upstream
+                if upstream is None or upstream not in busy:
+                    return provider
+            return None
+
+        def launch(provider, reason=None):
+            nonlocal hedge_at
+            waiting.remove(provider)
+            if reason:
+                HEDGES.labels(reason).inc()
+                logger.info(f"Hedging to {provider}: {', '.join(p for p, _, _ in pending.values()) or 'previous provider'} {reason}")
+            delay = self.tracker.hedge_delay(provider)
+            pending[asyncio.ensure_future(self._attempt(provider, call))] = (provider, time.monotonic(), delay)
+            hedge_at = loop.time() + delay if independent() else None
+
+        launch(waiting[0])
+        try:
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - loop.time())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(independent(), 'slow')
+                    continue
+                winner = None
+                for task in done:
+                    provider, _, _ = pending.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        logger.warning(f"Provider {provider} failed: {error}")
+                    elif winner is None:
+                        winner = task
+                        logger.info(f"{provider} answered first")
+                if winner is not None:
+                    # The time a loser had taken is no latency sample. One that outlasted its own
+                    # hedge delay was too slow and counts as a failure; one launched late records nothing.
+                    for provider, started, delay in pending.values():
+                        elapsed = time.monotonic() - started
+                        if elapsed >= delay:
+                            self.tracker.record(provider, False, elapsed)
+                    return winner.result()
+                if not pending and waiting:
+                    launch(waiting[0], 'failed')
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_story_urls(self, username, seen=None):
+        """
+        Yield story URLs page by page from whichever provider delivers a first page first.
+
+        Only the first page is hedged; the rest stream from the winning provider as they arrive.
+        """
+        async def first_page(backend):
+            pages = backend.iter_story_urls(username, seen)
+            try:
+                return await pages.__anext__(), pages
+            except StopAsyncIteration:
+                return None, pages
+            except BaseException:
+                await pages.aclose()
+                raise
+
+        page, pages = await self._hedged(first_page)
+        try:
+            while page is not None:
+                yield page
+                try:
+                    page = await pages.__anext__()
+                except StopAsyncIteration:
+                    page = None
+        finally:
+            await pages.aclose()
+
+    async def get_story_urls(self, username, seen=None):
+        return await self._hedged(lambda backend: backend.get_story_urls(username, seen))
+
+    async def get_reel_urls(self, reel_url):
+        return await self._hedged(lambda backend: backend.get_reel_urls(reel_url))
+
+    async def close(self):
+        """The provider backends are shared and closed by their owner"""
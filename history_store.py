@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = os.environ.get("HISTORY_PATH", "logs/download_history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    type TEXT NOT NULL,
+    target TEXT NOT NULL COLLATE NOCASE,
+    links_found INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    time_saved REAL NOT NULL DEFAULT 0,
+    links TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_target ON history (target, timestamp);
+CREATE INDEX IF NOT EXISTS history_type ON history (type, timestamp);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS history_session ON history (session, id);
+"""
+
+COLUMNS = "type, target, links_found, timestamp, time_saved, links"
+
+
+def _bound(value, next_day=False):
+    """ISO string for a date/datetime filter; a plain date as an upper bound includes the whole day"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return (value + timedelta(days=1) if next_day else value).isoformat()
+    return value
+
+
+class HistoryStore:
+    """
+    Append-only download history of the interactive downloader, backed by SQLite.
+
+    Every entry is committed as soon as it is added, so the history survives
+    crashes and grows across sessions without being held in memory. Queries
+    by target, type and date use indexes and return iterators, so exporting or
+    paging through a long history never loads all of it.
+
+    Args:
+        path (str): SQLite database file
+        session (str): ID of the current session (defaults to its start time)
+    """
+
+    def __init__(self, path=HISTORY_PATH, session=None):
+        self.path = path
+        self.session = session or datetime.now().isoformat(timespec='seconds')
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def append(self, entry):
+        """
+        Add one history entry and commit it.
+
+        Args:
+            entry (dict): ``type``, ``target``, ``links_found``, ``timestamp`` (ISO string),
+                ``time_saved`` and ``links``
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO history (session, {COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.session, entry['type'], entry['target'], entry['links_found'], entry['timestamp'],
+                 entry.get('time_saved', 0), json.dumps(entry['links'], ensure_ascii=False)),
+            )
+
+    def _where(self, target=None, type=None, since=None, until=None, session=None):
+        clauses, params = [], []
+        if target:
+            clauses.append("target = ?")
+            params.append(target)
+        if type:
+            clauses.append("type = ?")
+            params.append(type)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(_bound(since))
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(_bound(until, next_day=True))
+        if session:
+            clauses.append("session = ?")
+            params.append(session)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, target=None, type=None, since=None, until=None, session=None, limit=None, newest_first=True):
+        """
+        Iterate over matching entries.
+
+        Args:
+            target (str): Username or reel URL (case-insensitive exact match)
+            type (str): "stories" or "reel"
+            since (date or datetime): Earliest entry time
+            until (date or datetime): Latest entry time (a date includes that whole day)
+            session (str): Only entries from this session
+            limit (int): Maximum number of entries
+            newest_first (bool): Order by time, newest or oldest first
+
+        Yields:
+            dict: History entries in the format they were added in
+        """
+        where, params = self._where(target, type, since, until, session)
+        sql = f"SELECT {COLUMNS} FROM history{where} ORDER BY timestamp {'DESC' if newest_first else 'ASC'}, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        # A cursor of its own, so entries stream from SQLite while other calls use the connection
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, params)
+        for row in cursor:
+            yield {
+                'type': row[0],
+                'target': row[1],
+                'links_found': row[2],
+                'timestamp': row[3],
+                'time_saved': row[4],
+                'links': json.loads(row[5]),
+            }
+
+    def totals(self, **filters):
+        """
+        Count matching entries and their links.
+
+        Returns:
+            dict: ``entries`` and ``links``
+        """
+        where, params = self._where(**filters)
+        with self._lock:
+            entries, links = self.conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(links_found), 0) FROM history{where}", params
+            ).fetchone()
+        return {'entries': entries, 'links': links}
+
+    def export(self, file, header=None, **filters):
+        """
+        Write matching entries to ``file`` as one JSON document, one entry at a time.
+
+        The document has the layout earlier exports had: the ``header`` fields,
+        then ``download_history`` and ``total_entries``.
+
+        Args:
+            file: Text file open for writing
+            header (dict): Extra top-level fields, written first
+            **filters: Filters as for ``query``
+
+        Returns:
+            int: Number of entries written
+        """
+        file.write("{\n")
+        for key, value in (header or {}).items():
+            file.write(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False, default=str)},\n")
+        file.write('  "download_history": [')
+        count = 0
+        for entry in self.query(newest_first=False, **filters):
+            file.write(",\n    " if count else "\n    ")
+            file.write(json.dumps(entry, ensure_ascii=False))
+            count += 1
+        file.write("\n  ],\n" if count else "],\n")
+        file.write(f'  "total_entries": {count}\n}}\n')
+        logger.info(f"Exported {count} history entries")
+        return count
+
+    def close(self):
+        self.conn.close()
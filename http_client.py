@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import get_rate_limiter, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "10"))
+VALIDATION_WORKERS = int(os.environ.get("VALIDATION_WORKERS", "8"))
+PER_HOST_CONNECTIONS = int(os.environ.get("PER_HOST_CONNECTIONS", "4"))
+MAX_POOLED_HOSTS = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+class RateLimitedAdapter(HTTPAdapter):
+    """``HTTPAdapter`` that sends every request (and redirect hop) under the host's rate limit"""
+
+    def send(self, request, **kwargs):
+        limiter = get_rate_limiter()
+        limiter.acquire(request.url)
+        try:
+            response = super().send(request, **kwargs)
+        except requests.exceptions.Timeout:
+            limiter.record(request.url, timed_out=True)
+            raise
+        limiter.record(request.url, response.status_code, retry_after=retry_after_seconds(response.headers.get('retry-after')))
+        return response
+
+def create_session(per_host_connections=PER_HOST_CONNECTIONS):
+    """
+    Create a keep-alive HTTP session with a bounded connection pool per host.
+
+    Requests beyond ``per_host_connections`` to the same host block until a
+    connection is free instead of opening extra sockets, and every request
+    waits for its turn under the host's rate limit.
+
+    Args:
+        per_host_connections (int): Maximum open connections per host
+
+    Returns:
+        requests.Session: The configured session
+    """
+    session = requests.Session()
+    adapter = RateLimitedAdapter(
+        pool_connections=MAX_POOLED_HOSTS,
+        pool_maxsize=per_host_connections,
+        pool_block=True,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+def get_session():
+    """
+    Get the process-wide pooled HTTP session, creating it on first use.
+
+    Returns:
+        requests.Session: The shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+class _SlotReleasingStream(httpx.AsyncByteStream):
+    """Body of a streamed response that gives back its in-flight slot once the response is closed"""
+
+    def __init__(self, stream, slots):
+        self._stream = stream
+        self._slots = slots
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._slots.release()
+
+class _QueuedAsyncClient(httpx.AsyncClient):
+    """
+    ``httpx.AsyncClient`` that sends requests under their host's rate limit and
+    admits at most ``max_in_flight`` of them into its connection pool.
+
+    A streamed response holds its slot until it is closed, as ``client.stream()`` does on exit.
+    """
+
+    def __init__(self, *args, max_in_flight, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def send(self, request, *, stream=False, **kwargs):
+        url = str(request.url)
+        limiter = get_rate_limiter()
+        await limiter.acquire_async(url)
+        try:
+            if stream:
+                await self._in_flight.acquire()
+                try:
+                    response = await super().send(request, stream=True, **kwargs)
+                except BaseException:
+                    self._in_flight.release()
+                    raise
+                response.stream = _SlotReleasingStream(response.stream, self._in_flight)
+            else:
+                async with self._in_flight:
+                    response = await super().send(request, **kwargs)
+        except httpx.TimeoutException:
+            await limiter.record_async(url, timed_out=True)
+            raise
+        await limiter.record_async(url, response.status_code,
+                                   retry_after=retry_after_seconds(response.headers.get('retry-after')))
+        return response
+
+def create_async_client(per_host_connections=PER_HOST_CONNECTIONS, timeout=REQUEST_TIMEOUT):
+    """
+    Create a keep-alive HTTP client for asyncio code.
+
+    Requests waiting for a free connection are suspended coroutines queued on
+    a semaphore rather than blocked threads, so any number of them can wait
+    (httpx's own pool queue gets slower the more requests wait in it).
+    ``timeout`` bounds every connect, read and write await but not the wait
+    for a connection. httpx limits connections per client, not per host, so the
+    limit is sized like the pooled session's total.
+
+    Args:
+        per_host_connections (int): Connections per host the limit is sized for
+        timeout (float): Seconds each connect, read or write may take
+
+    Returns:
+        httpx.AsyncClient: The configured client (close it with ``aclose()``)
+    """
+    connections = MAX_POOLED_HOSTS * per_host_connections
+    return _QueuedAsyncClient(
+        headers={'User-Agent': USER_AGENT},
+        limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        timeout=httpx.Timeout(timeout, pool=None),
+        max_in_flight=connections,
+    )
+
+def _link_status(response):
+    """(is_valid, status) for the response to a link check"""
+    if 200 <= response.status_code < 300:
+        content_length = response.headers.get('content-length')
+        content_type = response.headers.get('content-type', '')
+
+        size_info = ""
+        if content_length:
+            size_mb = int(content_length) / (1024 * 1024)
+            size_info = f" ({size_mb:.1f} MB)"
+
+        return True, f"Valid{size_info} - {content_type}"
+    else:
+        return False, f"HTTP {response.status_code}"
+
+def check_link(url, timeout=REQUEST_TIMEOUT, session=None):
+    """
+    Check that a download link answers with a success status.
+
+    Args:
+        url (str): Link to check
+        timeout (float): Request timeout in seconds
+        session (requests.Session): Session to use (defaults to the shared one)
+
+    Returns:
+        tuple: (is_valid, status) where status describes the size/type or the failure
+    """
+    session = session or get_session()
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        return _link_status(response)
+
+    except requests.exceptions.Timeout:
+        return False, "Timeout"
+    except requests.exceptions.RequestException as e:
+        return False, f"Network error: {str(e)[:30]}"
+
+def validate_links(urls, max_workers=VALIDATION_WORKERS, timeout=REQUEST_TIMEOUT, session=None):
+    """
+    Check many download links concurrently over the shared connection pool.
+
+    Args:
+        urls (list): Links to check
+        max_workers (int): Number of links checked in parallel
+        timeout (float): Per-request timeout in seconds
+        session (requests.Session): Session to use (defaults to the shared one)
+
+    Returns:
+        list: (is_valid, status) tuples in the same order as ``urls``
+    """
+    if not urls:
+        return []
+
+    session = session or get_session()
+    workers = max(1, min(max_workers, len(urls)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="validate") as executor:
+        results = list(executor.map(lambda url: check_link(url, timeout, session), urls))
+
+    valid = sum(1 for is_valid, _ in results if is_valid)
+    logger.info(f"Validated {len(urls)} links with {workers} workers: {valid} valid")
+    return results
+
+async def check_link_async(url, client, timeout=REQUEST_TIMEOUT):
+    """
+    asyncio version of ``check_link``.
+
+    Args:
+        url (str): Link to check
+        client (httpx.AsyncClient): Client to use
+        timeout (float): Seconds each connect, read or write may take
+
+    Returns:
+        tuple: (is_valid, status) where status describes the size/type or the failure
+    """
+    try:
+        response = await client.head(url, follow_redirects=True, timeout=httpx.Timeout(timeout, pool=None))
+        return _link_status(response)
+
+    except httpx.TimeoutException:
+        return False, "Timeout"
+    except httpx.HTTPError as e:
+        return False, f"Network error: {str(e)[:30]}"
+
+async def validate_links_async(urls, client, max_concurrency=VALIDATION_WORKERS, timeout=REQUEST_TIMEOUT):
+    """
+    asyncio version of ``validate_links``: at most ``max_concurrency`` checks run at once.
+
+    Args:
+        urls (list): Links to check
+        client (httpx.AsyncClient): Client to use
+        max_concurrency (int): Number of links checked in parallel
+        timeout (float): Seconds each connect, read or write may take
+
+    Returns:
+        list: (is_valid, status) tuples in the same order as ``urls``
+    """
+    if not urls:
+        return []
+
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def check(url):
+        async with slots:
+            return await check_link_async(url, client, timeout)
+
+    results = await asyncio.gather(*(check(url) for url in urls))
+
+    valid = sum(1 for is_valid, _ in results if is_valid)
+    logger.info(f"Validated {len(urls)} links, {max_concurrency} at a time: {valid} valid")
+    return results
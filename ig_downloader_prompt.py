@@ -1,10 +1,7 @@
 import logging
 import os
 import sys
-import json
-import time
-import requests
-from datetime import datetime
+from datetime import date, datetime
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,6 +9,12 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 from colorama import Fore, Back, Style, init
+from browser_profiles import describe_page_metrics, get_profile, page_load_metrics
+from extraction_backends import FASTDL_URL, collect_download_links
+from history_store import HistoryStore
+from http_client import check_link, validate_links
+from rate_limiter import get_rate_limiter, navigate
+from page_readiness import ReadinessTracker, count_elements, install_observers, wait_until_ready, wait_for_new_items
 
 # Initialize colorama for cross-platform colored terminal output
 init(autoreset=True)
@@ -19,15 +22,19 @@ init(autoreset=True)
 class InstagramDownloader:
     """Enhanced Instagram Downloader with visual browser and additional features"""
     
-    def __init__(self):
+    def __init__(self, backend=None, profile="visual", history=None):
         self.setup_logging()
-        self.download_history = []
+        self.backend = backend
+        self.profile = get_profile(profile)
         self.session_stats = {
             'stories_downloaded': 0,
             'reels_downloaded': 0,
             'total_links': 0,
+            'time_saved': 0.0,
             'session_start': datetime.now()
         }
+        # Entries are written as they are produced and kept across sessions (HISTORY_PATH)
+        self.history = history or HistoryStore(session=self.session_stats['session_start'].isoformat(timespec='seconds'))
     
     def setup_logging(self):
         """Setup enhanced logging with colors"""
@@ -190,23 +197,8 @@ class InstagramDownloader:
                 print(f"{Fore.RED}❌ Error: {e}. Please try again.{Style.RESET_ALL}")
 
     def setup_visual_driver(self):
-        """Setup Chrome WebDriver in visual mode with enhanced options"""
-        options = webdriver.ChromeOptions()
-        
-        # Enhanced Chrome options for better visual experience
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--window-size=1920,1080')
-        options.add_argument('--start-maximized')
-        options.add_argument('--disable-web-security')
-        options.add_argument('--disable-features=VizDisplayCompositor')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_experimental_option('excludeSwitches', ['enable-automation'])
-        options.add_experimental_option('useAutomationExtension', False)
-        
-        # Add user agent to appear more like a real browser
-        options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+        """Setup Chrome WebDriver options for the selected browser profile"""
+        options = self.profile.options()
         
         # Try different Chrome/Chromium binary locations
         possible_binaries = [
@@ -241,14 +233,14 @@ class InstagramDownloader:
         for i, strategy in enumerate(strategies):
             try:
                 driver = strategy()
-                self.logger.info(f"WebDriver created successfully using strategy {i+1}")
-                return driver
+                self.logger.info(f"WebDriver created successfully using strategy {i+1} ({self.profile.name} profile)")
+                return self.profile.prepare(driver)
             except Exception as e:
                 self.logger.warning(f"Strategy {i+1} failed: {e}")
         
         raise Exception("Failed to create WebDriver with all strategies")
 
-    def handle_page_interactions(self, driver):
+    def handle_page_interactions(self, driver, readiness):
         """Handle common page interactions (cookies, ads, etc.)"""
         # Handle cookies consent
         try:
@@ -258,7 +250,7 @@ class InstagramDownloader:
             )
             cookies_button.click()
             print(f"{Fore.GREEN}✅ Cookies consent handled{Style.RESET_ALL}")
-            time.sleep(1)
+            wait_until_ready(driver, readiness, "cookies consent", replaces=1)
         except Exception as e:
             self.logger.info(f"No cookies button found: {e}")
             print(f"{Fore.YELLOW}⚠️ No cookies dialog found{Style.RESET_ALL}")
@@ -276,50 +268,30 @@ class InstagramDownloader:
 
     def validate_download_link(self, url, timeout=10):
         """Validate download link with enhanced checking"""
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.head(url, timeout=timeout, headers=headers, allow_redirects=True)
-            
-            if 200 <= response.status_code < 300:
-                # Try to get content info
-                content_length = response.headers.get('content-length')
-                content_type = response.headers.get('content-type', '')
-                
-                size_info = ""
-                if content_length:
-                    size_mb = int(content_length) / (1024 * 1024)
-                    size_info = f" ({size_mb:.1f} MB)"
-                
-                return True, f"Valid{size_info} - {content_type}"
-            else:
-                return False, f"HTTP {response.status_code}"
-                
-        except requests.exceptions.Timeout:
-            return False, "Timeout"
-        except requests.exceptions.RequestException as e:
-            return False, f"Network error: {str(e)[:30]}"
+        return check_link(url, timeout=timeout)
 
-    def get_instagram_story_links(self, username):
-        """Enhanced story links fetcher with better error handling"""
-        print(f"{Fore.GREEN}🔍 Starting to fetch stories for username: @{username}{Style.RESET_ALL}")
-        self.logger.info(f"Starting to fetch stories for username: {username}")
-        
+    def validate_download_links(self, urls, timeout=10):
+        """Validate many download links concurrently, results in the original order"""
+        print(f"{Fore.CYAN}🔄 Validating {len(urls)} links in parallel...{Style.RESET_ALL}")
+        return validate_links(urls, timeout=timeout)
+
+    def collect_story_urls_visual(self, username, readiness):
+        """Walk the fastdl.app UI in a visible browser and collect the story download URLs"""
         driver = None
-        download_links = []
         
         try:
-            print(f"{Fore.BLUE}🌐 Initializing Chrome WebDriver (Visual Mode)...{Style.RESET_ALL}")
+            print(f"{Fore.BLUE}🌐 Initializing Chrome WebDriver ({self.profile.name.title()} Mode)...{Style.RESET_ALL}")
             driver = self.create_driver()
-            driver.maximize_window()
             print(f"{Fore.GREEN}✅ Browser opened successfully!{Style.RESET_ALL}")
 
             print(f"{Fore.BLUE}🌐 Navigating to fastdl.app...{Style.RESET_ALL}")
-            driver.get("https://fastdl.app/")
-            time.sleep(2)
+            navigate(driver, FASTDL_URL)
+            # Observers go in before any click, so the requests clicks send are counted as in flight
+            install_observers(driver)
+            wait_until_ready(driver, readiness, "page load", replaces=2)
+            print(f"{Fore.CYAN}📶 Page {describe_page_metrics(page_load_metrics(driver))}{Style.RESET_ALL}")
 
-            self.handle_page_interactions(driver)
+            self.handle_page_interactions(driver, readiness)
 
             # Username input with enhanced interaction
             print(f"{Fore.BLUE}⌨️ Entering username: @{username}...{Style.RESET_ALL}")
@@ -327,17 +299,18 @@ class InstagramDownloader:
                 EC.presence_of_element_located((By.XPATH, "//input[@id='search-form-input']"))
             )
             url_input.clear()
-            time.sleep(0.5)
             url_input.send_keys(username)
-            time.sleep(1)
+            readiness.skip("enter username", 1.5)
 
             # Submit search
             print(f"{Fore.BLUE}🔍 Submitting search...{Style.RESET_ALL}")
             download_button = WebDriverWait(driver, 20).until(
                 EC.element_to_be_clickable((By.XPATH, "//button[@class='search-form__button']"))
             )
+            get_rate_limiter().acquire(FASTDL_URL)
+            install_observers(driver)
             download_button.click()
-            time.sleep(3)
+            wait_until_ready(driver, readiness, "search results", replaces=3)
 
             # Click Stories tab
             try:
@@ -345,8 +318,9 @@ class InstagramDownloader:
                 stories_tab = WebDriverWait(driver, 20).until(
                     EC.element_to_be_clickable((By.XPATH, "//li[@class='tabs-component__item']/button[contains(text(), 'stories')]"))
                 )
+                install_observers(driver)
                 stories_tab.click()
-                time.sleep(2)
+                wait_until_ready(driver, readiness, "stories tab", replaces=2)
                 print(f"{Fore.GREEN}✅ Stories tab selected{Style.RESET_ALL}")
             except Exception as e:
                 print(f"{Fore.RED}❌ Error accessing Stories section: {e}{Style.RESET_ALL}")
@@ -362,10 +336,13 @@ class InstagramDownloader:
                     see_more_button = WebDriverWait(driver, 5).until(
                         EC.element_to_be_clickable((By.XPATH, "//button[@class='button button--see-more profile-media-list__button--see-more']"))
                     )
+                    item_count = count_elements(driver, "a.button--filled")
+                    get_rate_limiter().acquire(FASTDL_URL)
+                    install_observers(driver)
                     see_more_button.click()
                     see_more_count += 1
                     print(f"{Fore.CYAN}📄 Loaded batch {see_more_count}...{Style.RESET_ALL}")
-                    time.sleep(2)
+                    wait_for_new_items(driver, readiness, "see more", "a.button--filled", item_count, replaces=2)
                 except Exception:
                     break
             
@@ -373,17 +350,40 @@ class InstagramDownloader:
 
             # Get download buttons
             print(f"{Fore.BLUE}🔍 Collecting download links...{Style.RESET_ALL}")
-            download_buttons = WebDriverWait(driver, 20).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a.button--filled"))
+            WebDriverWait(driver, 20).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "a.button--filled"))
             )
-            print(f"{Fore.GREEN}✅ Found {len(download_buttons)} stories{Style.RESET_ALL}")
+            links = collect_download_links(driver, "a.button--filled")
+            videos = sum(1 for link in links if link['type'] == 'video')
+            print(f"{Fore.CYAN}📦 {videos} videos, {len(links) - videos} images{Style.RESET_ALL}")
+            return [link['href'] for link in links]
+
+        finally:
+            if driver:
+                driver.quit()
+                readiness.skip("keep browser open", 5)
+                print(f"{Fore.GREEN}✅ Browser closed{Style.RESET_ALL}")
+
+    def get_instagram_story_links(self, username):
+        """Enhanced story links fetcher with better error handling"""
+        print(f"{Fore.GREEN}🔍 Starting to fetch stories for username: @{username}{Style.RESET_ALL}")
+        self.logger.info(f"Starting to fetch stories for username: {username}")
+        
+        download_links = []
+        readiness = ReadinessTracker(username)
+        
+        try:
+            if self.backend:
+                print(f"{Fore.BLUE}⚡ Using {self.backend.name} backend...{Style.RESET_ALL}")
+                candidate_urls = self.backend.get_story_urls(username)
+            else:
+                candidate_urls = self.collect_story_urls_visual(username, readiness)
+            print(f"{Fore.GREEN}✅ Found {len(candidate_urls)} stories{Style.RESET_ALL}")
 
             # Process download links with validation
-            for index, download_button in enumerate(download_buttons):
-                download_url = download_button.get_attribute("href")
-                print(f"{Fore.CYAN}🔄 Validating link {index + 1}/{len(download_buttons)}...{Style.RESET_ALL}")
-                
-                is_valid, status = self.validate_download_link(download_url)
+            results = self.validate_download_links(candidate_urls)
+
+            for index, (download_url, (is_valid, status)) in enumerate(zip(candidate_urls, results)):
                 if is_valid:
                     download_links.append({
                         'url': download_url,
@@ -401,23 +401,20 @@ class InstagramDownloader:
             self.logger.error(f"Error fetching stories: {e}", exc_info=True)
             print(f"{Fore.RED}❌ Error occurred: {e}{Style.RESET_ALL}")
         
-        finally:
-            if driver:
-                print(f"{Fore.YELLOW}🔄 Keeping browser open for review...{Style.RESET_ALL}")
-                time.sleep(5)
-                driver.quit()
-                print(f"{Fore.GREEN}✅ Browser closed{Style.RESET_ALL}")
-        
         # Update session stats
         self.session_stats['stories_downloaded'] += 1
         self.session_stats['total_links'] += len(download_links)
+        readiness_summary = readiness.log_summary()
+        self.session_stats['time_saved'] += readiness_summary['saved']
+        print(f"{Fore.CYAN}⚡ Readiness waits saved {readiness_summary['saved']:.1f}s over fixed sleeps{Style.RESET_ALL}")
         
         # Add to download history
-        self.download_history.append({
+        self.history.append({
             'type': 'stories',
             'target': username,
             'links_found': len(download_links),
             'timestamp': datetime.now().isoformat(),
+            'time_saved': round(readiness_summary['saved'], 2),
             'links': download_links
         })
         
@@ -426,25 +423,23 @@ class InstagramDownloader:
         print(f"{Fore.GREEN + Style.BRIGHT}🎉 {result_msg}{Style.RESET_ALL}")
         return download_links
 
-    def get_instagram_reel_links(self, reel_url):
-        """Enhanced reel links fetcher with better error handling"""
-        print(f"{Fore.GREEN}🔍 Starting to fetch reel from URL{Style.RESET_ALL}")
-        self.logger.info(f"Starting to fetch reel from URL: {reel_url}")
-        
+    def collect_reel_urls_visual(self, reel_url, readiness):
+        """Walk the fastdl.app UI in a visible browser and collect the reel download URLs"""
         driver = None
-        download_links = []
         
         try:
-            print(f"{Fore.BLUE}🌐 Initializing Chrome WebDriver (Visual Mode)...{Style.RESET_ALL}")
+            print(f"{Fore.BLUE}🌐 Initializing Chrome WebDriver ({self.profile.name.title()} Mode)...{Style.RESET_ALL}")
             driver = self.create_driver()
-            driver.maximize_window()
             print(f"{Fore.GREEN}✅ Browser opened successfully!{Style.RESET_ALL}")
 
             print(f"{Fore.BLUE}🌐 Navigating to fastdl.app...{Style.RESET_ALL}")
-            driver.get("https://fastdl.app/")
-            time.sleep(2)
+            navigate(driver, FASTDL_URL)
+            # Observers go in before any click, so the requests clicks send are counted as in flight
+            install_observers(driver)
+            wait_until_ready(driver, readiness, "page load", replaces=2)
+            print(f"{Fore.CYAN}📶 Page {describe_page_metrics(page_load_metrics(driver))}{Style.RESET_ALL}")
 
-            self.handle_page_interactions(driver)
+            self.handle_page_interactions(driver, readiness)
 
             # URL input
             print(f"{Fore.BLUE}⌨️ Entering reel URL...{Style.RESET_ALL}")
@@ -452,31 +447,55 @@ class InstagramDownloader:
                 EC.presence_of_element_located((By.XPATH, "//input[@id='search-form-input']"))
             )
             url_input.clear()
-            time.sleep(0.5)
             url_input.send_keys(reel_url)
-            time.sleep(1)
+            readiness.skip("enter reel url", 1.5)
 
             # Submit search
             print(f"{Fore.BLUE}🔍 Submitting search...{Style.RESET_ALL}")
             download_button = WebDriverWait(driver, 20).until(
                 EC.element_to_be_clickable((By.XPATH, "//button[@class='search-form__button']"))
             )
+            get_rate_limiter().acquire(FASTDL_URL)
+            install_observers(driver)
             download_button.click()
-            time.sleep(5)
+            wait_until_ready(driver, readiness, "search results", replaces=5)
 
             # Get download buttons
             print(f"{Fore.BLUE}🔍 Collecting download links...{Style.RESET_ALL}")
-            download_buttons = WebDriverWait(driver, 20).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a.button--filled"))
+            WebDriverWait(driver, 20).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "a.button--filled"))
             )
-            print(f"{Fore.GREEN}✅ Found {len(download_buttons)} download options{Style.RESET_ALL}")
+            links = collect_download_links(driver, "a.button--filled")
+            videos = sum(1 for link in links if link['type'] == 'video')
+            print(f"{Fore.CYAN}📦 {videos} videos, {len(links) - videos} images{Style.RESET_ALL}")
+            return [link['href'] for link in links]
+
+        finally:
+            if driver:
+                driver.quit()
+                readiness.skip("keep browser open", 5)
+                print(f"{Fore.GREEN}✅ Browser closed{Style.RESET_ALL}")
+
+    def get_instagram_reel_links(self, reel_url):
+        """Enhanced reel links fetcher with better error handling"""
+        print(f"{Fore.GREEN}🔍 Starting to fetch reel from URL{Style.RESET_ALL}")
+        self.logger.info(f"Starting to fetch reel from URL: {reel_url}")
+        
+        download_links = []
+        readiness = ReadinessTracker(reel_url)
+        
+        try:
+            if self.backend:
+                print(f"{Fore.BLUE}⚡ Using {self.backend.name} backend...{Style.RESET_ALL}")
+                candidate_urls = self.backend.get_reel_urls(reel_url)
+            else:
+                candidate_urls = self.collect_reel_urls_visual(reel_url, readiness)
+            print(f"{Fore.GREEN}✅ Found {len(candidate_urls)} download options{Style.RESET_ALL}")
 
             # Process download links
-            for index, download_button in enumerate(download_buttons):
-                download_url = download_button.get_attribute("href")
-                print(f"{Fore.CYAN}🔄 Validating link {index + 1}/{len(download_buttons)}...{Style.RESET_ALL}")
-                
-                is_valid, status = self.validate_download_link(download_url)
+            results = self.validate_download_links(candidate_urls)
+
+            for index, (download_url, (is_valid, status)) in enumerate(zip(candidate_urls, results)):
                 if is_valid:
                     download_links.append({
                         'url': download_url,
@@ -494,23 +513,20 @@ class InstagramDownloader:
             self.logger.error(f"Error fetching reel: {e}", exc_info=True)
             print(f"{Fore.RED}❌ Error occurred: {e}{Style.RESET_ALL}")
         
-        finally:
-            if driver:
-                print(f"{Fore.YELLOW}🔄 Keeping browser open for review...{Style.RESET_ALL}")
-                time.sleep(5)
-                driver.quit()
-                print(f"{Fore.GREEN}✅ Browser closed{Style.RESET_ALL}")
-        
         # Update session stats
         self.session_stats['reels_downloaded'] += 1
         self.session_stats['total_links'] += len(download_links)
+        readiness_summary = readiness.log_summary()
+        self.session_stats['time_saved'] += readiness_summary['saved']
+        print(f"{Fore.CYAN}⚡ Readiness waits saved {readiness_summary['saved']:.1f}s over fixed sleeps{Style.RESET_ALL}")
         
         # Add to download history
-        self.download_history.append({
+        self.history.append({
             'type': 'reel',
             'target': reel_url,
             'links_found': len(download_links),
             'timestamp': datetime.now().isoformat(),
+            'time_saved': round(readiness_summary['saved'], 2),
             'links': download_links
         })
         
@@ -560,6 +576,7 @@ class InstagramDownloader:
             ("📖 Stories Downloaded", self.session_stats['stories_downloaded']),
             ("🎥 Reels Downloaded", self.session_stats['reels_downloaded']),
             ("🔗 Total Links Found", self.session_stats['total_links']),
+            ("⚡ Wait Time Saved", f"{self.session_stats['time_saved']:.1f}s"),
             ("⏰ Session Duration", f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"),
             ("🕐 Session Started", self.session_stats['session_start'].strftime("%Y-%m-%d %H:%M:%S"))
         ]
@@ -569,16 +586,50 @@ class InstagramDownloader:
         
         print(f"{Fore.CYAN}{'='*50}{Style.RESET_ALL}")
 
-    def show_download_history(self):
-        """Display download history"""
-        if not self.download_history:
+    def get_history_filters(self):
+        """Ask for optional type, target and date filters for the download history"""
+        print(f"\n{Fore.CYAN}🔍 Filter history (press Enter to skip a filter){Style.RESET_ALL}")
+        entry_type = input(f"{Fore.CYAN}Type (stories/reel): {Style.RESET_ALL}").strip().lower()
+        if entry_type in ['story', 'stories']:
+            entry_type = 'stories'
+        elif entry_type in ['reel', 'reels']:
+            entry_type = 'reel'
+        elif entry_type:
+            print(f"{Fore.YELLOW}⚠️ Unknown type '{entry_type}', showing all types.{Style.RESET_ALL}")
+            entry_type = None
+        target = input(f"{Fore.CYAN}Username or reel URL: {Style.RESET_ALL}").strip()
+        if target and not target.startswith('http'):
+            target = target.lstrip('@')
+
+        dates = []
+        for label in ("From date (YYYY-MM-DD)", "To date (YYYY-MM-DD)"):
+            value = input(f"{Fore.CYAN}{label}: {Style.RESET_ALL}").strip()
+            try:
+                dates.append(date.fromisoformat(value) if value else None)
+            except ValueError:
+                print(f"{Fore.YELLOW}⚠️ Invalid date '{value}', ignoring it.{Style.RESET_ALL}")
+                dates.append(None)
+
+        return {'type': entry_type or None, 'target': target or None, 'since': dates[0], 'until': dates[1]}
+
+    def show_download_history(self, limit=20):
+        """Display the most recent download history entries matching the user's filters"""
+        if not self.history.totals()['entries']:
             print(f"\n{Fore.YELLOW}📋 No download history available yet.{Style.RESET_ALL}")
             return
         
+        filters = self.get_history_filters()
+        total = self.history.totals(**filters)['entries']
+        if not total:
+            print(f"\n{Fore.YELLOW}📋 No history entries match these filters.{Style.RESET_ALL}")
+            return
+        
         print(f"\n{Fore.BLUE + Style.BRIGHT}📋 DOWNLOAD HISTORY{Style.RESET_ALL}")
+        if total > limit:
+            print(f"{Fore.WHITE}Showing the {limit} most recent of {total} entries{Style.RESET_ALL}")
         print(f"{Fore.CYAN}{'='*80}{Style.RESET_ALL}")
         
-        for i, entry in enumerate(self.download_history, 1):
+        for i, entry in enumerate(self.history.query(limit=limit, **filters), 1):
             entry_type = entry['type'].upper()
             target = entry['target']
             links_count = entry['links_found']
@@ -597,32 +648,37 @@ class InstagramDownloader:
             print(f"{Fore.CYAN}{'-'*80}{Style.RESET_ALL}")
 
     def save_results_to_file(self):
-        """Save download history and links to JSON file"""
-        if not self.download_history:
+        """Export this session's download history, or the whole history, to a JSON file"""
+        if not self.history.totals()['entries']:
             print(f"\n{Fore.YELLOW}💾 No data to save yet.{Style.RESET_ALL}")
             return
         
         try:
+            export_all = input(
+                f"{Fore.CYAN}Export the whole history instead of this session? (y/N): {Style.RESET_ALL}"
+            ).strip().lower() in ['y', 'yes']
+            filters = {} if export_all else {'session': self.history.session}
+            totals = self.history.totals(**filters)
+            if not totals['entries']:
+                print(f"\n{Fore.YELLOW}💾 Nothing downloaded in this session yet.{Style.RESET_ALL}")
+                return
+            
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"instagram_downloads_{timestamp}.json"
             
-            data = {
-                'session_stats': self.session_stats,
-                'download_history': self.download_history,
+            header = {
+                'session_stats': dict(self.session_stats, session_start=self.session_stats['session_start'].isoformat()),
                 'export_timestamp': datetime.now().isoformat(),
-                'total_entries': len(self.download_history)
             }
             
-            # Convert datetime objects to strings for JSON serialization
-            data['session_stats']['session_start'] = data['session_stats']['session_start'].isoformat()
-            
+            # Entries are streamed from the history store, never loaded all at once
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+                entries = self.history.export(f, header=header, **filters)
             
             print(f"\n{Fore.GREEN}✅ Results saved successfully!{Style.RESET_ALL}")
             print(f"{Fore.CYAN}📁 File: {filename}{Style.RESET_ALL}")
-            print(f"{Fore.WHITE}📊 Entries: {len(self.download_history)}{Style.RESET_ALL}")
-            print(f"{Fore.WHITE}🔗 Total Links: {sum(entry['links_found'] for entry in self.download_history)}{Style.RESET_ALL}")
+            print(f"{Fore.WHITE}📊 Entries: {entries}{Style.RESET_ALL}")
+            print(f"{Fore.WHITE}🔗 Total Links: {totals['links']}{Style.RESET_ALL}")
             
         except Exception as e:
             print(f"\n{Fore.RED}❌ Error saving file: {e}{Style.RESET_ALL}")
@@ -705,8 +761,18 @@ class InstagramDownloader:
 def main():
     """Entry point for the application"""
     try:
-        downloader = InstagramDownloader()
-        downloader.run()
+        # Visual browser by default; EXTRACTION_BACKEND=http or selenium skips it
+        backend_name = os.environ.get("EXTRACTION_BACKEND")
+        backend = None
+        if backend_name:
+            from instagram_downloader import get_backend
+            backend = get_backend(backend_name)
+        # BROWSER_PROFILE=performance runs the browser headless without images, fonts or ads
+        downloader = InstagramDownloader(backend=backend, profile=os.environ.get("BROWSER_PROFILE", "visual"))
+        try:
+            downloader.run()
+        finally:
+            downloader.history.close()
     except Exception as e:
         print(f"{Fore.RED}❌ Fatal error: {e}{Style.RESET_ALL}")
         logging.error(f"Fatal error: {e}", exc_info=True)
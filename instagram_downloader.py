@@ -1,10 +1,15 @@
 import logging
+import os
+import threading
+from functools import partial
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
-import requests
+from browser_pool import BrowserPool
+from browser_profiles import BROWSER_PROFILE, get_profile
+from extraction_backends import FASTDL_URL, HttpBackend, SeleniumBackend
+from http_client import REQUEST_TIMEOUT, get_session, validate_links
+from metrics import SCRAPES, SCRAPES_IN_FLIGHT, Gauge, record_validation
+from resilience import SCRAPE_DEADLINE, CircuitBreaker, deadline
+from tracing import profiled, span
 
 # Configure logging
 logging.basicConfig(
@@ -13,133 +18,177 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_instagram_story_links(username):
+# Extraction backend: "selenium" drives Chrome through the site, "http" calls its API directly
+EXTRACTION_BACKEND = os.environ.get("EXTRACTION_BACKEND", "selenium")
+# Backends the asyncio API hedges across, fastest healthy first (one, the default, disables hedging)
+EXTRACTION_PROVIDERS = [name.strip() for name in (os.environ.get("EXTRACTION_PROVIDERS") or EXTRACTION_BACKEND).split(',') if name.strip()]
+
+# Browser pool settings
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+BROWSER_POOL_MAX_USES = int(os.environ.get("BROWSER_POOL_MAX_USES", "20"))
+BROWSER_POOL_CHECKOUT_TIMEOUT = float(os.environ.get("BROWSER_POOL_CHECKOUT_TIMEOUT", "120"))
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+_backends = {}
+
+def _probe_fastdl():
+    """Whether fastdl.app answers at all, checked while story scraping is failing fast"""
+    response = get_session().get(FASTDL_URL, timeout=REQUEST_TIMEOUT)
+    logger.info(f"fastdl.app probe: HTTP {response.status_code}")
+    return response.ok
+
+# Story scrapes fail fast while most recent ones failed, until fastdl.app looks healthy again
+story_breaker = CircuitBreaker(
+    "fastdl.app",
+    probe=_probe_fastdl,
+    message="fastdl.app is not working right now, so story downloads are paused. Please try again in a few minutes.",
+)
+STORY_CIRCUIT_OPEN = Gauge(
+    'story_circuit_open', '1 while story scrapes fail fast', function=lambda: int(story_breaker.state != story_breaker.CLOSED)
+)
+
+def create_driver(profile=None):
+    """
+    Create a new Chrome WebDriver with the scraper's options.
+
+    Args:
+        profile (str): Browser profile name (defaults to ``BROWSER_PROFILE``);
+            "performance" runs headless and blocks images, fonts and ad requests
+
+    Returns:
+        WebDriver: A freshly launched Chrome instance
+    """
+    profile = get_profile(profile)
+    logger.info(f"Initializing Chrome WebDriver ({profile.name} profile)")
+    with span("driver_start"):
+        driver = webdriver.Chrome(options=profile.options())
+        return profile.prepare(driver)
+
+def get_browser_pool(profile=None):
+    """
+    Get the shared pool of warm browser sessions, creating it on first use.
+
+    Args:
+        profile (str): Browser profile for the pool's sessions (defaults to
+            ``BROWSER_PROFILE``); only honoured by the call that creates the pool
+
+    Returns:
+        BrowserPool: The process-wide browser pool
+    """
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool(
+                partial(create_driver, profile or BROWSER_PROFILE),
+                size=BROWSER_POOL_SIZE,
+                max_uses=BROWSER_POOL_MAX_USES,
+                home_url=FASTDL_URL,
+            )
+        return _browser_pool
+
+def get_backend(name=None):
+    """
+    Get a shared extraction backend by name.
+
+    Args:
+        name (str): "selenium" or "http" (defaults to ``EXTRACTION_BACKEND``)
+
+    Returns:
+        ExtractionBackend: The backend instance
+    """
+    name = name or EXTRACTION_BACKEND
+    with _browser_pool_lock:
+        backend = _backends.get(name)
+    if backend is not None:
+        return backend
+
+    if name == SeleniumBackend.name:
+        backend = SeleniumBackend(get_browser_pool(), checkout_timeout=BROWSER_POOL_CHECKOUT_TIMEOUT)
+    elif name == HttpBackend.name:
+        backend = HttpBackend()
+    else:
+        raise ValueError(f"Unknown extraction backend: {name}")
+
+    with _browser_pool_lock:
+        return _backends.setdefault(name, backend)
+
+def _validated(candidate_urls):
+    """Check the candidate URLs concurrently, keeping the page order"""
+    with span("validation", links=len(candidate_urls)):
+        results = validate_links(candidate_urls)
+    record_validation(results)
+
+    download_links = []
+    for download_url, (is_valid, status) in zip(candidate_urls, results):
+        if is_valid:
+            download_links.append(download_url)
+            logger.info(f"Valid download URL found: {download_url}")
+        else:
+            logger.warning(f"URL check failed ({status}): {download_url}")
+    return download_links
+
+def get_instagram_story_links(username, backend=None):
     """
     Get Instagram story links for a given username.
     
     Args:
         username (str): Instagram username
+        backend (ExtractionBackend): Backend to use (defaults to ``get_backend()``)
     
     Returns:
         list: List of direct download URLs for stories
+
+    Raises:
+        CircuitOpenError: If recent scrapes kept failing and fastdl.app hasn't recovered yet
     """
     logger.info(f"Starting to fetch stories for username: {username}")
-    
-    options = webdriver.ChromeOptions()
-    # options.add_argument('--headless')
-    # options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    #options.add_argument('--disable-gpu')
-    options.add_argument('--window-size=1920,1080')
-    
-    driver = None
+    story_breaker.check()
+    backend = backend or get_backend()
     download_links = []
-    
-    try:
-        logger.info("Initializing Chrome WebDriver")
-        driver = webdriver.Chrome(options=options)
-        driver.maximize_window()
+    result = 'cancelled'
 
-        logger.info("Navigating to fastdl.app")
-        driver.get("https://fastdl.app/")
-
-        # Cookies consent
-        logger.info("Waiting for cookies button")
+    with SCRAPES_IN_FLIGHT.track_inprogress(), profiled(f"scrape-{username}"), deadline(SCRAPE_DEADLINE):
         try:
-            cookies_button = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "//button[@aria-label='Consent']"))
-            )
-            cookies_button.click()
-            logger.info("Cookies button clicked")
-        except Exception as e:
-            logger.warning(f"No cookies button found or could not click it: {e}")
-
-        # Username input
-        logger.info(f"Entering username: {username}")
-        url_input = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//input[@id='search-form-input']"))
-        )
-        url_input.send_keys(f"{username}")
-
-        # Download button
-        logger.info("Clicking download button")
-        download_button = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//button[@class='search-form__button']"))
-        )
-        download_button.click()
-
-        # Remove popup ad if it appears
-        try:
-            logger.info("Checking for popup ads")
-            popup_element = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "ads-modal"))
-            )
-            driver.execute_script("""
-                var element = arguments[0];
-                element.parentNode.removeChild(element);
-                """, popup_element)
-            logger.info("Popup ad removed")
+            with span("scrape", username=username, backend=backend.name) as scrape:
+                download_links = _validated(backend.get_story_urls(username))
+                scrape.set(links=len(download_links))
+            result = 'found' if download_links else 'empty'
         except Exception as e:
-            logger.info(f"No popup ad detected or error removing it: {e}")
+            result = 'error'
+            logger.error(f"Error fetching stories: {e}", exc_info=True)
+        finally:
+            story_breaker.record(None if result == 'cancelled' else result != 'error')
+    SCRAPES.labels(backend.name, result).inc()
 
-        time.sleep(6)
+    logger.info(f"Found {len(download_links)} valid download links for {username}")
+    return download_links
+
+def get_instagram_reel_links(reel_url, backend=None):
+    """
+    Get download links for an Instagram reel or post.
+
+    Args:
+        reel_url (str): Instagram reel or post URL
+        backend (ExtractionBackend): Backend to use (defaults to ``get_backend()``)
+
+    Returns:
+        list: List of direct download URLs for the reel
+    """
+    logger.info(f"Starting to fetch reel from URL: {reel_url}")
+    backend = backend or get_backend()
+    download_links = []
 
-        # Click the "Stories" tab
+    with SCRAPES_IN_FLIGHT.track_inprogress(), deadline(SCRAPE_DEADLINE):
         try:
-            logger.info("Clicking Stories tab")
-            stories_tab = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "//li[@class='tabs-component__item']/button[contains(text(), 'stories')]"))
-            )
-            stories_tab.click()
-            logger.info("Stories tab clicked")
+            with span("scrape", reel_url=reel_url, backend=backend.name) as scrape:
+                download_links = _validated(backend.get_reel_urls(reel_url))
+                scrape.set(links=len(download_links))
+            result = 'found' if download_links else 'empty'
         except Exception as e:
-            logger.error(f"Error clicking Stories tab: {e}")
-            return []
-
-        # Click "See more" buttons until they no longer appear
-        see_more_count = 0
-        while True:
-            try:
-                see_more_button = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//button[@class='button button--see-more profile-media-list__button--see-more']"))
-                )
-                see_more_button.click()
-                see_more_count += 1
-                logger.info(f"See more button clicked ({see_more_count})")
-                time.sleep(2)  # Wait for new content to load
-            except Exception:
-                logger.info("No more See more buttons found")
-                break
-
-        # Wait for download buttons to become clickable
-        logger.info("Looking for download buttons")
-        download_buttons = WebDriverWait(driver, 20).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a.button--filled"))
-        )
-        logger.info(f"Found {len(download_buttons)} download buttons")
-
-        # Get URLs without downloading
-        for index, download_button in enumerate(download_buttons):
-            download_url = download_button.get_attribute("href")
-            
-            # Check if URL is valid
-            try:
-                response = requests.head(download_url, timeout=10)
-                if 200 <= response.status_code < 300:
-                    download_links.append(download_url)
-                    logger.info(f"Valid download URL found: {download_url}")
-                else:
-                    logger.warning(f"URL returned non-success status code {response.status_code}: {download_url}")
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Error checking URL {download_url}: {e}")
-
-    except Exception as e:
-        logger.error(f"Error fetching stories: {e}", exc_info=True)
-    
-    finally:
-        if driver:
-            driver.quit()
-            logger.info("WebDriver closed")
-    
-    logger.info(f"Found {len(download_links)} valid download links for {username}")
-    return download_links
\ No newline at end of file
+            result = 'error'
+            logger.error(f"Error fetching reel: {e}", exc_info=True)
+    SCRAPES.labels(backend.name, result).inc()
+
+    logger.info(f"Found {len(download_links)} valid download links for reel")
+    return download_links
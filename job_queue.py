@@ -0,0 +1,294 @@
+"""
+Durable scrape job queue shared by the bot and separate worker processes.
+
+The bot enqueues jobs and polls for their results; ``scrape_worker.py``
+processes lease jobs, keep their leases alive with heartbeats while they
+scrape, and store the result. A job whose lease runs out, because its worker
+crashed or hung, is leased again by the next free worker, up to
+``JOB_MAX_ATTEMPTS`` times.
+
+The queue is one SQLite database in WAL mode, so any number of processes on
+one host (or containers sharing the volume) can use it at once.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from resilience import SCRAPE_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+# Unset: the bot scrapes in-process; set: the bot enqueues and scrape_worker.py processes scrape
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH")
+# A worker that stops heartbeating for this long loses its job to another worker
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "0.5"))
+# The bot gives up on a job after this long: time to wait for a free worker plus one full scrape
+JOB_WAIT_TIMEOUT = float(os.environ.get("JOB_WAIT_TIMEOUT", str(2 * SCRAPE_DEADLINE)))
+# Finished jobs are kept this long for inspection, then purged
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", str(24 * 3600)))
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+class JobFailedError(Exception):
+    """Raised to the submitter of a job that failed or was cancelled"""
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue with leases.
+
+    Args:
+        path (str): SQLite database file shared by the bot and the workers
+        lease_seconds (float): How long a lease lasts without a heartbeat
+        max_attempts (int): Leases a job gets before it is failed
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Transactions are managed explicitly so leasing can take the write lock up front
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _write(self, sql, params):
+        with self._lock:
+            return self.conn.execute(sql, params).rowcount
+
+    def enqueue(self, kind, payload):
+        """
+        Add a job.
+
+        Args:
+            kind (str): What the worker should do, e.g. "stories" or "reel"
+            payload (dict): JSON-serializable job arguments
+
+        Returns:
+            int: Job ID
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), QUEUED, now, now),
+            )
+        return cursor.lastrowid
+
+    def lease(self, worker):
+        """
+        Take the oldest runnable job: a queued one, or a leased one whose lease ran out.
+
+        Jobs whose lease ran out ``max_attempts`` times are failed instead.
+
+        Args:
+            worker (str): ID of the leasing worker
+
+        Returns:
+            dict: The job (``id``, ``kind``, ``payload``, ``attempts``), or None if there is none
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self.conn.execute(
+                        "SELECT id, kind, payload, attempts, worker FROM jobs "
+                        "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                        (QUEUED, LEASED, now),
+                    ).fetchone()
+                    if row is None:
+                        self.conn.execute("COMMIT")
+                        return None
+                    if row['attempts'] >= self.max_attempts:
+                        self.conn.execute(
+                            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                            (FAILED, f"Lease expired {row['attempts']} times, last held by {row['worker']}", now, row['id']),
+                        )
+                        logger.warning(f"Job {row['id']} failed after {row['attempts']} expired leases")
+                        continue
+                    if row['worker']:
+                        logger.warning(f"Re-leasing job {row['id']} abandoned by {row['worker']}")
+                    self.conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                        "WHERE id = ?",
+                        (LEASED, worker, now + self.lease_seconds, now, row['id']),
+                    )
+                    self.conn.execute("COMMIT")
+                    return {
+                        'id': row['id'],
+                        'kind': row['kind'],
+                        'payload': json.loads(row['payload']),
+                        'attempts': row['attempts'] + 1,
+                    }
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id, worker):
+        """
+        Extend a lease.
+
+        Returns:
+            bool: False if the worker no longer holds the job (it was re-leased or cancelled)
+        """
+        return self._write(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease_seconds, time.time(), job_id, worker, LEASED),
+        ) == 1
+
+    def complete(self, job_id, worker, result):
+        """
+        Store a job's result.
+
+        Returns:
+            bool: False if the worker no longer held the job and the result was dropped
+        """
+        return self._write(
+            "UPDATE jobs SET status = ?, result = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (DONE, json.dumps(result), time.time(), job_id, worker, LEASED),
+        ) == 1
+
+    def fail(self, job_id, worker, error):
+        """Mark a job as failed; returns False if the worker no longer held it"""
+        return self._write(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (FAILED, str(error), time.time(), job_id, worker, LEASED),
+        ) == 1
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't finished; its worker finds out at the next heartbeat"""
+        return self._write(
+            "UPDATE jobs SET status = ?, lease_expires = NULL, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, QUEUED, LEASED),
+        ) == 1
+
+    def expire(self, job_id, error):
+        """Fail a job that hasn't finished, whoever holds it; its worker finds out at the next heartbeat"""
+        return self._write(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (FAILED, str(error), time.time(), job_id, QUEUED, LEASED),
+        ) == 1
+
+    def get(self, job_id):
+        """
+        Look up a job.
+
+        Returns:
+            dict: ``status``, ``result`` (decoded), ``error`` and ``attempts``, or None
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status, result, error, attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'status': row['status'],
+            'result': json.loads(row['result']) if row['result'] is not None else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+        }
+
+    async def wait(self, job_id, poll_interval=JOB_POLL_INTERVAL, timeout=JOB_WAIT_TIMEOUT):
+        """
+        Wait for a job to finish, polling the database from a worker thread.
+
+        Cancelling the waiting task cancels the job.
+
+        Args:
+            job_id (int): Job to wait for
+            poll_interval (float): Seconds between checks
+            timeout (float): Seconds after which the job is failed and waiting stops (None waits forever)
+
+        Returns:
+            The job's result
+
+        Raises:
+            JobFailedError: If the job failed, was cancelled elsewhere or didn't finish within ``timeout``
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = None if timeout is None else loop.time() + timeout
+        try:
+            while True:
+                job = await asyncio.to_thread(self.get, job_id)
+                if job is None:
+                    raise JobFailedError(f"Job {job_id} disappeared from the queue")
+                if job['status'] == DONE:
+                    return job['result']
+                if job['status'] in (FAILED, CANCELLED):
+                    raise JobFailedError(job['error'] or f"Job {job_id} was {job['status']}")
+                if give_up_at is not None and loop.time() >= give_up_at:
+                    error = f"No scrape worker finished the request within {timeout:.0f} seconds"
+                    if await asyncio.to_thread(self.expire, job_id, error):
+                        logger.warning(f"Job {job_id} timed out after {timeout:.0f}s")
+                        raise JobFailedError(error)
+                    continue
+                await asyncio.sleep(poll_interval)
+        except asyncio.CancelledError:
+            # The cancel runs to completion on its thread even if this task is cancelled again
+            await asyncio.to_thread(self.cancel, job_id)
+            raise
+
+    def purge(self, older_than=JOB_RETENTION):
+        """Delete finished jobs last updated more than ``older_than`` seconds ago"""
+        removed = self._write(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND updated_at < ?",
+            (*FINISHED, time.time() - older_than),
+        )
+        if removed:
+            logger.info(f"Purged {removed} finished jobs")
+        return removed
+
+    def stats(self):
+        """
+        Get job counts.
+
+        Returns:
+            dict: Number of jobs per status, plus ``expired`` leases awaiting a new worker
+        """
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            expired = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_expires < ?", (LEASED, time.time())
+            ).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in (QUEUED, LEASED) + FINISHED}
+        stats['expired'] = expired
+        return stats
+
+    def close(self):
+        self.conn.close()
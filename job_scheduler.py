@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be queued because the scheduler is at capacity"""
+
+
+class JobCancelledError(Exception):
+    """Raised to the submitter of a job that was cancelled with ``FairScheduler.cancel``"""
+
+
+class ScheduledJob:
+    """A queued unit of work and the future its submitter awaits"""
+
+    def __init__(self, owner, func, future):
+        self.owner = owner
+        self.func = func
+        self.future = future
+        self.submitted_at = time.monotonic()
+        # The job runs in its submitter's context, e.g. with its request ID
+        self.context = contextvars.copy_context()
+        self.task = None
+
+
+class FairScheduler:
+    """
+    Bounded asyncio job scheduler that runs at most ``workers`` jobs at once.
+
+    Jobs are queued per owner (a Telegram user ID) and dispatched round-robin
+    across owners, so one user sending a burst of requests cannot starve others.
+    Each job runs as its own task, so cancelling the future returned to its
+    submitter, or ``cancel()`` for its owner, cancels the work itself.
+
+    Args:
+        workers (int): Number of jobs run concurrently
+        max_queue (int): Maximum number of waiting jobs across all owners
+        max_per_owner (int): Maximum number of waiting jobs for a single owner
+        default_duration (float): Job duration assumed before any job has finished
+    """
+
+    def __init__(self, workers=2, max_queue=50, max_per_owner=3, default_duration=30.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_owner = max_per_owner
+        self.default_duration = default_duration
+
+        self._queues = OrderedDict()
+        self._size = 0
+        self._running = 0
+        self._active = set()
+        self._durations = deque(maxlen=50)
+        self._condition = None
+        self._tasks = []
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+        }
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        self._condition = asyncio.Condition()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"scrape-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Scheduler started with {self.workers} workers, queue limit {self.max_queue}")
+
+    async def stop(self):
+        """Cancel the workers and fail every job still waiting"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self._size = 0
+
+    def submit(self, owner, func):
+        """
+        Queue a job.
+
+        Args:
+            owner: Key used for fairness (e.g. the Telegram user ID)
+            func (callable): Coroutine function performing the work
+
+        Returns:
+            ScheduledJob: The queued job; await ``job.future`` for its result
+
+        Raises:
+            QueueFullError: If the global or per-owner queue limit is reached
+        """
+        queue = self._queues.get(owner)
+        if self._size >= self.max_queue:
+            self._stats['rejected'] += 1
+            raise QueueFullError("The bot is very busy right now. Please try again in a few minutes.")
+        if queue is not None and len(queue) >= self.max_per_owner:
+            self._stats['rejected'] += 1
+            raise QueueFullError("You already have several requests waiting. Please wait for them to finish.")
+
+        job = ScheduledJob(owner, func, asyncio.get_running_loop().create_future())
+        if queue is None:
+            queue = self._queues[owner] = deque()
+        queue.append(job)
+        self._size += 1
+        self._stats['submitted'] += 1
+        asyncio.ensure_future(self._notify())
+        return job
+
+    def cancel(self, owner):
+        """
+        Cancel every waiting and running job of an owner.
+
+        Their submitters get ``JobCancelledError``; running jobs are cancelled
+        at their next ``await``.
+
+        Returns:
+            int: Number of jobs cancelled
+        """
+        queue = self._queues.pop(owner, ())
+        self._size -= len(queue)
+        for job in queue:
+            if not job.future.done():
+                job.future.set_exception(JobCancelledError("Your request was cancelled."))
+        self._stats['cancelled'] += len(queue)
+
+        running = [job for job in self._active if job.owner == owner and not job.task.done()]
+        for job in running:
+            job.task.cancel()
+        if queue or running:
+            logger.info(f"Cancelled {len(queue)} waiting and {len(running)} running jobs for {owner}")
+        return len(queue) + len(running)
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify()
+
+    def _pop_next(self):
+        """Take the next job, rotating through owners"""
+        owner, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        del self._queues[owner]
+        if queue:
+            self._queues[owner] = queue
+        self._size -= 1
+        return job
+
+    def _dispatch_order(self):
+        """Jobs in the order they will be dispatched"""
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        depth = 0
+        while any(depth < len(queue) for queue in queues):
+            order.extend(queue[depth] for queue in queues if depth < len(queue))
+            depth += 1
+        return order
+
+    def position(self, job):
+        """
+        Get a job's 1-based place in the queue.
+
+        Returns:
+            int: Queue position, or 0 if the job is already running or finished
+        """
+        for index, queued in enumerate(self._dispatch_order()):
+            if queued is job:
+                return index + 1
+        return 0
+
+    @property
+    def average_duration(self):
+        if not self._durations:
+            return self.default_duration
+        return sum(self._durations) / len(self._durations)
+
+    def estimated_wait(self, job):
+        """
+        Estimate the seconds until a job starts running.
+
+        Returns:
+            float: Estimated wait, 0 if a worker will pick it up immediately
+        """
+        position = self.position(job)
+        if position == 0:
+            return 0.0
+        jobs_ahead = self._running + position - 1
+        if jobs_ahead < self.workers:
+            return 0.0
+        rounds = (jobs_ahead - self.workers) // self.workers + 1
+        return rounds * self.average_duration
+
+    async def _worker(self):
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._size > 0)
+                job = self._pop_next()
+            if job.future.done():
+                continue
+
+            self._running += 1
+            self._active.add(job)
+            start = time.monotonic()
+            job.task = job.context.run(lambda: asyncio.ensure_future(job.func()))
+            # A submitter that stops waiting takes the work down with it
+            job.future.add_done_callback(lambda future, task=job.task: future.cancelled() and task.cancel())
+            try:
+                await asyncio.wait({job.task})
+            except asyncio.CancelledError:
+                job.task.cancel()
+                job.future.cancel()
+                raise
+            finally:
+                self._running -= 1
+                self._active.discard(job)
+                self._durations.append(time.monotonic() - start)
+                logger.info(f"Job for {job.owner} finished after waiting {start - job.submitted_at:.1f}s")
+
+            if job.task.cancelled():
+                self._stats['cancelled'] += 1
+                if not job.future.done():
+                    job.future.set_exception(JobCancelledError("Your request was cancelled."))
+            elif job.task.exception() is not None:
+                self._stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(job.task.exception())
+            else:
+                self._stats['completed'] += 1
+                if not job.future.done():
+                    job.future.set_result(job.task.result())
+
+    def stats(self):
+        """
+        Get scheduler counters.
+
+        Returns:
+            dict: Submitted/rejected/completed/failed/cancelled counts, queue depth and running jobs
+        """
+        stats = dict(self._stats)
+        stats['queued'] = self._size
+        stats['running'] = self._running
+        stats['average_duration'] = self.average_duration
+        return stats
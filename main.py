@@ -1,138 +1,104 @@
-import requests
+import argparse
+import glob
 import os
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from datetime import datetime
+import signal
 import time
-
-def get_instagram_stories(username, download_folder):
-    options = webdriver.ChromeOptions()
-    driver = webdriver.Chrome(options=options)
-    driver.maximize_window()
-
-    driver.get("https://fastdl.app/")
+from datetime import datetime
+from browser_profiles import PROFILES
+from http_client import get_session
+from instagram_downloader import get_backend, get_browser_pool
+from download_index import DownloadIndex
+from media_download import PART_SUFFIX
+from media_store import MediaStore
+from tracing import new_request_id, request_context, span
+from watchlist import (STATE_FILENAME, TASK_LOG_FILENAME, WATCH_INTERVAL, WATCH_JITTER, WATCHLIST_FILENAME,
+                       WatchlistDaemon, record_poll)
+
+def next_file_number(folder, prefix):
+    """
+    First number after the highest ``{prefix}{number}.{extension}`` already saved in ``folder``.
+
+    A partial ``{prefix}{number}.part`` download counts too: its number stays
+    reserved for the link it belongs to (see ``DownloadIndex.partial_stem``).
+    """
+    highest = 0
+    for name in os.listdir(folder):
+        number = os.path.splitext(name)[0][len(prefix):]
+        if name.startswith(prefix) and number.isdigit():
+            highest = max(highest, int(number))
+    return highest + 1
+
+def get_instagram_stories(username, download_folder, downloaded=None):
+    owns_index = downloaded is None
+    if owns_index:
+        downloaded = DownloadIndex(download_folder)
 
     try:
-        # Cookies consent
-        print("Waiting for cookies button...")
-        cookies_button = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//button[@aria-label='Consent']"))
-        )
-        cookies_button.click()
-        print("Cookies button clicked.")
-
-        # Username input
-        print("Waiting for username input...")
-        url_input = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//input[@id='search-form-input']"))
-        )
-        url_input.send_keys(f"{username}")
-        print("Username entered.")
-
-        # Download button
-        print("Waiting for download button...")
-        download_button = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.XPATH, "//button[@class='search-form__button']"))
-        )
-        download_button.click()
-        print("Download button clicked.")
+        # Only stories newer than the ones seen on the previous poll are fetched
+        seen = downloaded.seen_stories(username)
+        print(f"Fetching story links for {username}...")
+        download_urls = get_backend().get_story_urls(username, seen=seen)
+        print(f"Found {len(download_urls)} new story links." if seen else f"Found {len(download_urls)} story links.")
+
+        # Downloading stories over one keep-alive session, storing identical media once
+        session = get_session()
+        store = MediaStore(downloaded)
+        stories_folder = os.path.join(download_folder, "Stories")
+        download_date = datetime.now().strftime("%d%m%Y")
+        prefix = f"LupusDownloader_{username}_{download_date}_"
+        number = next_file_number(stories_folder, prefix)
+        failed = False
+        for download_url in reversed(download_urls):
+            if download_url in downloaded:
+                print(f"Link already downloaded: {download_url}")
+                continue
 
-        # Remove popup ad if it appears
-        try:
-            print("Removing popup ad...")
-            popup_element = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "ads-modal"))
-            )
-            driver.execute_script("""
-                var element = arguments[0];
-                element.parentNode.removeChild(element);
-                """, popup_element)
-            print("Popup ad removed.")
-        except Exception as e:
-            print("No popup ad detected or an error occurred:", e)
-
-        time.sleep(6)
-
-        # Click the "Stories" tab
-        try:
-            print("Waiting for 'Stories' tab...")
-            stories_tab = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "//li[@class='tabs-component__item']/button[contains(text(), 'stories')]"))
-            )
-            stories_tab.click()
-            print("'Stories' tab clicked.")
-        except Exception as e:
-            print("An error occurred while trying to click the 'Stories' tab:", e)
-            return False
+            # The extension is picked from the content type of the download response itself.
+            # A link whose earlier download was interrupted keeps its path, so the partial file is resumed.
+            partial_stem = downloaded.partial_stem(download_url)
+            stem = partial_stem or os.path.join(stories_folder, f"{prefix}{number}")
 
-        # Click "See more" buttons until they no longer appear
-        while True:
+            print(f"Downloading {download_url}...")
             try:
-                see_more_button = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//button[@class='button button--see-more profile-media-list__button--see-more']"))
-                )
-                see_more_button.click()
-                print("See more button clicked.")
-                time.sleep(2)  # Wait for new content to load
-            except:
-                print("No more 'See more' buttons.")
-                break
-
-        # Wait for download buttons to become clickable
-        print("Waiting for download buttons to become clickable...")
-        download_buttons = WebDriverWait(driver, 20).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a.button--filled"))
-        )
-        print(f"Found {len(download_buttons)} download buttons.")
-
-        # Downloading stories
-        for index, download_button in enumerate(download_buttons):
-            download_url = download_button.get_attribute("href")
-            response = requests.head(download_url)
-            content_type = response.headers.get('content-type')
-
-            if 'image' in content_type:
-                extension = "jpg"
-            elif 'video' in content_type:
-                extension = "mp4"
-            else:
-                print(f"Unknown content type: {content_type}. Skipping download.")
+                with span("download", url=download_url) as download:
+                    fetched = store.fetch(download_url, stem, session=session)
+                    download.set(duplicate=fetched['duplicate'], content_type=fetched['content_type'])
+            except IOError as e:
+                print(f"Could not download {download_url}: {e}. Skipping download.")
+                failed = True
+                if partial_stem is None and glob.glob(glob.escape(stem) + PART_SUFFIX + "*"):
+                    downloaded.set_partial(download_url, stem)
+                    number += 1
                 continue
-
-            download_date = datetime.now().strftime("%d%m%Y")
-            filename = os.path.join(download_folder, "Stories", f"LupusDownloader_{username}_{download_date}_{index + 1}.{extension}")
-
-            if not is_already_downloaded(download_url, download_folder):
-                print(f"Downloading {download_url} to {filename}...")
-                response = requests.get(download_url)
-                with open(filename, 'wb') as file:
-                    file.write(response.content)
-                record_downloaded_link(download_url, download_folder)
-                print(f"Downloaded {download_url}.")
+            if fetched['path'] is None:
+                print(f"Unknown content type: {fetched['content_type']}. Skipping download.")
+                continue
+            downloaded.add(download_url)
+            if partial_stem is None:
+                number += 1
             else:
-                print(f"Link already downloaded: {download_url}")
+                downloaded.clear_partial(download_url)
+            if fetched['duplicate']:
+                print(f"Same media already stored, linked {fetched['path']}.")
+            else:
+                result = fetched['download']
+                print(f"Downloaded {download_url} to {fetched['path']} ({result['size'] / (1024 * 1024):.2f} MB at {result['throughput'] / (1024 * 1024):.2f} MB/s).")
+
+        # After a failed download the next poll rescans everything so it is retried
+        if not failed:
+            downloaded.mark_seen(username, download_urls)
 
     except Exception as e:
         print("An error occurred:", e)
         return False
 
     finally:
-        driver.quit()
-
-def is_already_downloaded(download_url, download_folder):
-    downloaded_links_file = os.path.join(download_folder, "downloaded_links.txt")
-    if os.path.exists(downloaded_links_file):
-        with open(downloaded_links_file, "r") as f:
-            existing_links = [line.strip().split('&')[0] for line in f.readlines()]
-            return download_url.split('&')[0] in existing_links
-    return False
+        if owns_index:
+            downloaded.close()
+        else:
+            downloaded.flush()
 
-def record_downloaded_link(download_url, download_folder):
-    downloaded_links_file = os.path.join(download_folder, "downloaded_links.txt")
-    with open(downloaded_links_file, "a") as f:
-        f.write(download_url + "\n")
+    return True
 
 def run_script():
     ######################################################################
@@ -144,20 +110,64 @@ def run_script():
     username = "jiri_mdf"
     ######################################################################
 
+    args = parse_args()
+    download_folder = args.folder or download_folder
+    if args.profile:
+        get_browser_pool(args.profile)
+
     stories_folder = os.path.join(download_folder, "Stories")
     if not os.path.exists(stories_folder):
         os.makedirs(stories_folder)
 
-    downloaded_links_file = os.path.join(download_folder, "downloaded_links.txt")
-    if not os.path.exists(downloaded_links_file):
-        with open(downloaded_links_file, "w"):
-            pass
-
-    task_file_path = os.path.join(download_folder, 'task.txt')
-    with open(task_file_path, 'a') as task_file:
-        task_file.write(f'{datetime.now()} - The script ran\n')
-
-    if not get_instagram_stories(username, download_folder):
-        return False
-
-run_script()
+    task_file_path = os.path.join(download_folder, TASK_LOG_FILENAME)
+    try:
+        if args.daemon:
+            return run_daemon(args, download_folder, task_file_path)
+
+        started = datetime.now()
+        start = time.monotonic()
+        with request_context(new_request_id("poll"), name="poll", username=username):
+            ok = get_instagram_stories(username, download_folder)
+        record_poll(task_file_path, username, started, time.monotonic() - start, ok)
+        if not ok:
+            return False
+    finally:
+        get_browser_pool().close()
+
+def run_daemon(args, download_folder, task_file_path):
+    """Poll every account in the watchlist until interrupted, sharing one download index"""
+    watchlist_path = args.watchlist or os.path.join(download_folder, WATCHLIST_FILENAME)
+    state_path = args.state or os.path.join(download_folder, STATE_FILENAME)
+
+    with DownloadIndex(download_folder) as downloaded:
+        daemon = WatchlistDaemon(
+            lambda username: get_instagram_stories(username, download_folder, downloaded=downloaded),
+            watchlist_path,
+            state_path,
+            task_file_path,
+            workers=args.workers,
+            interval=args.interval * 60,
+            jitter=args.jitter,
+        )
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.stop()
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download Instagram stories")
+    parser.add_argument("--folder", help="Download folder (overrides download_folder in run_script)")
+    parser.add_argument("--profile", choices=list(PROFILES), help="Browser profile (default: BROWSER_PROFILE or 'default'); 'performance' is headless and skips images, fonts and ads")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and poll every account in the watchlist")
+    parser.add_argument("--watchlist", help=f"Watchlist file, one 'username [interval minutes]' per line (default: <folder>/{WATCHLIST_FILENAME})")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WATCH_WORKERS", os.environ.get("BROWSER_POOL_SIZE", "2"))),
+                        help="Accounts scraped concurrently; keep at or below BROWSER_POOL_SIZE")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL / 60, help="Default minutes between polls of one account")
+    parser.add_argument("--jitter", type=float, default=WATCH_JITTER, help="Random fraction added to or taken from each interval")
+    parser.add_argument("--state", help=f"Schedule state file (default: <folder>/{STATE_FILENAME})")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    run_script()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from telegram import InputMediaPhoto, InputMediaVideo
+from telegram.error import TelegramError
+from download_index import link_key
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_CACHE_PATH = os.environ.get("FILE_ID_CACHE_PATH", "file_ids.db")
+
+# Telegram accepts 2-10 items per sendMediaGroup call
+MEDIA_GROUP_SIZE = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_ids (
+    key TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    file_unique_id TEXT,
+    added_at REAL NOT NULL
+);
+"""
+
+
+def media_type(url):
+    """Telegram media type for a story link"""
+    return 'video' if '.mp4' in url else 'photo'
+
+
+class FileIdCache:
+    """
+    Telegram ``file_id`` of every media item the bot has sent, keyed by normalized URL.
+
+    Once Telegram has fetched a story from its CDN URL, the same story is
+    resent by ``file_id``, so neither the bot nor Telegram downloads it again.
+    URLs are normalized with ``link_key`` like the download index, which drops
+    the per-request signature parameters. Lookups and writes take a whole
+    media group at once, and the bot runs them on a worker thread.
+
+    Args:
+        path (str): SQLite database file
+    """
+
+    def __init__(self, path=FILE_ID_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'stale': 0}
+
+    def get_many(self, urls):
+        """
+        Look up the cached uploads of several URLs in one query.
+
+        Returns:
+            dict: (file_id, media_type) per URL that has one
+        """
+        keys = {url: link_key(url) for url in urls}
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT key, file_id, media_type FROM file_ids WHERE key IN ({', '.join('?' * len(keys))})",
+                list(set(keys.values())),
+            ).fetchall()
+            found = {key: (file_id, kind) for key, file_id, kind in rows}
+            cached = {url: found[key] for url, key in keys.items() if key in found}
+            self._stats['hits'] += len(cached)
+            self._stats['misses'] += len(keys) - len(cached)
+        return cached
+
+    def put_many(self, items):
+        """Store (url, file_id, media_type, file_unique_id) tuples in one transaction"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_ids (key, file_id, media_type, file_unique_id, added_at) VALUES (?, ?, ?, ?, ?)",
+                [(link_key(url), file_id, kind, file_unique_id, time.time())
+                 for url, file_id, kind, file_unique_id in items],
+            )
+            self._stats['stored'] += len(items)
+
+    def invalidate_many(self, urls):
+        """Forget ``file_id``s Telegram no longer accepts"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM file_ids WHERE key = ?", [(link_key(url),) for url in urls])
+            self._stats['stale'] += len(urls)
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hits, misses, stored and stale entries plus the number of cached items
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
+        return stats
+
+    def close(self):
+        self.conn.close()
+
+
+def _input_media(source, kind):
+    return InputMediaVideo(source) if kind == 'video' else InputMediaPhoto(source)
+
+
+def _sent_file(sent_message):
+    """(file_id, media_type, file_unique_id) of a sent photo or video message"""
+    if sent_message.video:
+        return sent_message.video.file_id, 'video', sent_message.video.file_unique_id
+    if sent_message.photo:
+        photo = sent_message.photo[-1]
+        return photo.file_id, 'photo', photo.file_unique_id
+    return None
+
+
+async def _send_group(message, group, cache, use_cache=True):
+    """
+    Send one group of links as media.
+
+    Returns:
+        list: Links that could not be sent
+    """
+    cached = await asyncio.to_thread(cache.get_many, group) if use_cache else {}
+    media = [_input_media(*cached[url]) if url in cached else _input_media(url, media_type(url)) for url in group]
+
+    try:
+        if len(media) == 1:
+            item = media[0]
+            if isinstance(item, InputMediaVideo):
+                sent = [await message.reply_video(item.media)]
+            else:
+                sent = [await message.reply_photo(item.media)]
+        else:
+            sent = list(await message.reply_media_group(media))
+    except TelegramError as e:
+        if cached:
+            # A cached file_id may have been invalidated; fall back to the URLs once
+            logger.warning(f"Sending {len(group)} cached media failed ({e}), retrying from URLs")
+            await asyncio.to_thread(cache.invalidate_many, list(cached))
+            return await _send_group(message, group, cache, use_cache=False)
+        if len(group) > 1:
+            # Telegram doesn't say which item it rejected; one at a time, only that one falls back to text
+            logger.warning(f"Sending {len(group)} media items failed ({e}), sending them one at a time")
+            unsent = []
+            for url in group:
+                unsent.extend(await _send_group(message, [url], cache, use_cache=False))
+            return unsent
+        logger.warning(f"Could not send media item {group[0]}: {e}")
+        return list(group)
+
+    uploaded = []
+    for url, sent_message in zip(group, sent):
+        sent_file = _sent_file(sent_message)
+        if sent_file and url not in cached:
+            uploaded.append((url, *sent_file))
+    if uploaded:
+        await asyncio.to_thread(cache.put_many, uploaded)
+    return []
+
+
+async def send_media_groups(message, links, cache):
+    """
+    Deliver story links as actual media, up to ``MEDIA_GROUP_SIZE`` per message.
+
+    Items already sent before are resent by ``file_id``; new ones are sent by
+    URL, so Telegram fetches them from the CDN itself and the bot never
+    downloads or uploads media.
+
+    Args:
+        message (telegram.Message): Message to reply to
+        links (list): Story download URLs
+        cache (FileIdCache): ``file_id`` cache
+
+    Returns:
+        list: Links that could not be delivered as media (send them as text instead)
+    """
+    unsent = []
+    for start in range(0, len(links), MEDIA_GROUP_SIZE):
+        group = links[start:start + MEDIA_GROUP_SIZE]
+        unsent.extend(await _send_group(message, group, cache))
+    stats = await asyncio.to_thread(cache.stats)
+    logger.info(f"Delivered {len(links) - len(unsent)} of {len(links)} items as media, cache stats: {stats}")
+    return unsent
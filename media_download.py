@@ -0,0 +1,317 @@
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http_client import PER_HOST_CONNECTIONS, REQUEST_TIMEOUT, get_session
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+PART_SUFFIX = ".part"
+
+# Files at least this large are fetched as parallel byte-range segments when the server allows it
+SEGMENT_THRESHOLD = int(os.environ.get("SEGMENT_THRESHOLD", str(8 * 1024 * 1024)))
+SEGMENT_SIZE = int(os.environ.get("SEGMENT_SIZE", str(4 * 1024 * 1024)))
+# More segments than pooled connections per host would just queue on the pool
+MAX_SEGMENTS = int(os.environ.get("MAX_SEGMENTS", str(PER_HOST_CONNECTIONS)))
+
+# Bytes read from the first response before anything is written to disk
+HEAD_BYTES = 64 * 1024
+
+# Content types that say nothing about the payload; the first bytes are sniffed instead
+GENERIC_CONTENT_TYPES = {'', 'application/octet-stream', 'binary/octet-stream', 'application/binary', 'application/download'}
+
+EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/heic': 'heic',
+    'video/mp4': 'mp4',
+    'video/quicktime': 'mov',
+    'video/webm': 'webm',
+}
+
+
+class IncompleteDownloadError(IOError):
+    """Raised when the server closed the stream before sending every byte"""
+
+
+def sniff_content_type(data):
+    """Guess a media content type from its magic bytes; None if unrecognised"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:8] == b'ftyp':
+        brand = data[8:12]
+        if brand in (b'heic', b'heix', b'mif1'):
+            return 'image/heic'
+        if brand == b'qt  ':
+            return 'video/quicktime'
+        return 'video/mp4'
+    if data.startswith(b'\x1aE\xdf\xa3'):
+        return 'video/webm'
+    return None
+
+
+def media_info(content_type, head):
+    """
+    Work out what a response holds from its Content-Type, falling back to the first bytes.
+
+    Args:
+        content_type (str): Content-Type header (may be missing or generic)
+        head (bytes): First bytes of the content
+
+    Returns:
+        dict: ``content_type``, ``kind`` ('image', 'video' or None) and ``extension``
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in GENERIC_CONTENT_TYPES or not content_type.startswith(('image/', 'video/')):
+        content_type = sniff_content_type(head) or content_type
+
+    kind = content_type.split('/')[0] if content_type.startswith(('image/', 'video/')) else None
+    extension = EXTENSIONS.get(content_type) or {'image': 'jpg', 'video': 'mp4'}.get(kind)
+    return {'content_type': content_type, 'kind': kind, 'extension': extension}
+
+
+def _read_head(chunks):
+    """Pull chunks off a response until at least ``HEAD_BYTES`` have arrived"""
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= HEAD_BYTES:
+            break
+    return head
+
+
+def _file_head(path):
+    with open(path, 'rb') as file:
+        return file.read(HEAD_BYTES)
+
+
+def _total_size(response, offset):
+    """Full size of the resource from Content-Range or Content-Length, if known"""
+    content_range = response.headers.get('content-range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    content_length = response.headers.get('content-length')
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+
+def _hash_file(path, digest, chunk_size=CHUNK_SIZE):
+    """Feed an existing file into ``digest``"""
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+
+
+def segment_count(total):
+    """Number of parallel segments for a file of ``total`` bytes"""
+    if total < SEGMENT_THRESHOLD:
+        return 1
+    return max(1, min(MAX_SEGMENTS, total // SEGMENT_SIZE))
+
+
+def segment_ranges(total, count):
+    """Split ``total`` bytes into ``count`` contiguous inclusive (first, last) ranges"""
+    size = -(-total // count)
+    return [(first, min(first + size, total) - 1) for first in range(0, total, size)]
+
+
+def _fetch_segment(url, segment_filename, first, last, session, chunk_size, timeout):
+    """Fetch one byte range into its own file, resuming from what is already there"""
+    expected = last - first + 1
+    have = os.path.getsize(segment_filename) if os.path.exists(segment_filename) else 0
+    if have > expected:
+        os.remove(segment_filename)
+        have = 0
+    if have == expected:
+        return 0
+
+    transferred = 0
+    headers = {'Range': f'bytes={first + have}-{last}'}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code != 206:
+            raise IncompleteDownloadError(f"Server ignored range request for segment {first}-{last} (HTTP {response.status_code})")
+        with open(segment_filename, 'ab') as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                file.write(chunk)
+                transferred += len(chunk)
+
+    if have + transferred != expected:
+        raise IncompleteDownloadError(f"Segment {first}-{last} received {have + transferred} of {expected} bytes")
+    return transferred
+
+
+def _download_segments(url, part_filename, total, session, chunk_size, timeout, digest, head=b''):
+    """
+    Fetch a file as parallel byte-range segments and reassemble it into ``part_filename``.
+
+    Each segment is kept in its own ``.part.N`` file until reassembly, so an
+    interrupted download resumes segment by segment on the next run. Bytes
+    already read from the first response (``head``) seed the first segment.
+    The content hash is computed while the segments are concatenated in order.
+
+    Returns:
+        int: Bytes transferred over the network
+    """
+    ranges = segment_ranges(total, segment_count(total))
+    segment_filenames = [f"{part_filename}.{index}" for index in range(len(ranges))]
+    logger.info(f"Downloading {os.path.basename(part_filename)} in {len(ranges)} segments")
+
+    transferred = 0
+    if head and not os.path.exists(segment_filenames[0]):
+        first, last = ranges[0]
+        with open(segment_filenames[0], 'wb') as segment:
+            segment.write(head[:last - first + 1])
+        transferred = min(len(head), last - first + 1)
+
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="segment") as executor:
+        futures = [
+            executor.submit(_fetch_segment, url, segment_filename, first, last, session, chunk_size, timeout)
+            for segment_filename, (first, last) in zip(segment_filenames, ranges)
+        ]
+        transferred += sum(future.result() for future in futures)
+
+    with open(part_filename, 'wb') as output:
+        for segment_filename in segment_filenames:
+            with open(segment_filename, 'rb') as segment:
+                for chunk in iter(lambda: segment.read(chunk_size), b''):
+                    output.write(chunk)
+                    digest.update(chunk)
+
+    size = os.path.getsize(part_filename)
+    if size != total:
+        os.remove(part_filename)
+        raise IncompleteDownloadError(f"Reassembled {size} of {total} bytes for {url}")
+    for segment_filename in segment_filenames:
+        os.remove(segment_filename)
+    return transferred
+
+
+def download_file(url, filename, session=None, chunk_size=CHUNK_SIZE, timeout=REQUEST_TIMEOUT,
+                  inspect=None, detect_extension=False):
+    """
+    Stream a URL to disk in chunks with a single request, resuming a previous partial download if there is one.
+
+    Data is written to ``filename + ".part"`` and atomically renamed to ``filename``
+    once complete, so an interrupted run never leaves a truncated file behind.
+    A leftover ``.part`` file is resumed with an HTTP Range request; if the
+    server ignores the range the download starts over. Large files on servers
+    that accept ranges are split into parallel segments (see ``segment_count``).
+
+    Status, size and content type all come from the headers of that one GET.
+    Before anything is written, the first ``HEAD_BYTES`` are read so the type
+    can be sniffed when the server sends no useful Content-Type, and
+    ``inspect`` gets a chance to stop the transfer.
+
+    Args:
+        url (str): Media URL
+        filename (str): Final path of the file, or the path without extension if ``detect_extension``
+        session (requests.Session): Session to use (defaults to the shared pooled one)
+        chunk_size (int): Bytes read per chunk; bounds memory use regardless of file size
+        timeout (float): Connect/read timeout in seconds
+        inspect (callable): Called with a dict of ``url``, ``content_type``, ``kind``,
+            ``extension``, ``size`` (None if unknown) and ``head`` (the first bytes);
+            returning False abandons the download
+        detect_extension (bool): Append the extension matching the detected content type to ``filename``
+
+    Returns:
+        dict: Final ``path``, bytes transferred, total size, seconds taken, throughput,
+            whether it resumed, segment count, the SHA-256 of the content and the
+            detected ``content_type``/``kind``/``extension``; None if ``inspect`` declined
+    """
+    session = session or get_session()
+    part_filename = filename + PART_SUFFIX
+    offset = os.path.getsize(part_filename) if os.path.exists(part_filename) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+    start = time.monotonic()
+    transferred = 0
+    segments = 1
+    digest = hashlib.sha256()
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if offset and response.status_code == 416:
+            # Nothing left to fetch: the partial file already holds every byte
+            total = _total_size(response, 0) or offset
+            if total != offset:
+                os.remove(part_filename)
+                raise IncompleteDownloadError(f"Partial file for {url} does not match the remote size")
+            resumed = True
+            chunks = iter(())
+            head = _file_head(part_filename)
+        else:
+            response.raise_for_status()
+            resumed = bool(offset) and response.status_code == 206
+            if not resumed:
+                offset = 0
+            total = _total_size(response, offset)
+            chunks = response.iter_content(chunk_size=chunk_size)
+            head = _file_head(part_filename) if resumed else _read_head(chunks)
+
+        info = media_info(response.headers.get('content-type'), head)
+        info.update(url=url, size=total, head=head)
+        if inspect is not None and inspect(info) is False:
+            logger.info(f"Stopped download of {url} after {len(head)} bytes ({info['content_type'] or 'unknown type'})")
+            return None
+        path = f"{filename}.{info['extension']}" if detect_extension and info['extension'] else filename
+
+        if (not offset and response.status_code == 200 and total
+                and response.headers.get('accept-ranges', '').lower() == 'bytes'
+                and segment_count(total) > 1):
+            response.close()
+            segments = segment_count(total)
+            transferred = _download_segments(url, part_filename, total, session, chunk_size, timeout, digest, head)
+            resumed = transferred < total
+            size = total
+        else:
+            if resumed:
+                _hash_file(part_filename, digest, chunk_size)
+            with open(part_filename, 'ab' if resumed else 'wb') as file:
+                if not resumed:
+                    file.write(head)
+                    digest.update(head)
+                    transferred += len(head)
+                for chunk in chunks:
+                    file.write(chunk)
+                    digest.update(chunk)
+                    transferred += len(chunk)
+            size = offset + transferred
+
+    if total is not None and size != total:
+        raise IncompleteDownloadError(f"Received {size} of {total} bytes for {url}")
+
+    os.replace(part_filename, path)
+
+    elapsed = time.monotonic() - start
+    throughput = transferred / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Downloaded {os.path.basename(path)}: {size / (1024 * 1024):.2f} MB "
+        f"({transferred} bytes transferred{', resumed' if resumed else ''}"
+        f"{f', {segments} segments' if segments > 1 else ''}) "
+        f"in {elapsed:.2f}s at {throughput / (1024 * 1024):.2f} MB/s"
+    )
+    return {
+        'path': path,
+        'bytes': transferred,
+        'size': size,
+        'seconds': elapsed,
+        'throughput': throughput,
+        'resumed': resumed,
+        'segments': segments,
+        'sha256': digest.hexdigest(),
+        'content_type': info['content_type'],
+        'kind': info['kind'],
+        'extension': info['extension'],
+    }
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import os
+from http_client import get_session
+from media_download import HEAD_BYTES, download_file
+
+logger = logging.getLogger(__name__)
+
+# Bytes hashed for the cheap "have we seen this media?" pre-check
+PREFIX_BYTES = HEAD_BYTES
+CONTENT_PRECHECK = os.environ.get("CONTENT_PRECHECK", "1") == "1"
+
+
+def prefix_digest(data):
+    return hashlib.sha256(data[:PREFIX_BYTES]).hexdigest()
+
+
+def file_prefix_digest(path):
+    with open(path, 'rb') as file:
+        return prefix_digest(file.read(PREFIX_BYTES))
+
+
+def _link(source, filename):
+    """Hardlink ``source`` to ``filename``; returns False if the filesystem can't"""
+    if os.path.exists(filename):
+        os.remove(filename)
+    try:
+        os.link(source, filename)
+        return True
+    except OSError as e:
+        logger.info(f"Could not hardlink {filename} to {source}: {e}")
+        return False
+
+
+class MediaStore:
+    """
+    Content-addressed deduplication of downloaded media.
+
+    The first copy of any content is the stored copy; later downloads of the same
+    bytes (typically the same story under a differently signed CDN URL) become
+    hardlinks to it, or are dropped in favour of a reference to the stored path
+    when hardlinks are not supported. Hashes live in the ``media`` table of the
+    folder's DownloadIndex.
+
+    Args:
+        index (DownloadIndex): Index holding the content hashes
+        precheck (bool): Compare size and the hash of the first bytes before the rest is downloaded
+    """
+
+    def __init__(self, index, precheck=CONTENT_PRECHECK):
+        self.index = index
+        self.precheck = precheck
+        self.stats = {'stored': 0, 'duplicates': 0, 'skipped_downloads': 0}
+
+    def _stored_copy(self, path):
+        return path if path and os.path.exists(path) else None
+
+    def _reuse(self, stored, filename):
+        """Point ``filename`` at the stored copy; returns the path that now holds the content"""
+        if os.path.abspath(stored) == os.path.abspath(filename):
+            return stored
+        if _link(stored, filename):
+            return filename
+        return stored
+
+    def fetch(self, url, stem, session=None, kinds=('image', 'video')):
+        """
+        Download ``url`` next to ``stem`` unless identical content is already stored.
+
+        Everything is decided from the one GET that fetches the content: its
+        headers (or sniffed first bytes) give the type, which picks the file
+        extension, and with ``precheck`` the size and first bytes are looked up
+        in the index so known media is abandoned before the body is transferred.
+
+        Args:
+            url (str): Media URL
+            stem (str): Path the media should appear at, without extension
+            session (requests.Session): Session to use
+            kinds (tuple): Media kinds to keep; anything else is not downloaded
+
+        Returns:
+            dict: ``path`` holding the content (None if the content was unwanted),
+                ``duplicate`` flag, ``sha256``, ``content_type`` and, when a download
+                happened, the ``download_file`` result as ``download``
+        """
+        session = session or get_session()
+        seen = {}
+
+        def inspect(info):
+            seen['info'] = info
+            if info['kind'] not in kinds:
+                return False
+            size, head = info['size'], info['head']
+            if self.precheck and size and len(head) >= min(size, PREFIX_BYTES):
+                match = self.index.find_media_by_prefix(size, prefix_digest(head))
+                stored = self._stored_copy(match[1]) if match else None
+                if stored:
+                    seen['match'] = (match[0], stored)
+                    return False
+            return True
+
+        result = download_file(url, stem, session=session, inspect=inspect, detect_extension=True)
+        info = seen['info']
+        if result is None and 'match' in seen:
+            sha256, stored = seen['match']
+            self.stats['duplicates'] += 1
+            self.stats['skipped_downloads'] += 1
+            logger.info(f"Skipping download of known media {sha256[:12]} ({stored})")
+            filename = f"{stem}.{info['extension']}"
+            return {'path': self._reuse(stored, filename), 'duplicate': True, 'sha256': sha256,
+                    'content_type': info['content_type']}
+        if result is None:
+            return {'path': None, 'duplicate': False, 'sha256': None, 'content_type': info['content_type']}
+
+        filename = result['path']
+        sha256 = result['sha256']
+        stored = self._stored_copy(self.index.find_media(sha256))
+        if stored and os.path.abspath(stored) != os.path.abspath(filename):
+            self.stats['duplicates'] += 1
+            logger.info(f"Downloaded media {sha256[:12]} is a duplicate of {stored}")
+            os.remove(filename)
+            return {'path': self._reuse(stored, filename), 'duplicate': True, 'sha256': sha256,
+                    'content_type': result['content_type'], 'download': result}
+
+        self.index.add_media(sha256, result['size'], file_prefix_digest(filename), filename)
+        self.stats['stored'] += 1
+        return {'path': filename, 'duplicate': False, 'sha256': sha256,
+                'content_type': result['content_type'], 'download': result}
@@ -0,0 +1,337 @@
+"""
+Minimal Prometheus-style metrics with no third-party dependency.
+
+Metrics register themselves in ``REGISTRY`` and are exposed in the Prometheus
+text format by ``start_metrics_server``. Every finished ``tracing.span`` is
+recorded in ``scrape_stage_seconds`` by its name, and counted in
+``scrape_stage_errors_total`` if it raised.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tracing import add_span_hook
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+# Loopback only by default: labels and traces carry usernames. Set 0.0.0.0 to expose it, e.g. in a container.
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1")
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values, **kwargs):
+        """Get the child metric for one combination of label values"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        """The unlabelled child, for metrics without labels"""
+        return self.labels()
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._items()]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down.
+
+    Args:
+        function (callable): Compute the value at scrape time instead of setting it
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, function=None):
+        self.function = function
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    @contextmanager
+    def track_inprogress(self):
+        """Count the block as in progress while it runs"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [f"{self.name} {_format_value(self.function())}"]
+            except Exception as e:
+                logger.warning(f"Could not compute {self.name}: {e}")
+                return []
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._items()]
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Args:
+        buckets (tuple): Upper bounds of the buckets; ``+Inf`` is added automatically
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        lines = []
+        for values, child in self._items():
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, values, {'le': _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def count_chrome_processes():
+    """Number of running Chrome/Chromium processes (browser, renderers and helpers), from /proc"""
+    count = 0
+    try:
+        pids = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/comm') as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if name.startswith(('chrome', 'chromium', 'google-chrome')) and name != 'chromedriver':
+            count += 1
+    return count
+
+
+STAGE_SECONDS = Histogram('scrape_stage_seconds', 'Time spent in each scrape stage', ['stage'])
+STAGE_ERRORS = Counter('scrape_stage_errors_total', 'Scrape stages that raised an error', ['stage'])
+SCRAPES_IN_FLIGHT = Gauge('scrapes_in_flight', 'Scrapes currently running')
+SCRAPES = Counter('scrapes_total', 'Finished scrapes by backend and result', ['backend', 'result'])
+LINK_VALIDATIONS = Counter('link_validations_total', 'Validated download links by result', ['result'])
+CHROME_PROCESSES = Gauge('chrome_processes', 'Chrome processes running on this host', function=count_chrome_processes)
+WATCHDOG_KILLS = Counter('watchdog_kills_total', 'Hung browser sessions killed by the watchdog')
+RATE_LIMIT = Gauge('rate_limit_per_second', 'Current adaptive request rate limit per upstream host', ['host'])
+RATE_LIMIT_WAIT = Histogram(
+    'rate_limit_wait_seconds', 'Time requests waited for their turn under the rate limit', ['host'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RATE_LIMIT_WAITING = Gauge('rate_limit_waiting', 'Requests currently waiting for their turn', ['host'])
+RATE_LIMIT_BACKOFFS = Counter('rate_limit_backoffs_total', 'Responses that made a host limit back off', ['host', 'reason'])
+PROVIDER_SECONDS = Histogram('provider_seconds', 'Time extraction providers took to answer', ['provider'])
+PROVIDER_REQUESTS = Counter('provider_requests_total', 'Extraction provider requests by result', ['provider', 'result'])
+HEDGES = Counter('hedged_requests_total', 'Requests also sent to another provider, by why', ['reason'])
+
+
+def _validation_success_ratio():
+    valid = LINK_VALIDATIONS.labels('valid').value
+    invalid = LINK_VALIDATIONS.labels('invalid').value
+    return valid / (valid + invalid) if valid + invalid else 0.0
+
+
+VALIDATION_SUCCESS_RATIO = Gauge(
+    'link_validation_success_ratio', 'Share of validated links that were valid', function=_validation_success_ratio
+)
+
+
+def _observe_span(finished):
+    """Span end hook feeding the per-stage latency and error metrics"""
+    STAGE_SECONDS.labels(finished.name).observe(finished.duration)
+    if finished.error:
+        STAGE_ERRORS.labels(finished.name).inc()
+
+
+add_span_hook(on_end=_observe_span)
+
+
+def record_validation(results):
+    """Count ``validate_links`` results"""
+    for is_valid, _ in results:
+        LINK_VALIDATIONS.labels('valid' if is_valid else 'invalid').inc()
+
+
+def start_metrics_server(port=METRICS_PORT, address=METRICS_ADDRESS, registry=REGISTRY):
+    """
+    Serve ``/metrics`` from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server (call ``shutdown()`` to stop it)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{address}:{server.server_address[1]}/metrics")
+    return server
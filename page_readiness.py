@@ -0,0 +1,228 @@
+import logging
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger(__name__)
+
+POLL_FREQUENCY = 0.1
+
+# Tracks DOM mutations and in-flight fetch/XHR requests on the current page.
+# Safe to run repeatedly: it only installs itself once per document.
+OBSERVER_SCRIPT = """
+if (!window.__readiness) {
+    var state = window.__readiness = {
+        lastMutation: performance.now(),
+        lastNetwork: performance.now(),
+        pending: 0
+    };
+    new MutationObserver(function() {
+        state.lastMutation = performance.now();
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+
+    var done = function() {
+        state.pending = Math.max(0, state.pending - 1);
+        state.lastNetwork = performance.now();
+    };
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function() {
+            state.pending += 1;
+            state.lastNetwork = performance.now();
+            return originalFetch.apply(this, arguments).finally(done);
+        };
+    }
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.pending += 1;
+        state.lastNetwork = performance.now();
+        this.addEventListener('loadend', done);
+        return originalSend.apply(this, arguments);
+    };
+}
+"""
+
+READY_STATE_SCRIPT = """
+var state = window.__readiness;
+if (!state || document.readyState !== 'complete') {
+    return null;
+}
+var now = performance.now();
+return {
+    pending: state.pending,
+    sinceMutation: (now - state.lastMutation) / 1000,
+    sinceNetwork: (now - state.lastNetwork) / 1000
+};
+"""
+
+
+class ReadinessTracker:
+    """Records how long each readiness wait took compared to the fixed sleep it replaced"""
+
+    def __init__(self, name):
+        self.name = name
+        self.waits = []
+
+    def record(self, label, replaced, elapsed, ready=True):
+        """
+        Record one wait.
+
+        Args:
+            label (str): What was being waited for
+            replaced (float): Seconds the old fixed sleep took
+            elapsed (float): Seconds the readiness wait actually took
+            ready (bool): Whether the readiness signal fired before the timeout
+        """
+        self.waits.append({
+            'label': label,
+            'replaced': replaced,
+            'elapsed': elapsed,
+            'ready': ready,
+        })
+
+    def skip(self, label, replaced):
+        """Record a fixed sleep that was dropped because nothing needs waiting for"""
+        self.record(label, replaced, 0.0)
+
+    @property
+    def time_saved(self):
+        return sum(wait['replaced'] - wait['elapsed'] for wait in self.waits)
+
+    def summary(self):
+        """
+        Get the totals for this scrape.
+
+        Returns:
+            dict: Waits performed, seconds spent waiting and seconds saved
+        """
+        return {
+            'name': self.name,
+            'waits': len(self.waits),
+            'timeouts': sum(1 for wait in self.waits if not wait['ready']),
+            'waited': sum(wait['elapsed'] for wait in self.waits),
+            'replaced': sum(wait['replaced'] for wait in self.waits),
+            'saved': self.time_saved,
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(
+            f"Readiness waits for {summary['name']}: {summary['waits']} waits took "
+            f"{summary['waited']:.1f}s instead of {summary['replaced']:.1f}s "
+            f"(saved {summary['saved']:.1f}s, {summary['timeouts']} timed out)"
+        )
+        return summary
+
+
+def install_observers(driver):
+    """
+    Install the mutation and network observers on the current page.
+
+    Call it before the click or navigation whose effects are waited for:
+    requests sent before the observers exist are never counted as in flight.
+    A new document (after navigating) needs them installed again.
+    """
+    driver.execute_script(OBSERVER_SCRIPT)
+
+
+def _wait(driver, condition, timeout):
+    """Poll ``condition`` until it is truthy; return False instead of raising on timeout"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_page_ready(driver, timeout, quiet_period=0.3, network_idle=0.5):
+    """
+    Wait until the document has loaded, no fetch/XHR is in flight and the DOM has stopped changing.
+
+    Only reads the state of observers installed earlier with ``install_observers``;
+    without them the page never counts as ready and the wait runs to ``timeout``.
+
+    Args:
+        driver (WebDriver): Browser to wait on
+        timeout (float): Maximum seconds to wait
+        quiet_period (float): Seconds without DOM mutations required
+        network_idle (float): Seconds without network activity required
+
+    Returns:
+        bool: True if the page became ready before the timeout
+    """
+    def ready(d):
+        state = d.execute_script(READY_STATE_SCRIPT)
+        return bool(state) and state['pending'] == 0 \
+            and state['sinceNetwork'] >= network_idle \
+            and state['sinceMutation'] >= quiet_period
+
+    return _wait(driver, ready, timeout)
+
+
+def wait_for_dom_quiet(driver, timeout, quiet_period=0.3):
+    """
+    Wait until the DOM has not changed for ``quiet_period`` seconds.
+
+    Needs the observers from ``install_observers``, like ``wait_for_page_ready``.
+
+    Returns:
+        bool: True if the DOM settled before the timeout
+    """
+    def quiet(d):
+        state = d.execute_script(READY_STATE_SCRIPT)
+        return bool(state) and state['sinceMutation'] >= quiet_period
+
+    return _wait(driver, quiet, timeout)
+
+
+def count_elements(driver, css_selector):
+    return len(driver.find_elements(By.CSS_SELECTOR, css_selector))
+
+
+def wait_for_count_change(driver, css_selector, previous_count, timeout):
+    """
+    Wait until the number of elements matching ``css_selector`` differs from ``previous_count``.
+
+    Returns:
+        bool: True if the count changed before the timeout
+    """
+    return _wait(driver, lambda d: count_elements(d, css_selector) != previous_count, timeout)
+
+
+def wait_until_ready(driver, tracker, label, replaces, timeout=None, **kwargs):
+    """
+    Replacement for a fixed ``time.sleep(replaces)`` that returns as soon as the page is ready.
+
+    The wait never takes longer than the sleep it replaces unless a longer ``timeout`` is given,
+    so a page that never signals readiness behaves exactly like the old fixed sleep.
+
+    Args:
+        driver (WebDriver): Browser to wait on
+        tracker (ReadinessTracker): Collects the time saved for this scrape
+        label (str): What is being waited for
+        replaces (float): Seconds the old fixed sleep took
+        timeout (float): Maximum seconds to wait (defaults to ``replaces``)
+
+    Returns:
+        bool: True if the page became ready before the timeout
+    """
+    start = time.monotonic()
+    ready = wait_for_page_ready(driver, replaces if timeout is None else timeout, **kwargs)
+    tracker.record(label, replaces, time.monotonic() - start, ready)
+    return ready
+
+
+def wait_for_new_items(driver, tracker, label, css_selector, previous_count, replaces, timeout=None):
+    """
+    Replacement for a fixed sleep after a "See more" click that returns once new items appear.
+
+    Returns:
+        bool: True if new items appeared before the timeout
+    """
+    start = time.monotonic()
+    changed = wait_for_count_change(
+        driver, css_selector, previous_count, replaces if timeout is None else timeout
+    )
+    tracker.record(label, replaces, time.monotonic() - start, changed)
+    return changed
@@ -0,0 +1,303 @@
+"""
+Adaptive per-host rate limiting for every request to fastdl.app and the media CDN.
+
+Each upstream host listed in ``RATE_LIMITS`` gets a token bucket. A request
+reserves a token and waits until the bucket would have refilled it, so bursts
+are spread out instead of being throttled by the server. The buckets live in
+a SQLite database at ``RATE_LIMIT_PATH``; the bot, scrape workers and the
+downloader CLI can point at the same file to share one budget. Without a path
+each process keeps its own buckets in memory.
+
+Limits adapt AIMD-style: every 429, 5xx or timeout from a host multiplies its
+rate by ``RATE_LIMIT_DECREASE``, at most once per ``RATE_LIMIT_COOLDOWN``
+seconds. Every successful response adds ``RATE_LIMIT_INCREASE`` requests per
+second back, up to the configured rate.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+from selenium.common.exceptions import TimeoutException
+from metrics import RATE_LIMIT, RATE_LIMIT_BACKOFFS, RATE_LIMIT_WAIT, RATE_LIMIT_WAITING
+
+logger = logging.getLogger(__name__)
+
+# Requests per second per host; a host also matches its subdomains. Unlisted hosts are not limited.
+RATE_LIMITS = os.environ.get("RATE_LIMITS", "fastdl.app=5,cdninstagram.com=20,fbcdn.net=20")
+RATE_LIMIT_PATH = os.environ.get("RATE_LIMIT_PATH")
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_MIN = float(os.environ.get("RATE_LIMIT_MIN", "0.2"))
+RATE_LIMIT_INCREASE = float(os.environ.get("RATE_LIMIT_INCREASE", "0.1"))
+RATE_LIMIT_DECREASE = float(os.environ.get("RATE_LIMIT_DECREASE", "0.5"))
+RATE_LIMIT_COOLDOWN = float(os.environ.get("RATE_LIMIT_COOLDOWN", "1"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    host TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    backed_off_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def parse_limits(spec):
+    """
+    Parse a ``host=rate,host=rate`` list.
+
+    Returns:
+        dict: Requests per second per host
+    """
+    limits = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        host, rate = item.split('=', 1)
+        limits[host.strip().lower()] = float(rate)
+    return limits
+
+
+class RateLimiter:
+    """
+    Token buckets per upstream host with AIMD rate adaptation.
+
+    Args:
+        limits (dict): Maximum requests per second per host (suffix match)
+        path (str): SQLite file shared between processes (None keeps the buckets in memory)
+        burst (float): Requests a host may get at once after being idle
+        min_rate (float): Lowest rate backing off may go down to
+        increase (float): Requests per second added back per successful response
+        decrease (float): Factor the rate is multiplied by on a 429, 5xx or timeout
+        cooldown (float): Minimum seconds between two back-offs of the same host
+    """
+
+    def __init__(self, limits=None, path=RATE_LIMIT_PATH, burst=RATE_LIMIT_BURST, min_rate=RATE_LIMIT_MIN,
+                 increase=RATE_LIMIT_INCREASE, decrease=RATE_LIMIT_DECREASE, cooldown=RATE_LIMIT_COOLDOWN):
+        self.limits = parse_limits(RATE_LIMITS) if limits is None else limits
+        self.path = path
+        self.burst = burst
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Transactions are managed explicitly so a reservation reads and updates its bucket atomically
+        self.conn = sqlite3.connect(path or ':memory:', timeout=30, check_same_thread=False, isolation_level=None)
+        if path:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def bucket_for(self, url):
+        """
+        Find the bucket a URL is limited by.
+
+        Returns:
+            tuple: (host key, maximum rate), or (None, None) if the host is not limited
+        """
+        host = (urlsplit(url).hostname or '').lower()
+        best = None
+        for key in self.limits:
+            if host == key or host.endswith('.' + key):
+                if best is None or len(key) > len(best):
+                    best = key
+        if best is None:
+            return None, None
+        return best, self.limits[best]
+
+    def reserve(self, url):
+        """
+        Take a token for a request to ``url`` without waiting.
+
+        Tokens can be taken ahead of time; the bucket then goes into debt and
+        the caller has to wait until the debt is paid off.
+
+        Returns:
+            tuple: (host key or None, seconds to wait before sending)
+        """
+        key, ceiling = self.bucket_for(url)
+        if key is None:
+            return None, 0.0
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT rate, tokens, updated_at FROM buckets WHERE host = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    rate, tokens = ceiling, self.burst
+                else:
+                    rate, tokens, updated_at = row
+                    tokens = min(self.burst, tokens + max(0.0, now - updated_at) * rate)
+                tokens -= 1
+                self.conn.execute(
+                    "INSERT INTO buckets (host, rate, tokens, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(host) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    (key, rate, tokens, now),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        RATE_LIMIT.labels(key).set(rate)
+        return key, max(0.0, -tokens / rate)
+
+    def acquire(self, url):
+        """
+        Block until a request to ``url`` may be sent.
+
+        Returns:
+            float: Seconds waited
+        """
+        key, wait = self.reserve(url)
+        if key is None:
+            return 0.0
+        RATE_LIMIT_WAIT.labels(key).observe(wait)
+        if wait > 0:
+            waiting = RATE_LIMIT_WAITING.labels(key)
+            waiting.inc()
+            try:
+                time.sleep(wait)
+            finally:
+                waiting.dec()
+        return wait
+
+    async def acquire_async(self, url):
+        """
+        asyncio version of ``acquire``: waits on the event loop instead of blocking it.
+
+        The reservation runs on a worker thread, since a shared bucket file may
+        keep ``BEGIN IMMEDIATE`` waiting for another process's lock.
+        """
+        if self.bucket_for(url)[0] is None:
+            return 0.0
+        key, wait = await asyncio.to_thread(self.reserve, url)
+        RATE_LIMIT_WAIT.labels(key).observe(wait)
+        if wait > 0:
+            waiting = RATE_LIMIT_WAITING.labels(key)
+            waiting.inc()
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                waiting.dec()
+        return wait
+
+    def record(self, url, status=None, timed_out=False, retry_after=None):
+        """
+        Adapt the host's rate to the outcome of a request.
+
+        Args:
+            url (str): URL the request went to
+            status (int): HTTP status of the response (None if there was none)
+            timed_out (bool): Whether the request timed out
+            retry_after (float): Seconds from a 429's Retry-After header; nobody sends to the host before then
+        """
+        key, ceiling = self.bucket_for(url)
+        if key is None:
+            return
+        if timed_out:
+            reason = 'timeout'
+        elif status == 429:
+            reason = '429'
+        elif status is not None and status >= 500:
+            reason = '5xx'
+        else:
+            reason = None
+
+        now = time.time()
+        with self._lock:
+            if reason is None:
+                if status is None:
+                    return
+                self.conn.execute(
+                    "UPDATE buckets SET rate = MIN(?, rate + ?) WHERE host = ? AND rate < ?",
+                    (ceiling, self.increase, key, ceiling),
+                )
+            else:
+                RATE_LIMIT_BACKOFFS.labels(key, reason).inc()
+                backed_off = self.conn.execute(
+                    "UPDATE buckets SET rate = MAX(?, rate * ?), backed_off_at = ? WHERE host = ? AND backed_off_at < ?",
+                    (self.min_rate, self.decrease, now, key, now - self.cooldown),
+                ).rowcount
+                if retry_after:
+                    self.conn.execute(
+                        "UPDATE buckets SET tokens = MIN(tokens, -rate * ?), updated_at = ? WHERE host = ?",
+                        (retry_after, now, key),
+                    )
+            row = self.conn.execute("SELECT rate FROM buckets WHERE host = ?", (key,)).fetchone()
+        if row is None:
+            return
+        RATE_LIMIT.labels(key).set(row[0])
+        if reason is not None and backed_off:
+            logger.warning(f"Backing off {key} after a {reason}: limit now {row[0]:.2f} requests/s")
+
+    async def record_async(self, url, status=None, timed_out=False, retry_after=None):
+        """asyncio version of ``record``, run on a worker thread so the bucket file is never written from the loop"""
+        if self.bucket_for(url)[0] is not None:
+            await asyncio.to_thread(self.record, url, status, timed_out, retry_after)
+
+    def stats(self):
+        """
+        Get the state of every bucket.
+
+        Returns:
+            dict: Per host, the current ``rate`` and ``tokens`` (negative while requests are queued)
+        """
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute("SELECT host, rate, tokens, updated_at FROM buckets").fetchall()
+        return {
+            host: {'rate': rate, 'tokens': min(self.burst, tokens + max(0.0, now - updated_at) * rate)}
+            for host, rate, tokens, updated_at in rows
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def get_rate_limiter():
+    """
+    Get the process-wide rate limiter, creating it on first use.
+
+    Returns:
+        RateLimiter: The shared limiter
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def retry_after_seconds(value):
+    """Seconds in a Retry-After header, or None if it is missing or an HTTP date"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def navigate(driver, url):
+    """
+    ``driver.get(url)`` under the rate limit of the URL's host.
+
+    Args:
+        driver (WebDriver): Browser to navigate
+        url (str): Page to open
+    """
+    limiter = get_rate_limiter()
+    limiter.acquire(url)
+    try:
+        driver.get(url)
+    except TimeoutException:
+        limiter.record(url, timed_out=True)
+        raise
@@ -0,0 +1,396 @@
+"""
+Keeps a broken or hanging fastdl.app from tying up every scrape.
+
+* ``deadline`` gives a whole scrape one time budget. Each wait inside it asks
+  ``stage_timeout`` for its timeout and gets at most what is left of the
+  budget, so a run of slow stages can no longer add up to minutes.
+* ``watchdog`` kills Chrome sessions still held long after their deadline.
+  A browser that stopped answering blocks the scrape thread in a WebDriver
+  call no timeout covers; killing its processes makes that call fail.
+* ``CircuitBreaker`` fails fast while most recent scrapes have failed. It
+  probes for recovery in the background and lets one trial request through
+  once the probe succeeds.
+"""
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from metrics import WATCHDOG_KILLS
+
+logger = logging.getLogger(__name__)
+
+# Overall time budget of one scrape, in seconds
+SCRAPE_DEADLINE = float(os.environ.get("SCRAPE_DEADLINE", "90"))
+# Chrome held this many seconds past its scrape's deadline is considered hung and killed
+WATCHDOG_GRACE = float(os.environ.get("WATCHDOG_GRACE", "30"))
+
+BREAKER_FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", "5"))
+BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", "20"))
+BREAKER_PROBE_INTERVAL = float(os.environ.get("BREAKER_PROBE_INTERVAL", "30"))
+
+_deadline = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a scrape stage starts after the scrape's deadline has passed"""
+
+
+class Deadline:
+    """
+    Point in time by which a scrape has to be done.
+
+    Args:
+        seconds (float): Time budget from now
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, limit=None):
+        """
+        Timeout for the next stage.
+
+        Args:
+            limit (float): The stage's own timeout (None for no limit of its own)
+
+        Returns:
+            float: ``limit`` capped to the time left
+
+        Raises:
+            DeadlineExceeded: If no time is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Scrape took longer than its {self.seconds:.0f}s deadline")
+        return remaining if limit is None else min(limit, remaining)
+
+
+@contextmanager
+def deadline(seconds=SCRAPE_DEADLINE):
+    """
+    Run a block under a deadline, visible to ``stage_timeout`` in the same context.
+
+    A nested deadline never extends an outer one that expires sooner.
+
+    Args:
+        seconds (float): Time budget of the block
+
+    Yields:
+        Deadline: The deadline in effect
+    """
+    current = Deadline(seconds)
+    outer = _deadline.get()
+    if outer is not None and outer.expires_at < current.expires_at:
+        current = outer
+    token = _deadline.set(current)
+    try:
+        yield current
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    """The deadline of the running scrape, or None outside of one"""
+    return _deadline.get()
+
+
+def stage_timeout(limit=None):
+    """
+    Timeout for one stage of the running scrape.
+
+    Args:
+        limit (float): The stage's own timeout
+
+    Returns:
+        float: ``limit``, capped to the time left when there is a deadline
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed
+    """
+    current = _deadline.get()
+    return limit if current is None else current.timeout(limit)
+
+
+def check_deadline():
+    """
+    Fail if the running scrape is past its deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed
+    """
+    stage_timeout()
+
+
+def hang_timeout():
+    """Seconds from now after which a browser still held by this scrape counts as hung"""
+    current = _deadline.get()
+    return (current.remaining() if current else SCRAPE_DEADLINE) + WATCHDOG_GRACE
+
+
+class Watchdog:
+    """
+    Calls a function for blocks that run longer than their timeout.
+
+    One daemon thread, started on first use, checks the watched blocks every
+    ``interval`` seconds.
+
+    Args:
+        interval (float): Seconds between checks
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'watched': 0, 'fired': 0}
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                due = [key for key, (expires_at, _, _) in self._watched.items() if expires_at <= now]
+                fired = [self._watched.pop(key) for key in due]
+                self._stats['fired'] += len(fired)
+            for _, on_timeout, name in fired:
+                logger.error(f"Watchdog: {name} is still running past its timeout")
+                try:
+                    on_timeout()
+                except Exception as e:
+                    logger.error(f"Watchdog action for {name} failed: {e}")
+
+    @contextmanager
+    def watch(self, timeout, on_timeout, name="task"):
+        """
+        Watch a block, calling ``on_timeout`` from the watchdog thread if it is still running after ``timeout``.
+
+        Args:
+            timeout (float): Seconds the block may take
+            on_timeout (callable): Called without arguments once the block overruns
+            name (str): What is being watched, for the logs
+        """
+        key = object()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+                self._thread.start()
+            self._watched[key] = (time.monotonic() + timeout, on_timeout, name)
+            self._stats['watched'] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watched.pop(key, None)
+
+    def stats(self):
+        """
+        Get watchdog counters.
+
+        Returns:
+            dict: Blocks watched and fired on so far, and blocks watched now
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active'] = len(self._watched)
+        return stats
+
+
+watchdog = Watchdog()
+
+
+def _child_pids():
+    """Map of PID to child PIDs, from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name is in parentheses and may contain spaces; the PPID follows the state
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def kill_process_tree(pid):
+    """
+    SIGKILL a process and all its descendants, descendants first.
+
+    Args:
+        pid (int): Root of the process tree
+
+    Returns:
+        int: Number of processes signalled
+    """
+    try:
+        children = _child_pids()
+    except OSError:
+        children = {}
+    tree = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+
+    killed = 0
+    for target in reversed(tree):
+        try:
+            os.kill(target, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+
+def kill_browser(driver):
+    """Kill a WebDriver's chromedriver and every Chrome process under it"""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None:
+        logger.error("Cannot kill hung browser: no chromedriver process")
+        return
+    killed = kill_process_tree(process.pid)
+    WATCHDOG_KILLS.inc()
+    logger.error(f"Killed hung browser: {killed} processes under chromedriver {process.pid}")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service the circuit breaker considers down"""
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while a service keeps failing.
+
+    The breaker opens when at least ``failure_rate`` of the last ``window``
+    calls failed (once ``min_calls`` were made). While it is open, ``check``
+    raises ``CircuitOpenError`` and a background thread runs ``probe`` every
+    ``probe_interval`` seconds; without a probe it just waits that long. Once
+    the probe succeeds the breaker lets one trial call through. The breaker
+    closes if the trial succeeds and opens again if it fails.
+
+    Callers call ``check`` before the protected call and ``record`` with its
+    outcome afterwards.
+
+    Args:
+        name (str): Name of the protected service, for logs and messages
+        probe (callable): Returns truthy once the service looks healthy again
+        failure_rate (float): Share of failed calls that opens the breaker
+        min_calls (int): Calls needed in the window before it can open
+        window (int): Number of recent calls considered
+        probe_interval (float): Seconds between probes while open
+        message (str): Text of the ``CircuitOpenError``
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, probe=None, failure_rate=BREAKER_FAILURE_RATE, min_calls=BREAKER_MIN_CALLS,
+                 window=BREAKER_WINDOW, probe_interval=BREAKER_PROBE_INTERVAL, message=None):
+        self.name = name
+        self.probe = probe
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.probe_interval = probe_interval
+        self.message = message or f"{name} is failing right now. Please try again in a few minutes."
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._trial = False
+        self._lock = threading.Lock()
+        self._stats = {'rejected': 0, 'opened': 0, 'probes': 0}
+
+    def check(self):
+        """
+        Ask to make a call.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with the trial call already running
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                logger.info(f"Circuit breaker for {self.name}: sending a trial request")
+                return
+            self._stats['rejected'] += 1
+        raise CircuitOpenError(self.message)
+
+    def record(self, success):
+        """
+        Report the outcome of a call allowed by ``check``.
+
+        Args:
+            success (bool): Whether the call succeeded (None if it was cancelled and says nothing)
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trial:
+                self._trial = False
+                if success:
+                    logger.info(f"Circuit breaker for {self.name} closed: trial request succeeded")
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                elif success is not None:
+                    self._open("trial request failed")
+                return
+            if success is None or self.state != self.CLOSED:
+                return
+            self._outcomes.append(bool(success))
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open(f"{failures} of the last {len(self._outcomes)} calls failed")
+
+    def _open(self, reason):
+        """Open the breaker and start probing; call with the lock held"""
+        logger.error(f"Circuit breaker for {self.name} opened: {reason}")
+        self.state = self.OPEN
+        self._stats['opened'] += 1
+        threading.Thread(target=self._probe_until_healthy, name=f"probe-{self.name}", daemon=True).start()
+
+    def _probe_until_healthy(self):
+        while True:
+            time.sleep(self.probe_interval)
+            healthy = True
+            if self.probe:
+                with self._lock:
+                    self._stats['probes'] += 1
+                try:
+                    healthy = self.probe()
+                except Exception as e:
+                    logger.info(f"Probe of {self.name} failed: {e}")
+                    healthy = False
+            if healthy:
+                with self._lock:
+                    if self.state == self.OPEN:
+                        logger.info(f"Circuit breaker for {self.name} half-open: probe succeeded")
+                        self.state = self.HALF_OPEN
+                        self._trial = False
+                return
+
+    def stats(self):
+        """
+        Get breaker counters.
+
+        Returns:
+            dict: State, failures in the window, rejected calls, times opened and probes run
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.state
+            stats['window_failures'] = self._outcomes.count(False)
+            stats['window_calls'] = len(self._outcomes)
+        return stats
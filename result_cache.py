@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_username(username):
+    """Normalize an Instagram username for use as a cache key"""
+    return username.strip().lstrip('@').lower()
+
+
+class ResultCache:
+    """
+    Size-bounded TTL cache with single-flight request coalescing for asyncio code.
+
+    While a fetch for a key is in flight, other callers asking for the same key
+    await that fetch instead of starting their own. If the caller that started
+    it gives up, the callers that joined it fetch again instead of sharing
+    its cancellation. Empty results are not cached because the scrapers also
+    return an empty list when they fail.
+
+    Args:
+        ttl (float): Seconds a result stays fresh
+        max_size (int): Maximum number of cached keys; least recently used are evicted first
+    """
+
+    def __init__(self, ttl=60, max_size=256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+        }
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    async def get_or_fetch(self, key, fetch, cancelled=()):
+        """
+        Return the cached result for ``key`` or run ``fetch`` once to produce it.
+
+        Args:
+            key (str): Normalized cache key
+            fetch (callable): Coroutine function producing the result
+            cancelled (tuple): Exceptions from ``fetch`` that mean only its caller gave up
+                (like ``asyncio.CancelledError``); callers that joined the fetch then run their own
+
+        Returns:
+            list: The cached or freshly fetched result (a copy)
+        """
+        while True:
+            value = self._lookup(key)
+            if value is not None:
+                self._stats['hits'] += 1
+                return list(value)
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self._stats['coalesced'] += 1
+            logger.info(f"Joining in-flight fetch for {key}")
+            # Unlike awaiting it, asyncio.wait leaves the shared fetch running if this caller is cancelled
+            await asyncio.wait({inflight})
+            if not inflight.cancelled():
+                return list(inflight.result())
+            logger.info(f"In-flight fetch for {key} was cancelled by its caller, fetching again")
+
+        self._stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved even when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except (asyncio.CancelledError,) + tuple(cancelled):
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            if value:
+                self._store(key, value)
+            return list(value)
+        finally:
+            del self._inflight[key]
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hit, miss, coalesce and eviction counters plus current size
+        """
+        stats = dict(self._stats)
+        stats['size'] = len(self._entries)
+        stats['inflight'] = len(self._inflight)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
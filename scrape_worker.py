@@ -0,0 +1,173 @@
+"""
+Scrape worker: runs story and reel jobs from the job queue.
+
+Start as many of these as the hardware allows, on the same host as a bot
+started with the same ``JOB_QUEUE_PATH``. The queue file must be on a local
+disk, because SQLite locking is not reliable over network filesystems:
+
+    JOB_QUEUE_PATH=logs/jobs.db python scrape_worker.py --concurrency 4
+
+Each job's lease is renewed while it runs. If the worker dies, the lease
+runs out and another worker picks the job up. SIGTERM stops leasing new jobs
+and lets the running ones finish.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+from async_downloader import close_async_backends, get_instagram_reel_links, get_instagram_story_links
+from instagram_downloader import BROWSER_POOL_SIZE, EXTRACTION_PROVIDERS, get_browser_pool
+from job_queue import JOB_POLL_INTERVAL, JOB_QUEUE_PATH, JobQueue
+from metrics import start_metrics_server
+from tracing import request_context
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", str(BROWSER_POOL_SIZE)))
+# Separate from the bot's METRICS_PORT so both can run on one host (0 disables it)
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9101"))
+PURGE_INTERVAL = 3600
+
+# Job kind -> coroutine function taking the job payload
+HANDLERS = {
+    'stories': lambda payload: get_instagram_story_links(payload['username']),
+    'reel': lambda payload: get_instagram_reel_links(payload['url']),
+}
+
+
+async def _keep_leased(queue, job, worker_id, task):
+    """Renew the job's lease until it finishes, cancelling it if the lease is lost"""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not await asyncio.to_thread(queue.heartbeat, job['id'], worker_id):
+            logger.warning(f"Lost the lease on job {job['id']}, abandoning it")
+            task.cancel()
+            return
+
+
+async def run_job(queue, job, worker_id):
+    """
+    Run one leased job and store its result.
+
+    Args:
+        queue (JobQueue): Queue the job was leased from
+        job (dict): The leased job
+        worker_id (str): ID the job was leased under
+    """
+    payload = job['payload']
+    with request_context(payload.get('request_id'), name="queued_job", job_id=job['id'], kind=job['kind'],
+                         attempt=job['attempts']):
+        handler = HANDLERS.get(job['kind'])
+        if handler is None:
+            await asyncio.to_thread(queue.fail, job['id'], worker_id, f"Unknown job kind: {job['kind']}")
+            return
+
+        logger.info(f"Running job {job['id']} ({job['kind']}, attempt {job['attempts']})")
+        task = asyncio.ensure_future(handler(payload))
+        heartbeat = asyncio.ensure_future(_keep_leased(queue, job, worker_id, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            # The lease was lost; whoever holds the job now reports it
+            if heartbeat.done():
+                return
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {e}", exc_info=True)
+            await asyncio.to_thread(queue.fail, job['id'], worker_id, e)
+            return
+        finally:
+            heartbeat.cancel()
+
+        if await asyncio.to_thread(queue.complete, job['id'], worker_id, result):
+            logger.info(f"Finished job {job['id']}")
+        else:
+            logger.warning(f"Dropped the result of job {job['id']}: the lease was lost")
+
+
+async def work(queue, concurrency=WORKER_CONCURRENCY, worker_id=None, poll_interval=JOB_POLL_INTERVAL, stop=None):
+    """
+    Lease and run jobs until ``stop`` is set, then wait for the running ones.
+
+    Args:
+        queue (JobQueue): Queue to take jobs from
+        concurrency (int): Maximum number of jobs running at once
+        worker_id (str): ID to lease jobs under (defaults to hostname and PID)
+        poll_interval (float): Seconds between checks of an empty queue
+        stop (asyncio.Event): Set to stop leasing jobs
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    stop = stop or asyncio.Event()
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    next_purge = 0
+    logger.info(f"Worker {worker_id} running up to {concurrency} jobs from {queue.path}")
+
+    while not stop.is_set():
+        if time.monotonic() >= next_purge:
+            await asyncio.to_thread(queue.purge)
+            next_purge = time.monotonic() + PURGE_INTERVAL
+
+        await slots.acquire()
+        # Queue calls run on a thread: the bot and the other workers share the file, and waiting for its
+        # lock on the loop would stall this worker's running scrapes and their heartbeats
+        job = None if stop.is_set() else await asyncio.to_thread(queue.lease, worker_id)
+        if job is None:
+            slots.release()
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        task = asyncio.ensure_future(run_job(queue, job, worker_id))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+    if running:
+        logger.info(f"Waiting for {len(running)} running jobs")
+        await asyncio.gather(*running, return_exceptions=True)
+    logger.info(f"Worker {worker_id} stopped")
+
+
+async def _main(args):
+    queue = JobQueue(args.queue)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    metrics_server = start_metrics_server(port=args.metrics_port) if args.metrics_port else None
+    if "selenium" in EXTRACTION_PROVIDERS:
+        await asyncio.to_thread(get_browser_pool().warm)
+    try:
+        await work(queue, args.concurrency, stop=stop)
+    finally:
+        await close_async_backends()
+        await asyncio.to_thread(get_browser_pool().close)
+        queue.close()
+        if metrics_server:
+            metrics_server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run scrape jobs from the job queue")
+    parser.add_argument("--queue", default=JOB_QUEUE_PATH, help="Job queue database (default: JOB_QUEUE_PATH)")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Jobs run at once")
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT, help="Metrics port (0 disables it)")
+    args = parser.parse_args(argv)
+    if not args.queue:
+        parser.error("set JOB_QUEUE_PATH or pass --queue")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
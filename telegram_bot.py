@@ -2,8 +2,18 @@ import os
 import logging
 import asyncio
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from instagram_downloader import get_instagram_story_links
+from async_downloader import close_async_backends, get_instagram_story_links
+from hedging import provider_tracker
+from instagram_downloader import EXTRACTION_PROVIDERS, get_browser_pool, story_breaker
+from job_queue import JOB_QUEUE_PATH, JobQueue
+from job_scheduler import FairScheduler, JobCancelledError, QueueFullError
+from media_delivery import FileIdCache, send_media_groups
+from metrics import METRICS_PORT, Gauge, start_metrics_server
+from resilience import CircuitOpenError
+from tracing import get_request_id, request_context, span
+from result_cache import ResultCache, normalize_username
 import re
 
 # Configure logging
@@ -18,6 +28,36 @@ TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 if not TELEGRAM_TOKEN:
     raise ValueError("TELEGRAM_TOKEN environment variable not set!")
 
+# Recent results per username, shared by everyone asking for the same account
+story_cache = ResultCache(
+    ttl=float(os.environ.get("STORY_CACHE_TTL", "60")),
+    max_size=int(os.environ.get("STORY_CACHE_SIZE", "256")),
+)
+
+# "links" replies with the CDN URLs as text, "media" sends the stories themselves as media groups
+DELIVERY_MODE = os.environ.get("DELIVERY_MODE", "links")
+file_id_cache = FileIdCache() if DELIVERY_MODE == "media" else None
+
+# With a job queue, scraping happens in scrape_worker.py processes and this process only delivers
+job_queue = JobQueue(JOB_QUEUE_PATH) if JOB_QUEUE_PATH else None
+
+# Bounded, per-user fair queue in front of the scrapers. In queue mode a running job is only a
+# wait for a worker, so the workers' total concurrency is the real limit, not this process's browsers.
+if job_queue:
+    SCRAPE_WORKERS = int(os.environ.get("JOB_QUEUE_IN_FLIGHT", "64"))
+else:
+    SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", os.environ.get("BROWSER_POOL_SIZE", "2")))
+scheduler = FairScheduler(
+    workers=SCRAPE_WORKERS,
+    max_queue=int(os.environ.get("SCRAPE_QUEUE_SIZE", "50")),
+    max_per_owner=int(os.environ.get("SCRAPE_QUEUE_PER_USER", "3")),
+)
+
+QUEUE_DEPTH = Gauge('scrape_queue_depth', 'Scrape requests waiting in the queue', function=lambda: scheduler.stats()['queued'])
+if job_queue:
+    JOB_QUEUE_DEPTH = Gauge('job_queue_depth', 'Jobs waiting for a scrape worker', function=lambda: job_queue.stats()['queued'])
+metrics_server = None
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     user = update.effective_user
@@ -31,10 +71,89 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     logger.info(f"User {update.effective_user.id} requested help")
     await update.message.reply_text(
         "Simply send me an Instagram username (without @ symbol) and I'll provide "
-        "download links for their stories. For example: 'jiri_mdf'"
+        "download links for their stories. For example: 'jiri_mdf'\n\n"
+        "Send /cancel to stop your pending requests."
+    )
+
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Cancel the user's waiting and running requests when the command /cancel is issued."""
+    user_id = update.effective_user.id
+    cancelled = scheduler.cancel(user_id)
+    logger.info(f"User {user_id} cancelled {cancelled} requests")
+    await update.message.reply_text(
+        f"Cancelled {cancelled} request{'s' if cancelled != 1 else ''}." if cancelled else "You have no pending requests."
+    )
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Report cache and browser pool counters when the command /stats is issued."""
+    cache_stats = story_cache.stats()
+    pool_stats = get_browser_pool().stats()
+    queue_stats = scheduler.stats()
+    file_stats = await asyncio.to_thread(file_id_cache.stats) if file_id_cache else None
+    job_stats = job_queue.stats() if job_queue else None
+    breaker_stats = story_breaker.stats()
+    provider_stats = provider_tracker.stats() if len(EXTRACTION_PROVIDERS) > 1 else {}
+    logger.info(f"User {update.effective_user.id} requested stats: cache={cache_stats} pool={pool_stats}")
+    await update.message.reply_text(
+        f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['coalesced']} coalesced, {cache_stats['size']} cached usernames\n"
+        f"Browser pool: {pool_stats['hits']} hits, {pool_stats['misses']} misses, "
+        f"avg wait {pool_stats['wait_avg']:.1f}s\n"
+        f"Queue: {queue_stats['queued']} waiting, {queue_stats['running']} running, "
+        f"{queue_stats['rejected']} rejected\n"
+        f"fastdl.app: {breaker_stats['state']}, {breaker_stats['window_failures']} of the last "
+        f"{breaker_stats['window_calls']} scrapes failed"
+        + "".join(f"\nProvider {name}: {provider['requests'] - provider['failures']}/{provider['requests']} ok"
+                  + (f", p50 {provider['p50']:.1f}s, p95 {provider['p95']:.1f}s" if provider['p95'] is not None else "")
+                  for name, provider in provider_stats.items())
+        + (f"\nWorkers: {job_stats['queued']} queued, {job_stats['leased']} running, "
+           f"{job_stats['failed']} failed" if job_queue else "")
+        + (f"\nMedia cache: {file_stats['hits']} resent, {file_stats['stored']} uploaded, {file_stats['size']} cached"
+           if file_id_cache else "")
     )
 
+async def reply_with_stories(update: Update, status_message, username: str, story_links: list) -> None:
+    """Send the stories as media when enabled, and as text links otherwise or as a fallback."""
+    user_id = update.effective_user.id
+
+    # Send the stories themselves, falling back to links for anything Telegram can't fetch
+    if file_id_cache:
+        await status_message.edit_text(f"📤 Sending {len(story_links)} stories...")
+        unsent = await send_media_groups(update.message, story_links, file_id_cache)
+        logger.info(f"Sent {len(story_links) - len(unsent)} stories as media to user {user_id}")
+        if not unsent:
+            return
+        story_links = unsent
+
+    # Send links to user
+    response_text = f"Found {len(story_links)} stories for {username}:\n\n"
+    
+    # Send in batches to avoid message length limits
+    for i, link in enumerate(story_links, 1):
+        media_type = "Video" if ".mp4" in link else "Image"
+        response_text += f"{i}. {media_type}: {link}\n\n"
+        
+        # Split into multiple messages if needed
+        if i % 5 == 0 or i == len(story_links):
+            await update.message.reply_text(response_text)
+            response_text = ""
+    
+    logger.info(f"Successfully sent {len(story_links)} story links to user {user_id}")
+
+async def scrape_stories(username: str, progress) -> list:
+    """Scrape in this process, or hand the job to a scrape worker and wait for its result."""
+    if not job_queue:
+        return await get_instagram_story_links(username, progress=progress)
+    job_id = job_queue.enqueue('stories', {'username': username, 'request_id': get_request_id()})
+    logger.info(f"Queued job {job_id} for {username}")
+    return await job_queue.wait(job_id)
+
 async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Trace the handling of one message under a request ID derived from the update."""
+    with request_context(f"tg-{update.update_id}", name="telegram_request", user_id=update.effective_user.id):
+        await handle_username(update, context)
+
+async def handle_username(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Process the user message and extract Instagram username."""
     user_message = update.message.text
     user_id = update.effective_user.id
@@ -59,7 +178,26 @@ async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     try:
         # Get the story links
         status_message = await update.message.reply_text("📱 Connecting to Instagram...", disable_notification=True)
-        story_links = await asyncio.to_thread(get_instagram_story_links, username)
+
+        async def progress(links):
+            try:
+                await status_message.edit_text(f"📥 Found {len(links)} stories so far...")
+            except TelegramError as e:
+                logger.debug(f"Could not update progress for user {user_id}: {e}")
+
+        async def fetch():
+            job = scheduler.submit(user_id, lambda: scrape_stories(username, progress))
+            wait = scheduler.estimated_wait(job)
+            if wait > 0:
+                position = scheduler.position(job)
+                logger.info(f"User {user_id} queued at position {position} (~{wait:.0f}s)")
+                await status_message.edit_text(
+                    f"⏳ You're #{position} in the queue. Estimated wait: about {wait:.0f} seconds."
+                )
+            return await job.future
+
+        # One user's /cancel only stops their own wait; others who joined the fetch run it again
+        story_links = await story_cache.get_or_fetch(normalize_username(username), fetch, cancelled=(JobCancelledError,))
         
         await status_message.edit_text("✅ Stories found! Generating download links...")
         
@@ -68,21 +206,21 @@ async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await status_message.edit_text("No stories found for this user. They may not have active stories or the account may be private.")
             return
         
-        # Send links to user
-        response_text = f"Found {len(story_links)} stories for {username}:\n\n"
-        
-        # Send in batches to avoid message length limits
-        for i, link in enumerate(story_links, 1):
-            media_type = "Video" if ".mp4" in link else "Image"
-            response_text += f"{i}. {media_type}: {link}\n\n"
-            
-            # Split into multiple messages if needed
-            if i % 5 == 0 or i == len(story_links):
-                await update.message.reply_text(response_text)
-                response_text = ""
-        
-        logger.info(f"Successfully sent {len(story_links)} story links to user {user_id}")
+        with span("telegram_reply"):
+            await reply_with_stories(update, status_message, username, story_links)
         
+    except QueueFullError as e:
+        logger.warning(f"Rejected request from user {user_id} for {username}: {e}")
+        await update.message.reply_text(str(e))
+
+    except CircuitOpenError as e:
+        logger.warning(f"Failing fast for user {user_id}, username {username}: circuit breaker is {story_breaker.state}")
+        await update.message.reply_text(str(e))
+
+    except JobCancelledError as e:
+        logger.info(f"Request from user {user_id} for {username} was cancelled")
+        await update.message.reply_text(str(e))
+
     except Exception as e:
         error_message = str(e)
         logger.error(f"Error processing request for user {user_id}, username {username}: {error_message}")
@@ -90,14 +228,49 @@ async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             f"Sorry, an error occurred while fetching stories: {error_message}"
         )
 
+async def post_init(application: Application) -> None:
+    """Start the scrape workers and pre-launch browser sessions before the bot starts polling."""
+    global metrics_server
+    if METRICS_PORT:
+        metrics_server = start_metrics_server()
+    scheduler.start()
+    if "selenium" in EXTRACTION_PROVIDERS and not job_queue:
+        await asyncio.to_thread(get_browser_pool().warm)
+
+async def post_shutdown(application: Application) -> None:
+    """Stop the scrape workers and close pooled browser sessions when the bot stops."""
+    await scheduler.stop()
+    logger.info(f"Scheduler stats: {scheduler.stats()}")
+    pool = get_browser_pool()
+    logger.info(f"Story cache stats: {story_cache.stats()}")
+    logger.info(f"Browser pool stats: {pool.stats()}")
+    if file_id_cache:
+        logger.info(f"Media cache stats: {file_id_cache.stats()}")
+        file_id_cache.close()
+    if job_queue:
+        logger.info(f"Job queue stats: {job_queue.stats()}")
+        job_queue.close()
+    await close_async_backends()
+    await asyncio.to_thread(pool.close)
+    if metrics_server:
+        metrics_server.shutdown()
+
 def main() -> None:
     """Start the bot."""
     # Create the Application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_message))
 
     # Run the bot until the user presses Ctrl-C
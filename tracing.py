@@ -0,0 +1,301 @@
+"""
+Structured per-request tracing and an opt-in sampling profiler.
+
+``span(name)`` times one step of a request. Spans nest, carry the request ID
+of the surrounding ``request_context`` and are handed to every registered end
+hook when they finish; with ``TRACE_FILE`` set they are appended to that file
+as JSON lines. The request ID lives in a context variable, so it follows
+``asyncio.to_thread`` automatically; use ``bind`` for work that is queued and
+started from another task.
+
+``profiled(name)`` samples the stacks of every thread while a block runs when
+``TRACE_PROFILE=1`` and writes them in collapsed-stack format, ready for a
+flame graph tool.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.environ.get("TRACE_FILE")
+TRACE_PROFILE = os.environ.get("TRACE_PROFILE", "0") == "1"
+TRACE_PROFILE_DIR = os.environ.get("TRACE_PROFILE_DIR", "profiles")
+TRACE_PROFILE_INTERVAL = float(os.environ.get("TRACE_PROFILE_INTERVAL", "0.005"))
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+_start_hooks = []
+_end_hooks = []
+
+
+class Span:
+    """One timed step of a request"""
+
+    def __init__(self, name, request_id, parent, attributes):
+        self.name = name
+        self.request_id = request_id
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        """Attach attributes, e.g. result counts, to the span"""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'request_id': self.request_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start_time,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+            'thread': self.thread,
+            'attributes': self.attributes,
+        }
+
+
+def add_span_hook(on_start=None, on_end=None):
+    """
+    Register callbacks run when any span starts or ends.
+
+    Args:
+        on_start (callable): Called with the Span before the block runs
+        on_end (callable): Called with the finished Span (``duration`` and ``error`` set)
+    """
+    if on_start:
+        _start_hooks.append(on_start)
+    if on_end:
+        _end_hooks.append(on_end)
+
+
+def _run_hooks(hooks, current):
+    for hook in hooks:
+        try:
+            hook(current)
+        except Exception as e:
+            logger.warning(f"Span hook {hook} failed: {e}")
+
+
+def new_request_id(prefix="req"):
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+
+def get_request_id():
+    """Request ID of the current context, or None outside a request"""
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id=None, name="request", **attributes):
+    """
+    Run a block as one traced request with its own root span.
+
+    Args:
+        request_id (str): ID to use (a random one is generated if omitted)
+        name (str): Name of the root span
+    """
+    token = _request_id.set(request_id or new_request_id())
+    try:
+        with span(name, **attributes) as root:
+            yield root
+    finally:
+        _request_id.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as a span of the current request.
+
+    Exceptions are recorded on the span and re-raised.
+    """
+    current = Span(name, _request_id.get(), _current_span.get(), attributes)
+    token = _current_span.set(current)
+    _run_hooks(_start_hooks, current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        _current_span.reset(token)
+        _run_hooks(_end_hooks, current)
+
+
+def bind(func):
+    """
+    Capture the current request context for a function that will run later, elsewhere.
+
+    Returns:
+        callable: ``func`` wrapped to run inside a copy of the captured context
+    """
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return bound
+
+
+class JsonlExporter:
+    """
+    Append finished spans to a file, one JSON object per line.
+
+    Args:
+        path (str): Output file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, finished):
+        line = json.dumps(finished.to_dict(), default=str)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + "\n")
+
+
+if TRACE_FILE:
+    add_span_hook(on_end=JsonlExporter(TRACE_FILE))
+
+
+# Leaf functions where a sampled thread is blocked rather than using CPU
+_WAITING_FUNCTIONS = {
+    'sleep', 'wait', 'acquire', 'select', 'poll', 'recv', 'recv_into', 'readinto', 'read',
+    'accept', 'connect', 'create_connection', '_wait_for_tstate_lock', 'getaddrinfo', 'communicate',
+}
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler built on ``sys._current_frames``.
+
+    A background thread records the stack of every other thread every
+    ``interval`` seconds. Samples whose innermost frame is a known blocking call
+    (socket reads, sleeps, lock waits) count as waiting, the rest as running.
+    Process CPU time over the same window is reported alongside.
+
+    Args:
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, interval=TRACE_PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.waiting = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._wall = self._cpu = 0.0
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            leaf = frame.f_code.co_name
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            if leaf in _WAITING_FUNCTIONS:
+                self.waiting += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._wall = time.perf_counter() - self._wall
+        self._cpu = time.process_time() - self._cpu
+
+    def summary(self, top=10):
+        """
+        Get the profile totals and the hottest functions.
+
+        Returns:
+            dict: Wall and CPU seconds, sample counts and the ``top`` innermost frames by samples
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            'wall_seconds': self._wall,
+            'cpu_seconds': self._cpu,
+            'samples': self.samples,
+            'waiting_ratio': self.waiting / self.samples if self.samples else 0.0,
+            'top': leaves.most_common(top),
+        }
+
+    def write_collapsed(self, path):
+        """Write the stacks in collapsed format (``frame;frame;frame count`` per line)"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(name, enabled=None):
+    """
+    Sample all threads while the block runs if profiling is enabled.
+
+    The collapsed stacks go to ``TRACE_PROFILE_DIR/<name>-<request id>.folded``
+    and a summary is logged.
+
+    Args:
+        name (str): Label for the profile file
+        enabled (bool): Override ``TRACE_PROFILE``
+    """
+    if not (TRACE_PROFILE if enabled is None else enabled):
+        yield None
+        return
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        os.makedirs(TRACE_PROFILE_DIR, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        path = os.path.join(TRACE_PROFILE_DIR, f"{safe_name}-{get_request_id() or 'none'}.folded")
+        profiler.write_collapsed(path)
+        summary = profiler.summary()
+        logger.info(
+            f"Profile of {name}: {summary['wall_seconds']:.2f}s wall, {summary['cpu_seconds']:.2f}s CPU, "
+            f"{summary['samples']} samples, {summary['waiting_ratio']:.0%} waiting; written to {path}"
+        )
+        for frame, count in summary['top'][:5]:
+            logger.info(f"  {count:>6} {frame}")
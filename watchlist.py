@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from result_cache import normalize_username
+from tracing import new_request_id, request_context
+
+logger = logging.getLogger(__name__)
+
+WATCHLIST_FILENAME = "watchlist.txt"
+STATE_FILENAME = "watchlist_state.json"
+TASK_LOG_FILENAME = "task.txt"
+
+# Default seconds between polls of one account (the README suggests running every 2 hours)
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", "7200"))
+# Each interval is stretched or shrunk by up to this fraction so polls don't line up
+WATCH_JITTER = float(os.environ.get("WATCH_JITTER", "0.2"))
+# First retry delay after a failed poll; doubles per consecutive failure, capped at the interval
+WATCH_RETRY = float(os.environ.get("WATCH_RETRY", "300"))
+
+_task_log_lock = threading.Lock()
+
+
+def load_watchlist(path, default_interval=WATCH_INTERVAL):
+    """
+    Read a watchlist file.
+
+    Each line holds a username and optionally its own poll interval in minutes,
+    e.g. ``natgeo 30``. Blank lines and ``#`` comments are ignored.
+
+    Args:
+        path (str): Watchlist file
+        default_interval (float): Interval in seconds for lines without one
+
+    Returns:
+        dict: Normalized username -> poll interval in seconds, in file order
+    """
+    accounts = {}
+    with open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            interval = default_interval
+            if len(fields) > 1:
+                try:
+                    interval = float(fields[1]) * 60
+                except ValueError:
+                    logger.warning(f"{path}:{number}: invalid interval {fields[1]!r}, using the default")
+            accounts[normalize_username(fields[0])] = interval
+    return accounts
+
+
+def record_poll(task_log_path, username, started, seconds, ok):
+    """Append one poll to the run log"""
+    with _task_log_lock, open(task_log_path, 'a') as task_file:
+        task_file.write(f'{started} - {username} - {"ok" if ok else "failed"} in {seconds:.1f}s\n')
+
+
+class WatchSchedule:
+    """
+    Per-account poll schedule persisted as JSON so a restarted daemon picks up where it left off.
+
+    Args:
+        path (str): State file
+        jitter (float): Fraction by which each interval is randomly stretched or shrunk
+    """
+
+    def __init__(self, path, jitter=WATCH_JITTER):
+        self.path = path
+        self.jitter = jitter
+        self.accounts = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.accounts = json.load(f).get('accounts', {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read schedule state from {path}, starting fresh: {e}")
+        logger.info(f"Loaded schedule state for {len(self.accounts)} accounts from {path}")
+
+    def _jittered(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def sync(self, watchlist, now=None):
+        """
+        Match the schedule to the watchlist.
+
+        New accounts are spread over the first ``jitter`` fraction of their
+        interval instead of all being due at once; accounts no longer on the
+        watchlist are dropped.
+
+        Args:
+            watchlist (dict): Username -> poll interval in seconds
+            now (float): Current time (defaults to ``time.time()``)
+        """
+        now = time.time() if now is None else now
+        for username in list(self.accounts):
+            if username not in watchlist:
+                del self.accounts[username]
+        for username, interval in watchlist.items():
+            entry = self.accounts.setdefault(username, {
+                'next_poll': now + random.uniform(0, interval * self.jitter),
+                'last_poll': None,
+                'last_seconds': None,
+                'failures': 0,
+            })
+            entry['interval'] = interval
+
+    def due(self, now=None):
+        """Usernames whose next poll is due, most overdue first"""
+        now = time.time() if now is None else now
+        due = [username for username, entry in self.accounts.items() if entry['next_poll'] <= now]
+        return sorted(due, key=lambda username: self.accounts[username]['next_poll'])
+
+    def next_due(self, exclude=()):
+        """Time of the earliest scheduled poll, or None if nothing is scheduled"""
+        return min(
+            (entry['next_poll'] for username, entry in self.accounts.items() if username not in exclude),
+            default=None,
+        )
+
+    def record(self, username, started, seconds, ok):
+        """Schedule an account's next poll after one finished"""
+        entry = self.accounts.get(username)
+        if entry is None:
+            return
+        entry['last_poll'] = started
+        entry['last_seconds'] = seconds
+        if ok:
+            entry['failures'] = 0
+            delay = self._jittered(entry['interval'])
+        else:
+            entry['failures'] += 1
+            delay = min(entry['interval'], WATCH_RETRY * 2 ** (entry['failures'] - 1))
+        entry['next_poll'] = started + seconds + delay
+
+    def save(self):
+        """Write the state atomically"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({'accounts': self.accounts}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+
+class WatchlistDaemon:
+    """
+    Long-running poller that scrapes every account on a watchlist on its own interval.
+
+    The watchlist file is re-read whenever it changes, so accounts can be added
+    or removed without a restart. Up to ``workers`` accounts are polled at once,
+    each in its own thread; with the Selenium backend every worker checks out its
+    own browser from the shared pool, so ``workers`` should not exceed
+    ``BROWSER_POOL_SIZE``.
+
+    Args:
+        poll (callable): Called with a username; returns True if the poll succeeded
+        watchlist_path (str): Watchlist file (see ``load_watchlist``)
+        state_path (str): Schedule state file
+        task_log_path (str): Run log that gets one line per poll
+        workers (int): Accounts polled concurrently
+        interval (float): Default seconds between polls of one account
+        jitter (float): Fraction by which each interval is randomly stretched or shrunk
+    """
+
+    def __init__(self, poll, watchlist_path, state_path, task_log_path, workers=2,
+                 interval=WATCH_INTERVAL, jitter=WATCH_JITTER):
+        self.poll = poll
+        self.watchlist_path = watchlist_path
+        self.task_log_path = task_log_path
+        self.workers = workers
+        self.interval = interval
+        self.schedule = WatchSchedule(state_path, jitter)
+        self._watchlist_mtime = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _reload_watchlist(self):
+        """Re-read the watchlist if the file changed since the last read"""
+        try:
+            mtime = os.path.getmtime(self.watchlist_path)
+        except OSError as e:
+            logger.error(f"Cannot read watchlist {self.watchlist_path}: {e}")
+            return
+        if mtime == self._watchlist_mtime:
+            return
+        self._watchlist_mtime = mtime
+
+        watchlist = load_watchlist(self.watchlist_path, self.interval)
+        with self._lock:
+            self.schedule.sync(watchlist)
+            self.schedule.save()
+        logger.info(f"Watching {len(watchlist)} accounts from {self.watchlist_path}")
+
+    def _poll(self, username):
+        started = time.time()
+        try:
+            with request_context(new_request_id("poll"), name="poll", username=username):
+                ok = bool(self.poll(username))
+        except Exception as e:
+            logger.error(f"Poll of {username} failed: {e}", exc_info=True)
+            ok = False
+        seconds = time.time() - started
+
+        record_poll(self.task_log_path, username, datetime.fromtimestamp(started), seconds, ok)
+        with self._lock:
+            self.schedule.record(username, started, seconds, ok)
+            self.schedule.save()
+        logger.info(f"Polled {username} in {seconds:.1f}s ({'ok' if ok else 'failed'})")
+        return ok
+
+    def run(self):
+        """Poll until ``stop()`` is called; polls in progress are allowed to finish"""
+        in_flight = {}
+        logger.info(f"Watchlist daemon started with {self.workers} workers")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="watch") as executor:
+            while not self._stop.is_set():
+                self._reload_watchlist()
+
+                busy = set(in_flight.values())
+                with self._lock:
+                    due = [username for username in self.schedule.due() if username not in busy]
+                for username in due[:self.workers - len(in_flight)]:
+                    in_flight[executor.submit(self._poll, username)] = username
+
+                timeout = 5.0
+                if len(in_flight) < self.workers:
+                    with self._lock:
+                        next_due = self.schedule.next_due(exclude=set(in_flight.values()))
+                    if next_due is not None:
+                        timeout = min(timeout, max(0.0, next_due - time.time()))
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del in_flight[future]
+                else:
+                    self._stop.wait(timeout)
+        logger.info("Watchlist daemon stopped")
+
+    def stop(self):
+        self._stop.set()